@@ -0,0 +1,122 @@
+"""Compare the cost of returning a large PO list through response_model validation
+versus the orjson fast path (FastJSONResponse).
+
+    cd backend && python benchmarks/serialization.py [--pos 500] [--items 30] [--rounds 10]
+
+Only server.py is imported; no database connection is made.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'benchmark')
+os.environ.setdefault('JWT_SECRET', 'benchmark')
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+import server  # noqa: E402
+
+
+def generate_pos(count: int, items_per_po: int) -> List[dict]:
+    now = datetime.now(timezone.utc)
+    pos = []
+    for i in range(count):
+        items = []
+        for j in range(items_per_po):
+            quantity = 10.0 + j
+            item = {
+                'product_id': str(uuid.uuid4()),
+                'product_name': f"Product {j}",
+                'quantity': quantity,
+                'unit_price': 125.5,
+                'tax_rate': 18.0,
+                'tax_amount': round(quantity * 125.5 * 0.18, 2),
+                'total': round(quantity * 125.5 * 1.18, 2),
+            }
+            if j % 3 == 0:
+                item['quantity_received'] = quantity / 2
+                item['delivery_history'] = [{
+                    'delivery_date': (now - timedelta(days=2)).isoformat(),
+                    'quantity_received': quantity / 2,
+                    'received_by': 'store',
+                    'notes': '',
+                }]
+            items.append(item)
+        pos.append({
+            'id': str(uuid.uuid4()),
+            'po_number': f"PO-PPC-202601-{i:04d}",
+            'vendor_id': str(uuid.uuid4()),
+            'vendor_name': f"Vendor {i % 20}",
+            'items': items,
+            'delivery_date': '2026-02-01',
+            'payment_terms': 'Net 30',
+            'shipping_address': 'Plant 2, Gate 4',
+            'notes': '',
+            'authorized_signatory': 'Purchase Head',
+            'subtotal': sum(item['total'] for item in items),
+            'tax': sum(item['tax_amount'] for item in items),
+            'total': sum(item['total'] for item in items),
+            'status': 'sent',
+            'department': 'ppc',
+            'created_by': 'buyer',
+            'created_at': now - timedelta(minutes=i),
+        })
+    return pos
+
+
+async def validated_path(field, pos: List[dict]) -> bytes:
+    # What FastAPI does for a returned list: validate against the model, encode, render
+    content = await serialize_response(field=field, response_content=pos)
+    return JSONResponse(content).body
+
+
+def fast_path(pos: List[dict]) -> bytes:
+    return server.FastJSONResponse([server.apply_po_defaults(po) for po in pos]).body
+
+
+def measure(func, rounds: int):
+    timings = []
+    body = b''
+    for _ in range(rounds):
+        started = time.perf_counter()
+        body = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pos', type=int, default=500)
+    parser.add_argument('--items', type=int, default=30)
+    parser.add_argument('--rounds', type=int, default=10)
+    args = parser.parse_args()
+
+    pos = generate_pos(args.pos, args.items)
+    field = create_response_field(name='Response_get_purchase_orders', type_=List[server.PurchaseOrder])
+    loop = asyncio.new_event_loop()
+
+    results = [
+        ('response_model + JSONResponse', measure(lambda: loop.run_until_complete(validated_path(field, pos)), args.rounds)),
+        ('FastJSONResponse (orjson)', measure(lambda: fast_path(pos), args.rounds)),
+    ]
+    print(f"{args.pos} POs x {args.items} items, {args.rounds} rounds")
+    baseline = statistics.median(results[0][1][0])
+    for label, (timings, size) in results:
+        median = statistics.median(timings)
+        print(f"  {label:32} median {median:8.1f} ms  min {min(timings):8.1f} ms  "
+              f"{size / 1024:8.0f} KiB  {baseline / median:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,46 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, UploadFile, File, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import Response
+from fastapi.responses import Response, ORJSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import OperationFailure, DuplicateKeyError, BulkWriteError
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, ValidationError
 from typing import List, Optional
 import uuid
+import re
+import io
+import csv
+import json
+import base64
+import time
+import socket
+import sys
+import random
+import asyncio
+import threading
+import contextvars
+import hashlib
+import gzip
+import zipfile
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from itertools import islice
+from collections import OrderedDict, deque
 from datetime import datetime, timezone, timedelta
+from decimal import Decimal, ROUND_HALF_UP
 import bcrypt
 import jwt
+import orjson
+import openpyxl
+from openpyxl.utils.exceptions import InvalidFileException
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
@@ -24,15 +52,296 @@ from io import BytesIO
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Metrics
+# Counters and histograms rendered in the Prometheus text format at GET /metrics. Updates
+# come from the event loop and from driver and executor threads, so each metric has a lock.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+# Set METRICS_TOKEN to require "Authorization: Bearer <token>" on scrapes
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# Upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def metric_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name, self.help_text, self.labels = name, help_text, labels
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{metric_labels(self.labels, label_values)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help_text, self.labels, self.buckets = name, help_text, labels, buckets
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, *label_values):
+        bucket = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bucket] += 1
+            series[1] += value
+            series[2] += 1
+    
+    def snapshot(self, *label_values) -> tuple:
+        """(per-bucket counts with +Inf last, sum, count) of one series"""
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                return [0] * (len(self.buckets) + 1), 0.0, 0
+            return list(series[0]), series[1], series[2]
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip([*self.buckets, '+Inf'], counts):
+                    cumulative += bucket_count
+                    le = metric_labels(self.labels, label_values, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                labels = metric_labels(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+http_request_seconds = Histogram('http_request_duration_seconds', 'Time to produce the response head, per route', ('method', 'route', 'status'))
+mongo_command_seconds = Histogram('mongodb_command_duration_seconds', 'MongoDB command round trips', ('collection', 'command'))
+mongo_command_failures = Counter('mongodb_command_failures_total', 'MongoDB commands that returned an error', ('collection', 'command'))
+pdf_render_seconds = Histogram('pdf_render_duration_seconds', 'PO PDF renders, excluding queueing for a worker')
+pdf_cache_requests = Counter('pdf_cache_requests_total', 'PO PDF lookups by cache outcome', ('result',))
+bcrypt_seconds = Histogram('bcrypt_duration_seconds', 'bcrypt hash and verify calls, excluding queueing', ('operation',))
+event_loop_lag_seconds = Histogram('event_loop_lag_seconds', 'How late the event loop woke a sleeping task')
+METRICS = [
+    http_request_seconds, mongo_command_seconds, mongo_command_failures,
+    pdf_render_seconds, pdf_cache_requests, bcrypt_seconds, event_loop_lag_seconds,
+]
+
+# Slow-request profiler (see "Request profiler" below). Off by default; when on, requests are
+# stack-sampled and kept if they ran past PROFILE_SLOW_SECONDS or sent the PROFILE_HEADER header.
+PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', 'false').lower() == 'true'
+# The profile a request's tasks, and the Motor threads they call into, are recorded against
+current_request_profile = contextvars.ContextVar('current_request_profile', default=None)
+
+class CommandTimingListener(monitoring.CommandListener):
+    """Times MongoDB commands by collection and command name, and logs them to any request profile"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Succeeded/failed events don't carry the command, so remember what's needed on start
+        self._started = {}
+    
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name == 'getMore':
+            collection = event.command.get('collection')
+        collection = collection if isinstance(collection, str) else ''
+        # Motor runs driver calls with the caller's context, so this is the requesting handler's profile
+        profile = current_request_profile.get()
+        entry = profile.start_command(event, collection) if profile else None
+        with self._lock:
+            self._started[(event.connection_id, event.request_id)] = (collection, entry)
+    
+    def _finish(self, event, failed: bool) -> str:
+        with self._lock:
+            collection, entry = self._started.pop((event.connection_id, event.request_id), ('', None))
+        if entry is not None:
+            entry['duration_ms'] = round(event.duration_micros / 1000, 3)
+            entry['failed'] = failed
+        if METRICS_ENABLED:
+            mongo_command_seconds.observe(event.duration_micros / 1e6, collection, event.command_name)
+            if failed:
+                mongo_command_failures.inc(collection, event.command_name)
+        return collection
+    
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+    
+    def failed(self, event):
+        self._finish(event, failed=True)
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# Pool sizing and timeouts. A request that can't check out a connection within
+# MONGO_WAIT_QUEUE_TIMEOUT_MS fails instead of queueing indefinitely.
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '10'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '5000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '10000'))
+# Comma-separated wire compressors in order of preference, e.g. "zstd,snappy,zlib"
+# (zstd and snappy need the zstandard / python-snappy packages)
+MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS', '')
+# Read preference for the read-heavy list, search, export and dashboard queries, e.g.
+# secondaryPreferred to take them off the primary. Single-document reads and everything
+# that follows a write stay on the primary.
+MONGO_LIST_READ_PREFERENCE = os.environ.get('MONGO_LIST_READ_PREFERENCE', 'primary')
+MONGO_LIST_MAX_STALENESS_SECONDS = int(os.environ.get('MONGO_LIST_MAX_STALENESS_SECONDS', '-1'))
+
+READ_PREFERENCES = {
+    'primary': Primary,
+    'primarypreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondarypreferred': SecondaryPreferred,
+    'nearest': Nearest,
+}
+
+def list_read_preference():
+    mode = READ_PREFERENCES.get(MONGO_LIST_READ_PREFERENCE.lower())
+    if mode is None:
+        raise ValueError(f"Unknown MONGO_LIST_READ_PREFERENCE '{MONGO_LIST_READ_PREFERENCE}'")
+    if mode is Primary:
+        return Primary()
+    return mode(max_staleness=MONGO_LIST_MAX_STALENESS_SECONDS)
+
+# Connection checkout waits, fed by the driver's pool events. The driver runs on Motor's
+# worker threads, so updates go through a lock. Completed waits are observed into
+# mongo_pool_wait_seconds, which also backs the counts and sums in GET /api/db/pool.
+mongo_pool_stats = {
+    'waiting': 0,
+    'max_waiting': 0,
+    'wait_seconds_max': 0.0,
+    'checkout_failures': {},
+    'connections_open': 0,
+}
+# Upper bounds in seconds; the last bucket catches everything slower
+MONGO_POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+mongo_pool_wait_seconds = Histogram('mongodb_pool_checkout_wait_seconds', 'Time from requesting a pooled connection to getting one', buckets=MONGO_POOL_WAIT_BUCKETS)
+METRICS.append(mongo_pool_wait_seconds)
+
+class PoolWaitListener(monitoring.ConnectionPoolListener):
+    """Times each connection checkout from request to hand-over"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = threading.local()
+    
+    def _begin(self):
+        self._started.at = time.perf_counter()
+        with self._lock:
+            mongo_pool_stats['waiting'] += 1
+            mongo_pool_stats['max_waiting'] = max(mongo_pool_stats['max_waiting'], mongo_pool_stats['waiting'])
+    
+    def _end(self) -> float:
+        waited = time.perf_counter() - getattr(self._started, 'at', time.perf_counter())
+        mongo_pool_stats['waiting'] -= 1
+        return waited
+    
+    def connection_check_out_started(self, event):
+        self._begin()
+    
+    def connection_checked_out(self, event):
+        with self._lock:
+            waited = self._end()
+            mongo_pool_stats['wait_seconds_max'] = max(mongo_pool_stats['wait_seconds_max'], waited)
+        mongo_pool_wait_seconds.observe(waited)
+    
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self._end()
+            failures = mongo_pool_stats['checkout_failures']
+            failures[event.reason] = failures.get(event.reason, 0) + 1
+    
+    def connection_created(self, event):
+        with self._lock:
+            mongo_pool_stats['connections_open'] += 1
+    
+    def connection_closed(self, event):
+        with self._lock:
+            mongo_pool_stats['connections_open'] -= 1
+    
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        pass
+    
+    def pool_closed(self, event):
+        pass
+    
+    def connection_ready(self, event):
+        pass
+    
+    def connection_checked_in(self, event):
+        pass
+
+client_options = {
+    'maxPoolSize': MONGO_MAX_POOL_SIZE,
+    'minPoolSize': MONGO_MIN_POOL_SIZE,
+    'waitQueueTimeoutMS': MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    'serverSelectionTimeoutMS': MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    'connectTimeoutMS': MONGO_CONNECT_TIMEOUT_MS,
+    'event_listeners': [PoolWaitListener(), *([CommandTimingListener()] if METRICS_ENABLED or PROFILER_ENABLED else [])],
+}
+if MONGO_COMPRESSORS:
+    client_options['compressors'] = MONGO_COMPRESSORS
+# Dates are stored as BSON datetimes; tz_aware hands them back as UTC-aware datetimes.
+# The client connects lazily; startup warms the pool before traffic arrives.
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, **client_options)
 db = client[os.environ['DB_NAME']]
+# Same database, but reads follow MONGO_LIST_READ_PREFERENCE
+read_db = client.get_database(os.environ['DB_NAME'], read_preference=list_read_preference())
 
 JWT_SECRET = os.environ['JWT_SECRET']
 JWT_ALGORITHM = 'HS256'
 
-app = FastAPI()
+# bcrypt runs on a dedicated, bounded thread pool so hashing never blocks the event loop
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', '4'))
+BCRYPT_MAX_QUEUE = int(os.environ.get('BCRYPT_MAX_QUEUE', '64'))
+
+# Resolved principals are cached per (user id, token) to skip the users lookup on every request.
+# Nothing evicts them early, so a role or department change made directly in the database can go
+# unnoticed for up to AUTH_CACHE_TTL_SECONDS (0 disables the cache).
+AUTH_CACHE_TTL_SECONDS = float(os.environ.get('AUTH_CACHE_TTL_SECONDS', '60'))
+AUTH_CACHE_MAX_ENTRIES = int(os.environ.get('AUTH_CACHE_MAX_ENTRIES', '1000'))
+# Set JWT_EMBED_CLAIMS=true to sign role/department into tokens and resolve them without any DB lookup.
+# Role or department changes then only take effect once the user logs in again.
+JWT_EMBED_CLAIMS = os.environ.get('JWT_EMBED_CLAIMS', 'false').lower() == 'true'
+
+# Set QUERY_PLAN_CHECK=true to explain every known query shape at startup and log collection scans
+QUERY_PLAN_CHECK = os.environ.get('QUERY_PLAN_CHECK', 'false').lower() == 'true'
+
+# Set FAST_JSON_RESPONSES=true to have the read-heavy list endpoints serialize stored documents
+# with orjson instead of re-validating them against their response models. Off by default: it
+# trusts every stored document to already match its model, including ones written by older code.
+FAST_JSON_RESPONSES = os.environ.get('FAST_JSON_RESPONSES', 'false').lower() == 'true'
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One scope for startup and shutdown (both at the end of this module), so whatever startup
+    # got going, the job scheduler and its leases included, is stopped even if it fails part way
+    try:
+        await startup_db_client()
+        yield
+    finally:
+        await shutdown_db_client()
+
+app = FastAPI(lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
 
@@ -105,10 +414,12 @@ class POItemCreate(BaseModel):
     product_id: str
     product_name: str
     quantity: float
-    unit_price: float
-    tax_rate: float
-    tax_amount: float
-    total: float
+    # Default to the product's catalog price and tax rate when omitted
+    unit_price: Optional[float] = None
+    tax_rate: Optional[float] = None
+    # Computed by the server; client values are only checked against it
+    tax_amount: Optional[float] = None
+    total: Optional[float] = None
 
 class POItem(BaseModel):
     product_id: str
@@ -130,9 +441,9 @@ class PurchaseOrderCreate(BaseModel):
     shipping_address: str
     notes: Optional[str] = ""
     authorized_signatory: Optional[str] = ""
-    subtotal: float
-    tax: float
-    total: float
+    subtotal: Optional[float] = None
+    tax: Optional[float] = None
+    total: Optional[float] = None
 
 class PurchaseOrder(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -162,36 +473,180 @@ class Notification(BaseModel):
     message: str
     notification_type: str
     is_read: bool
+    occurrences: int = 1
     created_at: datetime
 
+# Fast response path
+# Documents are validated by the *Create models on the way in, so endpoints that opt in skip
+# FastAPI's response_model pass and hand the stored documents straight to orjson. They must
+# project to the response model's fields and fill the defaults it would have added.
+def dumps_json(content) -> bytes:
+    # Anything orjson can't encode natively (e.g. Decimal) goes through FastAPI's encoder
+    return orjson.dumps(content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+
+class FastJSONResponse(ORJSONResponse):
+    def render(self, content) -> bytes:
+        return dumps_json(content)
+
+def model_projection(model) -> dict:
+    return {'_id': 0, **{field: 1 for field in model.model_fields}}
+
+PO_PROJECTION = model_projection(PurchaseOrder)
+PO_ITEM_DEFAULTS = {
+    field: info.get_default(call_default_factory=True)
+    for field, info in POItem.model_fields.items() if not info.is_required()
+}
+
+def apply_po_defaults(po: dict) -> dict:
+    """Fill the fields PurchaseOrder/POItem would default, for documents written before they existed"""
+    po.setdefault('department', 'general')
+    po.setdefault('authorized_signatory', '')
+    for item in po.get('items', ()):
+        for field, default in PO_ITEM_DEFAULTS.items():
+            if field not in item:
+                item[field] = default
+    return po
+
 # Auth functions
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
-def create_token(user_id: str) -> str:
+password_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix='bcrypt')
+password_pool_stats = {
+    'in_flight': 0,
+    'max_queue_depth': 0,
+    'completed': 0,
+    'rejected': 0,
+    'wait_seconds_total': 0.0,
+    'run_seconds_total': 0.0,
+}
+
+def password_queue_depth() -> int:
+    return max(password_pool_stats['in_flight'] - BCRYPT_WORKERS, 0)
+
+async def run_password_task(func, *args):
+    """Run a bcrypt call on the password pool, shedding load once the queue is full"""
+    if password_queue_depth() >= BCRYPT_MAX_QUEUE:
+        password_pool_stats['rejected'] += 1
+        raise HTTPException(
+            status_code=503,
+            detail="Authentication is busy, please retry",
+            headers={'Retry-After': '1'}
+        )
+    
+    def timed():
+        started = time.perf_counter()
+        result = func(*args)
+        return result, started, time.perf_counter()
+    
+    submitted = time.perf_counter()
+    password_pool_stats['in_flight'] += 1
+    password_pool_stats['max_queue_depth'] = max(password_pool_stats['max_queue_depth'], password_queue_depth())
+    try:
+        result, started, finished = await asyncio.get_running_loop().run_in_executor(password_executor, timed)
+    finally:
+        password_pool_stats['in_flight'] -= 1
+    password_pool_stats['completed'] += 1
+    password_pool_stats['wait_seconds_total'] += started - submitted
+    password_pool_stats['run_seconds_total'] += finished - started
+    bcrypt_seconds.observe(finished - started, func.__name__)
+    return result
+
+async def hash_password_async(password: str) -> str:
+    return await run_password_task(hash_password, password)
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    return await run_password_task(verify_password, password, hashed)
+
+PRINCIPAL_FIELDS = ('id', 'username', 'full_name', 'role', 'department', 'created_at')
+# Notification read state changes often and is always read fresh, so it stays out of cached principals
+PRINCIPAL_PROJECTION = {'_id': 0, 'password': 0, 'unread_notifications': 0, 'notifications_read_before': 0}
+
+def create_token(user: dict) -> str:
     payload = {
-        'user_id': user_id,
+        'user_id': user['id'],
         'exp': datetime.now(timezone.utc) + timedelta(days=7)
     }
+    if JWT_EMBED_CLAIMS:
+        principal = {field: user.get(field) for field in PRINCIPAL_FIELDS}
+        if isinstance(principal['created_at'], datetime):
+            principal['created_at'] = principal['created_at'].isoformat()
+        payload['principal'] = principal
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def create_scoped_token(user_id: str, scope: str, ttl_seconds: int) -> str:
+    """Short-lived token that only authenticates the endpoint checking for `scope`"""
+    payload = {
+        'user_id': user_id,
+        'scope': scope,
+        'exp': datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)
+    }
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+class PrincipalCache:
+    """Process-local TTL + LRU cache of resolved users keyed by (user_id, token)"""
+    
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+    
+    def get(self, user_id: str, token: str) -> Optional[dict]:
+        key = (user_id, token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return user
+    
+    def set(self, user_id: str, token: str, user: dict):
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        key = (user_id, token)
+        self._entries[key] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def clear(self):
+        self._entries.clear()
+
+principal_cache = PrincipalCache(AUTH_CACHE_TTL_SECONDS, AUTH_CACHE_MAX_ENTRIES)
+
+async def resolve_user(token: str, scope: Optional[str] = None) -> dict:
+    """Resolve a token to its user. Scoped tokens are only accepted where that scope is asked for."""
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         user_id = payload.get('user_id')
-        user = await db.users.find_one({'id': user_id}, {'_id': 0, 'password': 0})
-        if not user:
+        if payload.get('scope') != scope:
             raise HTTPException(status_code=401, detail="Invalid token")
-        return user
+        
+        if JWT_EMBED_CLAIMS and payload.get('principal'):
+            return dict(payload['principal'])
+        
+        user = principal_cache.get(user_id, token)
+        if user is None:
+            user = await db.users.find_one({'id': user_id}, PRINCIPAL_PROJECTION)
+            if not user:
+                raise HTTPException(status_code=401, detail="Invalid token")
+            principal_cache.set(user_id, token, user)
+        # Handlers get their own copy so the cached entry can't be mutated
+        return dict(user)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await resolve_user(credentials.credentials)
+
 # Auth endpoints
 @api_router.post("/auth/register")
 async def register(user_data: UserCreate):
@@ -222,15 +677,18 @@ async def register(user_data: UserCreate):
     user_doc = {
         'id': user_id,
         'username': user_data.username,
-        'password': hash_password(user_data.password),
+        'password': await hash_password_async(user_data.password),
         'full_name': user_data.full_name,
         'role': user_data.role.lower(),
         'department': user_data.department.lower(),
-        'created_at': datetime.now(timezone.utc).isoformat()
+        'created_at': datetime.now(timezone.utc)
     }
+    # New users start with nothing unread
+    user_doc['notifications_read_before'] = user_doc['created_at']
+    user_doc['unread_notifications'] = 0
     await db.users.insert_one(user_doc)
     
-    token = create_token(user_id)
+    token = create_token(user_doc)
     return {
         'token': token, 
         'user': {
@@ -245,10 +703,10 @@ async def register(user_data: UserCreate):
 @api_router.post("/auth/login")
 async def login(credentials: UserLogin):
     user = await db.users.find_one({'username': credentials.username})
-    if not user or not verify_password(credentials.password, user['password']):
+    if not user or not await verify_password_async(credentials.password, user['password']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    token = create_token(user['id'])
+    token = create_token(user)
     return {
         'token': token, 
         'user': {
@@ -264,17 +722,42 @@ async def login(credentials: UserLogin):
 async def get_me(current_user: dict = Depends(get_current_user)):
     return current_user
 
+@api_router.get("/auth/password-pool")
+async def get_password_pool_stats(current_user: dict = Depends(get_current_user)):
+    if current_user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return {
+        **password_pool_stats,
+        'queue_depth': password_queue_depth(),
+        'workers': BCRYPT_WORKERS,
+        'max_queue': BCRYPT_MAX_QUEUE,
+        'rounds': BCRYPT_ROUNDS
+    }
+
+# Scoped writes
+# Mutations put the access rule in the write filter and get the result back from the same
+# command, so a successful write is one round trip. Only a write that matched nothing pays
+# for a lookup, to tell a missing document from a forbidden one. PO updates are the exception:
+# they check access before pricing the new items.
+def catalog_scope(current_user: dict) -> dict:
+    # Admin can reach every vendor and product, others only their department's
+    return {} if current_user.get('role') == 'admin' else {'department': current_user.get('department', 'general')}
+
+async def scoped_write_failure(collection: str, doc_id: str, label: str) -> HTTPException:
+    """Work out why a scoped write matched nothing (only runs on the error path)"""
+    if not await db[collection].count_documents({'id': doc_id}, limit=1):
+        return HTTPException(status_code=404, detail=f"{label} not found")
+    return HTTPException(status_code=403, detail=f"Access denied to this {label.lower()}")
+
 # Vendor endpoints
 @api_router.get("/vendors", response_model=List[Vendor])
 async def get_vendors(current_user: dict = Depends(get_current_user)):
-    # Admin can see all vendors, others see only their department
-    query = {} if current_user.get('role') == 'admin' else {'department': current_user.get('department', 'general')}
-    vendors = await db.vendors.find(query, {'_id': 0}).limit(500).to_list(500)
+    vendors = await read_db.vendors.find(catalog_scope(current_user), model_projection(Vendor)).limit(500).to_list(500)
     for vendor in vendors:
-        if isinstance(vendor.get('created_at'), str):
-            vendor['created_at'] = datetime.fromisoformat(vendor['created_at'])
         if 'department' not in vendor:
             vendor['department'] = 'general'
+    if FAST_JSON_RESPONSES:
+        return FastJSONResponse(vendors)
     return vendors
 
 @api_router.post("/vendors", response_model=Vendor)
@@ -284,61 +767,42 @@ async def create_vendor(vendor_data: VendorCreate, current_user: dict = Depends(
         'id': vendor_id,
         **vendor_data.model_dump(),
         'department': current_user.get('department', 'general'),
-        'created_at': datetime.now(timezone.utc).isoformat()
+        'created_at': datetime.now(timezone.utc)
     }
+    vendor_doc['search_terms'] = search_terms_for('vendors', vendor_doc)
     await db.vendors.insert_one(vendor_doc)
-    vendor_doc['created_at'] = datetime.fromisoformat(vendor_doc['created_at'])
     return vendor_doc
 
 @api_router.put("/vendors/{vendor_id}", response_model=Vendor)
 async def update_vendor(vendor_id: str, vendor_data: VendorCreate, current_user: dict = Depends(get_current_user)):
-    # Check access
-    existing = await db.vendors.find_one({'id': vendor_id}, {'_id': 0})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Vendor not found")
-    
-    if current_user.get('role') != 'admin' and existing.get('department') != current_user.get('department'):
-        raise HTTPException(status_code=403, detail="Access denied to this vendor")
-    
-    result = await db.vendors.update_one(
-        {'id': vendor_id},
-        {'$set': vendor_data.model_dump()}
+    vendor = await db.vendors.find_one_and_update(
+        {'id': vendor_id, **catalog_scope(current_user)},
+        {'$set': {**vendor_data.model_dump(), 'search_terms': search_terms_for('vendors', vendor_data.model_dump())}},
+        projection=model_projection(Vendor),
+        return_document=ReturnDocument.AFTER
     )
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Vendor not found")
-    
-    vendor = await db.vendors.find_one({'id': vendor_id}, {'_id': 0})
-    if isinstance(vendor['created_at'], str):
-        vendor['created_at'] = datetime.fromisoformat(vendor['created_at'])
+    if not vendor:
+        raise await scoped_write_failure('vendors', vendor_id, 'Vendor')
     if 'department' not in vendor:
         vendor['department'] = 'general'
     return vendor
 
 @api_router.delete("/vendors/{vendor_id}")
 async def delete_vendor(vendor_id: str, current_user: dict = Depends(get_current_user)):
-    # Check access
-    existing = await db.vendors.find_one({'id': vendor_id}, {'_id': 0})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Vendor not found")
-    
-    if current_user.get('role') != 'admin' and existing.get('department') != current_user.get('department'):
-        raise HTTPException(status_code=403, detail="Access denied to this vendor")
-    
-    result = await db.vendors.delete_one({'id': vendor_id})
+    result = await db.vendors.delete_one({'id': vendor_id, **catalog_scope(current_user)})
     if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Vendor not found")
+        raise await scoped_write_failure('vendors', vendor_id, 'Vendor')
     return {'message': 'Vendor deleted'}
 
 # Product endpoints
 @api_router.get("/products", response_model=List[Product])
 async def get_products(current_user: dict = Depends(get_current_user)):
-    query = {} if current_user.get('role') == 'admin' else {'department': current_user.get('department', 'general')}
-    products = await db.products.find(query, {'_id': 0}).limit(500).to_list(500)
+    products = await read_db.products.find(catalog_scope(current_user), model_projection(Product)).limit(500).to_list(500)
     for product in products:
-        if isinstance(product.get('created_at'), str):
-            product['created_at'] = datetime.fromisoformat(product['created_at'])
         if 'department' not in product:
             product['department'] = 'general'
+    if FAST_JSON_RESPONSES:
+        return FastJSONResponse(products)
     return products
 
 @api_router.post("/products", response_model=Product)
@@ -348,51 +812,243 @@ async def create_product(product_data: ProductCreate, current_user: dict = Depen
         'id': product_id,
         **product_data.model_dump(),
         'department': current_user.get('department', 'general'),
-        'created_at': datetime.now(timezone.utc).isoformat()
+        'created_at': datetime.now(timezone.utc)
     }
+    product_doc['search_terms'] = search_terms_for('products', product_doc)
     await db.products.insert_one(product_doc)
-    product_doc['created_at'] = datetime.fromisoformat(product_doc['created_at'])
     return product_doc
 
 @api_router.put("/products/{product_id}", response_model=Product)
 async def update_product(product_id: str, product_data: ProductCreate, current_user: dict = Depends(get_current_user)):
-    existing = await db.products.find_one({'id': product_id}, {'_id': 0})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
-    if current_user.get('role') != 'admin' and existing.get('department') != current_user.get('department'):
-        raise HTTPException(status_code=403, detail="Access denied to this product")
-    
-    result = await db.products.update_one(
-        {'id': product_id},
-        {'$set': product_data.model_dump()}
+    product = await db.products.find_one_and_update(
+        {'id': product_id, **catalog_scope(current_user)},
+        {'$set': {**product_data.model_dump(), 'search_terms': search_terms_for('products', product_data.model_dump())}},
+        projection=model_projection(Product),
+        return_document=ReturnDocument.AFTER
     )
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
-    product = await db.products.find_one({'id': product_id}, {'_id': 0})
-    if isinstance(product['created_at'], str):
-        product['created_at'] = datetime.fromisoformat(product['created_at'])
+    if not product:
+        raise await scoped_write_failure('products', product_id, 'Product')
     if 'department' not in product:
         product['department'] = 'general'
     return product
 
 @api_router.delete("/products/{product_id}")
 async def delete_product(product_id: str, current_user: dict = Depends(get_current_user)):
-    existing = await db.products.find_one({'id': product_id}, {'_id': 0})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
-    if current_user.get('role') != 'admin' and existing.get('department') != current_user.get('department'):
-        raise HTTPException(status_code=403, detail="Access denied to this product")
-    
-    result = await db.products.delete_one({'id': product_id})
+    result = await db.products.delete_one({'id': product_id, **catalog_scope(current_user)})
     if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Product not found")
+        raise await scoped_write_failure('products', product_id, 'Product')
     return {'message': 'Product deleted'}
 
+# Bulk import
+# Uploads are parsed row by row straight from the spooled upload file and written in batches,
+# so only the current batch and the keys seen so far are held in memory.
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '500'))
+IMPORT_MAX_ERRORS = 1000
+
+def normalise_header(value) -> str:
+    return re.sub(r'\s+', '_', str(value or '').strip().lower())
+
+def iter_csv_rows(file):
+    reader = csv.reader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+    headers = [normalise_header(h) for h in next(reader, [])]
+    for row in reader:
+        yield dict(zip(headers, row))
+
+def iter_xlsx_rows(file):
+    # read_only streams rows from the sheet XML instead of loading the whole workbook
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = [normalise_header(h) for h in next(rows, ())]
+        for row in rows:
+            yield dict(zip(headers, row))
+    finally:
+        workbook.close()
+
+def import_rows(upload: UploadFile):
+    name = (upload.filename or '').lower()
+    if name.endswith('.csv') or upload.content_type == 'text/csv':
+        return iter_csv_rows(upload.file)
+    if name.endswith('.xlsx'):
+        return iter_xlsx_rows(upload.file)
+    raise HTTPException(status_code=400, detail="Upload a .csv or .xlsx file")
+
+def clean_import_row(row: dict, model) -> dict:
+    """Cell values as strings for validation; blank cells fall back to the model's defaults"""
+    cleaned = {}
+    for key, value in row.items():
+        if key not in model.model_fields or value is None:
+            continue
+        value = str(value).strip()
+        if value == '' and not model.model_fields[key].is_required():
+            continue
+        cleaned[key] = value
+    return cleaned
+
+async def run_bulk_import(upload: UploadFile, model, collection: str, key_field: str, current_user: dict) -> dict:
+    """Validate rows against model and upsert them on (department, key_field) in batches"""
+    rows = import_rows(upload)
+    department = current_user.get('department', 'general')
+    summary = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'failed': 0, 'errors': []}
+    row_number = 1  # the header row
+    # Key -> first row using it, to report repeats anywhere in the file
+    first_rows = {}
+    
+    def fail(row: int, errors: List[str]):
+        summary['failed'] += 1
+        if len(summary['errors']) < IMPORT_MAX_ERRORS:
+            summary['errors'].append({'row': row, 'errors': errors})
+    
+    try:
+        while True:
+            # Parsing is blocking work, so each batch is read on a worker thread
+            try:
+                batch = await asyncio.to_thread(lambda: list(islice(rows, IMPORT_BATCH_SIZE)))
+            except (csv.Error, UnicodeDecodeError, zipfile.BadZipFile, InvalidFileException) as e:
+                raise HTTPException(status_code=400, detail=f"Could not read the file after row {row_number}: {e}")
+            if not batch:
+                break
+            
+            operations, operation_rows = [], []
+            for row in batch:
+                row_number += 1
+                if not any(value not in (None, '') for value in row.values()):
+                    continue
+                try:
+                    record = model(**clean_import_row(row, model)).model_dump()
+                    record['search_terms'] = search_terms_for(collection, record)
+                except ValidationError as e:
+                    fail(row_number, [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()])
+                    continue
+                # A repeated SKU/name would silently overwrite the earlier row, so it is reported instead
+                if record[key_field] in first_rows:
+                    fail(row_number, [f"{key_field}: duplicate of row {first_rows[record[key_field]]}"])
+                    continue
+                first_rows[record[key_field]] = row_number
+                operations.append(UpdateOne(
+                    {'department': department, key_field: record[key_field]},
+                    {'$set': record, '$setOnInsert': {'id': str(uuid.uuid4()), 'created_at': datetime.now(timezone.utc)}},
+                    upsert=True
+                ))
+                operation_rows.append(row_number)
+            if operations:
+                try:
+                    result = (await db[collection].bulk_write(operations, ordered=False)).bulk_api_result
+                except BulkWriteError as e:
+                    # Unordered, so every other operation in the batch was still applied
+                    result = e.details
+                    for error in result.get('writeErrors', []):
+                        if error.get('code') == 11000 and error.get('keyValue'):
+                            messages = [f"{key}: {value} is already in use" for key, value in error['keyValue'].items()]
+                        else:
+                            messages = [error.get('errmsg', 'write failed')]
+                        fail(operation_rows[error['index']], messages)
+                summary['inserted'] += result.get('nUpserted', 0)
+                summary['updated'] += result.get('nModified', 0)
+                summary['unchanged'] += result.get('nMatched', 0) - result.get('nModified', 0)
+    finally:
+        # Stopping early leaves the generator suspended; closing it closes the workbook too. A
+        # cancelled request can leave the worker thread still inside it, and that thread ends it.
+        try:
+            rows.close()
+        except ValueError:
+            pass
+    
+    summary['errors_truncated'] = summary['failed'] > len(summary['errors'])
+    return summary
+
+@api_router.post("/vendors/import")
+async def import_vendors(file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
+    """Create or update the department's vendors from a CSV/XLSX sheet, matched on name"""
+    return await run_bulk_import(file, VendorCreate, 'vendors', 'name', current_user)
+
+@api_router.post("/products/import")
+async def import_products(file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
+    """Create or update the department's products from a CSV/XLSX sheet, matched on SKU"""
+    return await run_bulk_import(file, ProductCreate, 'products', 'sku', current_user)
+
+# Pricing
+# Line and header amounts are recomputed here in Decimal and rounded to the paisa. Client-sent
+# amounts that disagree by more than rounding are corrected, or rejected with
+# PO_TOTALS_MISMATCH=reject.
+PO_TOTALS_MISMATCH = os.environ.get('PO_TOTALS_MISMATCH', 'correct').lower()
+PRICE_QUANTUM = Decimal('0.01')
+
+def to_decimal(value) -> Decimal:
+    # Via str so 0.1 stays 0.1 instead of its binary approximation
+    return Decimal(str(value))
+
+def money(value: Decimal) -> Decimal:
+    return value.quantize(PRICE_QUANTUM, rounding=ROUND_HALF_UP)
+
+async def price_po(po_data: PurchaseOrderCreate) -> dict:
+    """Priced items and header totals for a PO, ready to $set on the document.
+    
+    Products are read with a single $in query, and only for lines that take their
+    unit price or tax rate from the catalog.
+    """
+    catalog_ids = {item.product_id for item in po_data.items if item.unit_price is None or item.tax_rate is None}
+    catalog = {}
+    if catalog_ids:
+        async for product in db.products.find(
+            {'id': {'$in': list(catalog_ids)}},
+            {'_id': 0, 'id': 1, 'unit_price': 1, 'tax_rate': 1}
+        ):
+            catalog[product['id']] = product
+        unknown = catalog_ids - catalog.keys()
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown products: {', '.join(sorted(unknown))}")
+    
+    mismatches = []
+    def check(field: str, sent: Optional[float], computed: Decimal, tolerance: Decimal = PRICE_QUANTUM):
+        if sent is not None and abs(to_decimal(sent) - computed) > tolerance:
+            mismatches.append({'field': field, 'sent': sent, 'computed': float(computed)})
+    
+    items = []
+    subtotal = tax = Decimal('0')
+    for idx, item in enumerate(po_data.items):
+        if item.quantity <= 0:
+            raise HTTPException(status_code=400, detail=f"Item {idx} must have a positive quantity")
+        product = catalog.get(item.product_id, {})
+        unit_price = to_decimal(item.unit_price if item.unit_price is not None else product['unit_price'])
+        tax_rate = to_decimal(item.tax_rate if item.tax_rate is not None else product.get('tax_rate', 18.0))
+        if not unit_price.is_finite() or unit_price < 0:
+            raise HTTPException(status_code=400, detail=f"Item {idx} must have a unit price of 0 or more")
+        if not tax_rate.is_finite() or not 0 <= tax_rate <= 100:
+            raise HTTPException(status_code=400, detail=f"Item {idx} must have a tax rate between 0 and 100")
+        net = money(to_decimal(item.quantity) * unit_price)
+        tax_amount = money(net * tax_rate / 100)
+        check(f'items[{idx}].tax_amount', item.tax_amount, tax_amount)
+        check(f'items[{idx}].total', item.total, net + tax_amount)
+        items.append({
+            **item.model_dump(),
+            'unit_price': float(unit_price),
+            'tax_rate': float(tax_rate),
+            'tax_amount': float(tax_amount),
+            'total': float(net + tax_amount)
+        })
+        subtotal += net
+        tax += tax_amount
+    
+    # Unrounded client sums may drift from the per-line rounding by up to a paisa per line
+    header_tolerance = PRICE_QUANTUM * max(len(items), 1)
+    check('subtotal', po_data.subtotal, subtotal, header_tolerance)
+    check('tax', po_data.tax, tax, header_tolerance)
+    check('total', po_data.total, subtotal + tax, header_tolerance)
+    if mismatches:
+        if PO_TOTALS_MISMATCH == 'reject':
+            raise HTTPException(status_code=422, detail={
+                'message': 'PO amounts do not match server pricing',
+                'mismatches': mismatches
+            })
+        logger.info(f"Corrected {len(mismatches)} client-supplied PO amounts: {mismatches[:5]}")
+    
+    return {'items': items, 'subtotal': float(subtotal), 'tax': float(tax), 'total': float(subtotal + tax)}
+
 # Purchase Order endpoints
-async def generate_po_number(department: str):
+PO_NUMBER_ATTEMPTS = 5
+
+def po_number_prefix(department: str) -> str:
     dept_prefix = {
         'admin': 'ADM',
         'accounts': 'ACC',
@@ -401,32 +1057,332 @@ async def generate_po_number(department: str):
         'dyeing': 'DYE',
         'accessories': 'ACS'
     }.get(department.lower(), 'GEN')
+    return f"PO-{dept_prefix}-{datetime.now(timezone.utc).strftime('%Y%m')}-"
+
+# Prefixes whose counter this process has already caught up with existing POs
+seeded_po_prefixes = set()
+
+async def generate_po_number(department: str):
+    # One counter document per prefix and month, incremented atomically; numbers are never reused
+    prefix = po_number_prefix(department)
+    if prefix not in seeded_po_prefixes:
+        await sync_po_number_counter(prefix)
+        seeded_po_prefixes.add(prefix)
+    return await next_po_number(prefix)
+
+async def next_po_number(prefix: str) -> str:
+    counter = await db.counters.find_one_and_update(
+        {'_id': f"po_number:{prefix}"},
+        {'$inc': {'seq': 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return f"{prefix}{counter['seq']:04d}"
+
+async def sync_po_number_counter(prefix: str):
+    """Move the counter past the highest number already issued, e.g. by the old count-based scheme"""
+    highest = 0
+    # Compared as numbers: past 9999 the suffix grows a digit and string order no longer holds
+    async for po in db.purchase_orders.find({'po_number': {'$regex': f"^{re.escape(prefix)}"}}, {'_id': 0, 'po_number': 1}):
+        suffix = po['po_number'][len(prefix):]
+        if suffix.isdigit():
+            highest = max(highest, int(suffix))
+    await db.counters.update_one({'_id': f"po_number:{prefix}"}, {'$max': {'seq': highest}}, upsert=True)
+
+async def renumber_duplicate_po_numbers() -> int:
+    """Give every PO but the oldest in a group sharing a po_number a fresh number (idempotent).
     
-    count = await db.purchase_orders.count_documents({'department': department})
-    return f"PO-{dept_prefix}-{datetime.now(timezone.utc).strftime('%Y%m')}-{count + 1:04d}"
+    The old count-based scheme reissued numbers after deletes, and the unique po_number index
+    can't be built while such groups exist. Runs before ensure_indexes.
+    """
+    groups = await db.purchase_orders.aggregate([
+        {'$group': {'_id': '$po_number', 'count': {'$sum': 1}}},
+        {'$match': {'_id': {'$type': 'string'}, 'count': {'$gt': 1}}}
+    ]).to_list(None)
+    renumbered = 0
+    for group in groups:
+        po_number = group['_id']
+        prefix = po_number[:po_number.rindex('-') + 1] if '-' in po_number else f"{po_number}-"
+        await sync_po_number_counter(prefix)
+        pos = await db.purchase_orders.find(
+            {'po_number': po_number}, {field: 1 for field in SEARCH_FIELDS['purchase_orders']}
+        ).sort([('created_at', 1), ('_id', 1)]).to_list(None)
+        for po in pos[1:]:
+            po['po_number'] = await next_po_number(prefix)
+            await db.purchase_orders.update_one({'_id': po['_id']}, {'$set': {
+                'po_number': po['po_number'],
+                'search_terms': search_terms_for('purchase_orders', po)
+            }})
+            logger.warning(f"Renumbered duplicate PO number {po_number} to {po['po_number']}")
+            renumbered += 1
+    return renumbered
 
-@api_router.get("/purchase-orders", response_model=List[PurchaseOrder])
-async def get_purchase_orders(current_user: dict = Depends(get_current_user)):
+def po_visibility_query(current_user: dict) -> dict:
     # Admin sees all POs, Accounts sees all POs, others see only their department
     user_role = current_user.get('role')
     user_dept = current_user.get('department', 'general')
     
     if user_role == 'admin' or user_dept == 'accounts':
-        query = {}  # See all POs
+        return {}  # See all POs
+    return {'department': user_dept}  # See only department POs
+
+def parse_date_param(value: str, param: str) -> datetime:
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {param}, expected an ISO date")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def build_po_list_query(
+    current_user: dict,
+    status: Optional[str] = None,
+    vendor_id: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    q: Optional[str] = None,
+    department: Optional[str] = None
+) -> dict:
+    """Visibility scope plus the optional list filters shared by the PO list endpoints"""
+    query = po_visibility_query(current_user)
+    if department:
+        if query.get('department', department) != department:
+            raise HTTPException(status_code=403, detail="Access denied to this department")
+        query['department'] = department
+    if status:
+        query['status'] = status
+    if vendor_id:
+        query['vendor_id'] = vendor_id
+    
+    created_range = {}
+    if date_from:
+        created_range['$gte'] = parse_date_param(date_from, 'date_from')
+    if date_to:
+        end = parse_date_param(date_to, 'date_to')
+        # A bare date covers the whole day
+        if len(date_to) == 10:
+            created_range['$lt'] = end + timedelta(days=1)
+        else:
+            created_range['$lte'] = end
+    if created_range:
+        query.setdefault('$and', []).append(date_condition('created_at', created_range))
+    
+    # Each word must prefix a PO number or vendor name term, so the filter stays on the search index
+    words = search_words(q or '')[:SEARCH_MAX_WORDS]
+    if words:
+        query.setdefault('$and', []).extend({'search_terms': re.compile('^' + re.escape(word))} for word in words)
+    return query
+
+def encode_po_cursor(po: dict) -> str:
+    created_at = po['created_at']
+    if isinstance(created_at, str):
+        # Not migrated yet; the cursor has to keep comparing it as a string
+        data = {'created_at': created_at, 'legacy': True, 'id': po['id']}
     else:
-        query = {'department': user_dept}  # See only department POs
+        data = {'created_at': created_at.isoformat(), 'id': po['id']}
+    raw = json.dumps(data, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_po_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if data.get('legacy'):
+            return {'created_at': str(data['created_at']), 'id': data['id']}
+        return {'created_at': datetime.fromisoformat(data['created_at']), 'id': data['id']}
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def po_keyset(after: dict) -> dict:
+    """Keyset pagination on (created_at, id), newest first"""
+    keyset = [
+        {'created_at': {'$lt': after['created_at']}},
+        {'created_at': after['created_at'], 'id': {'$lt': after['id']}}
+    ]
+    if isinstance(after['created_at'], datetime) and not date_migration['complete']:
+        # Sorting newest first puts unmigrated string dates after every BSON date
+        keyset.append({'created_at': {'$type': 'string'}})
+    return {'$or': keyset}
+
+def po_list_projection(summary: bool, fields: Optional[str]) -> Optional[dict]:
+    """Projection for the PO list, or None when full documents are requested"""
+    if fields:
+        requested = [f.strip() for f in fields.split(',') if f.strip()]
+        unknown = [f for f in requested if f not in PurchaseOrder.model_fields]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        # id and created_at are always needed to build the next cursor
+        projection = {'_id': 0, 'id': 1, 'created_at': 1}
+        projection.update({f: 1 for f in requested})
+        return projection
+    if summary:
+        # The model's fields minus the line items, so internal fields like search_terms stay out
+        return {field: value for field, value in PO_PROJECTION.items() if field != 'items'}
+    return None
+
+@api_router.get("/purchase-orders", response_model=List[PurchaseOrder])
+async def get_purchase_orders(
+    response: Response,
+    status: Optional[str] = None,
+    vendor_id: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    q: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=500),
+    summary: bool = False,
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    query = build_po_list_query(current_user, status, vendor_id, date_from, date_to, q)
+    if cursor:
+        keyset = po_keyset(decode_po_cursor(cursor))
+        query = {'$and': [query, keyset]} if query else keyset
+    
+    projection = po_list_projection(summary, fields)
+    pos = await read_db.purchase_orders.find(query, projection or PO_PROJECTION) \
+        .sort([('created_at', -1), ('id', -1)]).limit(limit + 1).to_list(limit + 1)
+    
+    headers = {}
+    if len(pos) > limit:
+        pos = pos[:limit]
+        headers['X-Next-Cursor'] = encode_po_cursor(pos[-1])
     
-    pos = await db.purchase_orders.find(query, {'_id': 0}).sort('created_at', -1).limit(500).to_list(500)
     for po in pos:
-        if isinstance(po.get('created_at'), str):
-            po['created_at'] = datetime.fromisoformat(po['created_at'])
-        if 'department' not in po:
+        if 'department' not in po and (projection is None or 'department' in projection or summary):
             po['department'] = 'general'
+    
+    if projection is not None:
+        # Partial documents cannot satisfy the PurchaseOrder response model
+        return FastJSONResponse(pos, headers=headers)
+    if FAST_JSON_RESPONSES:
+        return FastJSONResponse([apply_po_defaults(po) for po in pos], headers=headers)
+    response.headers.update(headers)
     return pos
 
+# Spreadsheet export
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '200'))
+PO_EXPORT_FIELDS = [
+    'po_number', 'status', 'department', 'vendor_id', 'vendor_name', 'created_at', 'created_by',
+    'delivery_date', 'payment_terms', 'subtotal', 'tax', 'total'
+]
+PO_EXPORT_COLUMNS = PO_EXPORT_FIELDS + ['line_count', 'quantity_ordered', 'quantity_received', 'quantity_pending']
+PO_ITEM_EXPORT_COLUMNS = [
+    'po_number', 'status', 'department', 'vendor_name', 'created_at', 'line', 'product_id', 'product_name',
+    'quantity', 'quantity_received', 'quantity_pending', 'unit_price', 'tax_rate', 'tax_amount', 'total'
+]
+
+def po_export_row(po: dict) -> dict:
+    ordered = sum(item['quantity'] for item in po['items'])
+    received = sum(item['quantity_received'] for item in po['items'])
+    return {
+        **{field: po.get(field) for field in PO_EXPORT_FIELDS},
+        'created_at': stored_datetime(po['created_at']).isoformat(),
+        'line_count': len(po['items']),
+        'quantity_ordered': ordered,
+        'quantity_received': received,
+        'quantity_pending': max(ordered - received, 0)
+    }
+
+def po_item_export_rows(po: dict):
+    for line, item in enumerate(po['items'], start=1):
+        yield {
+            'po_number': po['po_number'],
+            'status': po['status'],
+            'department': po['department'],
+            'vendor_name': po['vendor_name'],
+            'created_at': stored_datetime(po['created_at']).isoformat(),
+            'line': line,
+            **{column: item[column] for column in ('product_id', 'product_name', 'quantity', 'quantity_received',
+                                                   'unit_price', 'tax_rate', 'tax_amount', 'total')},
+            'quantity_pending': max(item['quantity'] - item['quantity_received'], 0)
+        }
+
+def csv_safe(value):
+    # A leading =, +, - or @ would make spreadsheets evaluate vendor or product text as a formula
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@'):
+        return "'" + value
+    return value
+
+async def stream_po_export(query: dict, fmt: str, lines: bool):
+    """Yield the export one cursor batch at a time; only the current batch is held in memory"""
+    columns = PO_ITEM_EXPORT_COLUMNS if lines else PO_EXPORT_COLUMNS
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    if fmt == 'csv':
+        writer.writeheader()
+    
+    cursor = read_db.purchase_orders.find(query, PO_PROJECTION) \
+        .sort([('created_at', -1), ('id', -1)]).batch_size(EXPORT_BATCH_SIZE)
+    chunk, pending_pos = [], 0
+    
+    def take() -> bytes:
+        if fmt == 'jsonl':
+            data = b''.join(chunk)
+            chunk.clear()
+        else:
+            data = buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        return data
+    
+    async for po in cursor:
+        apply_po_defaults(po)
+        if fmt == 'jsonl':
+            rows = po_item_export_rows(po) if lines else [po]
+            chunk.extend(dumps_json(row) + b'\n' for row in rows)
+        else:
+            rows = po_item_export_rows(po) if lines else [po_export_row(po)]
+            writer.writerows({key: csv_safe(value) for key, value in row.items()} for row in rows)
+        pending_pos += 1
+        if pending_pos >= EXPORT_BATCH_SIZE:
+            yield take()
+            pending_pos = 0
+    yield take()
+
+# Registered before /purchase-orders/{po_id} so "export" isn't taken for a PO id
+@api_router.get("/purchase-orders/export")
+async def export_purchase_orders(
+    fmt: str = Query('csv', alias='format', pattern='^(csv|jsonl)$'),
+    lines: bool = False,
+    status: Optional[str] = None,
+    vendor_id: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    q: Optional[str] = None,
+    department: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream every PO matching the list filters, or one row per line item with lines=true"""
+    query = build_po_list_query(current_user, status, vendor_id, date_from, date_to, q, department)
+    name = f"purchase-order-{'lines' if lines else 'list'}-{datetime.now(timezone.utc).strftime('%Y%m%d')}.{fmt}"
+    return StreamingResponse(
+        stream_po_export(query, fmt, lines),
+        media_type='text/csv; charset=utf-8' if fmt == 'csv' else 'application/x-ndjson',
+        headers={"Content-Disposition": f"attachment; filename={name}"}
+    )
+
+@api_router.get("/purchase-orders/export/pdf")
+async def export_po_pdfs(
+    department: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream a ZIP with the PDF of every matching PO, adding each file as its render finishes"""
+    query = build_po_list_query(current_user, status=status, date_from=date_from, date_to=date_to, department=department)
+    filename = f"purchase-orders-{datetime.now(timezone.utc).strftime('%Y%m%d')}.zip"
+    return StreamingResponse(
+        stream_po_pdf_zip(query),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
 @api_router.get("/purchase-orders/{po_id}", response_model=PurchaseOrder)
 async def get_purchase_order(po_id: str, current_user: dict = Depends(get_current_user)):
-    po = await db.purchase_orders.find_one({'id': po_id}, {'_id': 0})
+    po = await db.purchase_orders.find_one({'id': po_id}, PO_PROJECTION)
     if not po:
         raise HTTPException(status_code=404, detail="Purchase order not found")
     
@@ -437,91 +1393,84 @@ async def get_purchase_order(po_id: str, current_user: dict = Depends(get_curren
     if user_role != 'admin' and user_dept != 'accounts' and po.get('department') != user_dept:
         raise HTTPException(status_code=403, detail="Access denied to this purchase order")
     
-    if isinstance(po.get('created_at'), str):
-        po['created_at'] = datetime.fromisoformat(po['created_at'])
     if 'department' not in po:
         po['department'] = 'general'
+    if FAST_JSON_RESPONSES:
+        return FastJSONResponse(apply_po_defaults(po))
     return po
 
 @api_router.post("/purchase-orders", response_model=PurchaseOrder)
 async def create_purchase_order(po_data: PurchaseOrderCreate, current_user: dict = Depends(get_current_user)):
     po_id = str(uuid.uuid4())
     department = current_user.get('department', 'general')
-    po_number = await generate_po_number(department)
     
     po_doc = {
         'id': po_id,
-        'po_number': po_number,
         **po_data.model_dump(),
+        **await price_po(po_data),
         'status': 'draft',
         'department': department,
         'created_by': current_user['username'],
-        'created_at': datetime.now(timezone.utc).isoformat()
+        'created_at': datetime.now(timezone.utc)
     }
-    await db.purchase_orders.insert_one(po_doc)
-    po_doc['created_at'] = datetime.fromisoformat(po_doc['created_at'])
+    for attempt in range(PO_NUMBER_ATTEMPTS):
+        po_doc['po_number'] = await generate_po_number(department)
+        po_doc['search_terms'] = search_terms_for('purchase_orders', po_doc)
+        try:
+            await db.purchase_orders.insert_one(po_doc)
+            break
+        except DuplicateKeyError as e:
+            # The unique po_number index caught a number issued before the counter existed
+            if 'po_number' not in (e.details or {}).get('keyPattern', {}):
+                raise
+            po_doc.pop('_id', None)
+            await sync_po_number_counter(po_number_prefix(department))
+    else:
+        raise HTTPException(status_code=503, detail="Could not allocate a PO number, please retry")
     return po_doc
 
 @api_router.put("/purchase-orders/{po_id}", response_model=PurchaseOrder)
 async def update_purchase_order(po_id: str, po_data: PurchaseOrderCreate, current_user: dict = Depends(get_current_user)):
-    existing = await db.purchase_orders.find_one({'id': po_id}, {'_id': 0})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Purchase order not found")
-    
-    # Check access: admin and accounts can edit all, others only their department
-    user_role = current_user.get('role')
-    user_dept = current_user.get('department')
-    
-    if user_role != 'admin' and user_dept != 'accounts' and existing.get('department') != user_dept:
-        raise HTTPException(status_code=403, detail="Access denied to this purchase order")
+    # Admin and accounts can edit all POs, others only their department's. The scope is checked
+    # before pricing, so a PO the user can't reach is a 403/404 whatever its new items hold, and
+    # the PO number read here lets search_terms go out in the same $set as everything else.
+    scope = {'id': po_id, **po_visibility_query(current_user)}
+    current = await db.purchase_orders.find_one(scope, {'_id': 0, 'po_number': 1})
+    if not current:
+        raise await scoped_write_failure('purchase_orders', po_id, 'Purchase order')
     
-    result = await db.purchase_orders.update_one(
-        {'id': po_id},
-        {'$set': po_data.model_dump()}
+    update = {**po_data.model_dump(), **await price_po(po_data)}
+    update['search_terms'] = search_terms_for('purchase_orders', {**update, 'po_number': current['po_number']})
+    po = await db.purchase_orders.find_one_and_update(
+        scope,
+        {'$set': update},
+        projection=PO_PROJECTION,
+        return_document=ReturnDocument.AFTER
     )
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Purchase order not found")
-    
-    po = await db.purchase_orders.find_one({'id': po_id}, {'_id': 0})
-    if isinstance(po['created_at'], str):
-        po['created_at'] = datetime.fromisoformat(po['created_at'])
+    if not po:
+        # Deleted or moved out of scope since the check
+        raise await scoped_write_failure('purchase_orders', po_id, 'Purchase order')
     if 'department' not in po:
         po['department'] = 'general'
     return po
 
 @api_router.patch("/purchase-orders/{po_id}/status")
 async def update_po_status(po_id: str, status: dict, current_user: dict = Depends(get_current_user)):
-    existing = await db.purchase_orders.find_one({'id': po_id}, {'_id': 0})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Purchase order not found")
-    
-    # Check access: admin and accounts can update status, others only their department
-    user_role = current_user.get('role')
-    user_dept = current_user.get('department')
-    
-    if user_role != 'admin' and user_dept != 'accounts' and existing.get('department') != user_dept:
-        raise HTTPException(status_code=403, detail="Access denied to this purchase order")
-    
+    # Admin and accounts can update status on all POs, others only their department's
     result = await db.purchase_orders.update_one(
-        {'id': po_id},
+        {'id': po_id, **po_visibility_query(current_user)},
         {'$set': {'status': status['status']}}
     )
     if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Purchase order not found")
+        raise await scoped_write_failure('purchase_orders', po_id, 'Purchase order')
     return {'message': 'Status updated'}
 
 @api_router.delete("/purchase-orders/{po_id}")
 async def delete_purchase_order(po_id: str, current_user: dict = Depends(get_current_user)):
-    existing = await db.purchase_orders.find_one({'id': po_id}, {'_id': 0})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Purchase order not found")
-    
-    if current_user.get('role') != 'admin' and existing.get('department') != current_user.get('department'):
-        raise HTTPException(status_code=403, detail="Access denied to this purchase order")
-    
-    result = await db.purchase_orders.delete_one({'id': po_id})
+    # Only admin can delete outside their department; accounts' wider view is read/edit only
+    result = await db.purchase_orders.delete_one({'id': po_id, **catalog_scope(current_user)})
     if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Purchase order not found")
+        raise await scoped_write_failure('purchase_orders', po_id, 'Purchase order')
     return {'message': 'Purchase order deleted'}
 
 # Material Receipt Confirmation (Per Item)
@@ -531,24 +1480,53 @@ class ItemReceiptConfirm(BaseModel):
     received_by: str
     notes: Optional[str] = ""
 
+def receipt_guard(item_index: int, quantity: float) -> dict:
+    """$expr that holds while item `item_index` can still take `quantity` more units"""
+    return {'$let': {
+        'vars': {'item': {'$arrayElemAt': ['$items', item_index]}},
+        'in': {'$lte': [
+            {'$add': [{'$ifNull': ['$$item.quantity_received', 0]}, quantity]},
+            '$$item.quantity'
+        ]}
+    }}
+
+def receipt_update(item_index: int, quantity: float, delivery_record: dict) -> dict:
+    return {
+        '$inc': {f'items.{item_index}.quantity_received': quantity},
+        '$push': {f'items.{item_index}.delivery_history': delivery_record}
+    }
+
+def receipt_result(po: dict, item_index: int, quantity: float) -> dict:
+    items = po['items']
+    item = items[item_index]
+    total_received = item.get('quantity_received', 0)
+    return {
+        'message': 'Item receipt confirmed',
+        'item_fully_received': total_received >= item['quantity'],
+        'po_fully_received': all(i.get('quantity_received', 0) >= i['quantity'] for i in items),
+        'quantity_received': quantity,
+        'total_received': total_received,
+        'pending': item['quantity'] - total_received
+    }
+
+async def receipt_failure(po_id: str, item_index: int) -> HTTPException:
+    """Work out why a guarded receipt update matched nothing (only runs on the error path)"""
+    po = await db.purchase_orders.find_one({'id': po_id}, {'_id': 0, 'items': 1})
+    if not po:
+        return HTTPException(status_code=404, detail="Purchase order not found")
+    if item_index >= len(po['items']):
+        return HTTPException(status_code=400, detail="Invalid item index")
+    item = po['items'][item_index]
+    return HTTPException(status_code=400, detail=f"Cannot receive more than ordered quantity. Ordered: {item['quantity']}, Already received: {item.get('quantity_received', 0)}")
+
 @api_router.post("/purchase-orders/{po_id}/confirm-item-receipt")
 async def confirm_item_receipt(po_id: str, receipt_data: ItemReceiptConfirm, current_user: dict = Depends(get_current_user)):
-    po = await db.purchase_orders.find_one({'id': po_id}, {'_id': 0})
-    if not po:
-        raise HTTPException(status_code=404, detail="Purchase order not found")
-    
-    items = po['items']
-    if receipt_data.item_index >= len(items):
+    if receipt_data.item_index < 0:
         raise HTTPException(status_code=400, detail="Invalid item index")
+    # Same rule as the batch endpoint: a zero or negative receipt would $inc the total down
+    if receipt_data.quantity_received <= 0:
+        raise HTTPException(status_code=400, detail="Quantity received must be positive")
     
-    item = items[receipt_data.item_index]
-    
-    # Check if trying to receive more than ordered
-    new_total_received = item.get('quantity_received', 0) + receipt_data.quantity_received
-    if new_total_received > item['quantity']:
-        raise HTTPException(status_code=400, detail=f"Cannot receive more than ordered quantity. Ordered: {item['quantity']}, Already received: {item.get('quantity_received', 0)}")
-    
-    # Add delivery record
     delivery_record = {
         'delivery_date': datetime.now(timezone.utc).isoformat(),
         'quantity_received': receipt_data.quantity_received,
@@ -556,159 +1534,1057 @@ async def confirm_item_receipt(po_id: str, receipt_data: ItemReceiptConfirm, cur
         'notes': receipt_data.notes
     }
     
-    if 'delivery_history' not in item:
-        item['delivery_history'] = []
-    item['delivery_history'].append(delivery_record)
+    # One guarded update: the quantity check lives in the filter, so concurrent receipts can't overshoot
+    # or overwrite each other, and only the touched item is written
+    po = await db.purchase_orders.find_one_and_update(
+        {
+            'id': po_id,
+            f'items.{receipt_data.item_index}.quantity': {'$exists': True},
+            '$expr': receipt_guard(receipt_data.item_index, receipt_data.quantity_received)
+        },
+        receipt_update(receipt_data.item_index, receipt_data.quantity_received, delivery_record),
+        projection={'_id': 0, 'items': 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if not po:
+        raise await receipt_failure(po_id, receipt_data.item_index)
     
-    # Update quantity received
-    item['quantity_received'] = new_total_received
-    items[receipt_data.item_index] = item
+    return receipt_result(po, receipt_data.item_index, receipt_data.quantity_received)
+
+# Batch goods receipt across many items and POs
+RECEIPT_BATCH_MAX_LINES = int(os.environ.get('RECEIPT_BATCH_MAX_LINES', '500'))
+
+class BatchItemReceipt(ItemReceiptConfirm):
+    po_id: str
+
+class BatchReceiptConfirm(BaseModel):
+    receipts: List[BatchItemReceipt]
+
+@api_router.post("/purchase-orders/confirm-receipts")
+async def confirm_receipts_batch(batch: BatchReceiptConfirm, current_user: dict = Depends(get_current_user)):
+    """Validate and apply many item receipts in one round trip, reporting a result per line"""
+    if not batch.receipts:
+        raise HTTPException(status_code=400, detail="No receipts given")
+    if len(batch.receipts) > RECEIPT_BATCH_MAX_LINES:
+        raise HTTPException(status_code=400, detail=f"At most {RECEIPT_BATCH_MAX_LINES} receipt lines per batch")
     
-    # Update the PO
-    result = await db.purchase_orders.update_one(
-        {'id': po_id},
-        {'$set': {'items': items}}
-    )
+    po_ids = list({line.po_id for line in batch.receipts})
+    pos = await db.purchase_orders.find(
+        {'id': {'$in': po_ids}},
+        {'_id': 0, 'id': 1, 'po_number': 1, 'items.quantity': 1, 'items.quantity_received': 1}
+    ).to_list(len(po_ids))
+    pos_by_id = {po['id']: po for po in pos}
     
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Purchase order not found")
+    batch_id = str(uuid.uuid4())
+    delivery_date = datetime.now(timezone.utc).isoformat()
+    results = []
+    # po_id -> item_index -> (total quantity, delivery records)
+    accepted = {}
+    
+    for line_no, line in enumerate(batch.receipts):
+        result = {'line': line_no, 'po_id': line.po_id, 'item_index': line.item_index, 'quantity_received': line.quantity_received}
+        results.append(result)
+        po = pos_by_id.get(line.po_id)
+        
+        if not po:
+            result.update(status='rejected', detail="Purchase order not found")
+            continue
+        result['po_number'] = po['po_number']
+        if line.item_index < 0 or line.item_index >= len(po['items']):
+            result.update(status='rejected', detail="Invalid item index")
+            continue
+        if line.quantity_received <= 0:
+            result.update(status='rejected', detail="Quantity received must be positive")
+            continue
+        
+        item = po['items'][line.item_index]
+        item_lines = accepted.setdefault(line.po_id, {})
+        batched_qty, records = item_lines.get(line.item_index, (0, []))
+        already_received = item.get('quantity_received', 0) + batched_qty
+        if already_received + line.quantity_received > item['quantity']:
+            result.update(status='rejected', detail=f"Cannot receive more than ordered quantity. Ordered: {item['quantity']}, Already received: {already_received}")
+            continue
+        
+        records = records + [{
+            'delivery_date': delivery_date,
+            'quantity_received': line.quantity_received,
+            'received_by': line.received_by,
+            'notes': line.notes,
+            'batch_id': batch_id
+        }]
+        item_lines[line.item_index] = (batched_qty + line.quantity_received, records)
+        result.update(status='applied')
     
-    # Check if all items are fully received
-    all_received = all(item.get('quantity_received', 0) >= item['quantity'] for item in items)
+    # One guarded update per PO, so each PO's lines apply atomically even if another receipt races in
+    operations = []
+    for po_id, item_lines in accepted.items():
+        guard = {'id': po_id, '$and': []}
+        update = {'$inc': {}, '$push': {}}
+        for item_index, (quantity, records) in item_lines.items():
+            guard[f'items.{item_index}.quantity'] = {'$exists': True}
+            guard['$and'].append({'$expr': receipt_guard(item_index, quantity)})
+            update['$inc'][f'items.{item_index}.quantity_received'] = quantity
+            update['$push'][f'items.{item_index}.delivery_history'] = {'$each': records}
+        operations.append(UpdateOne(guard, update))
+    
+    if operations:
+        write = await db.purchase_orders.bulk_write(operations, ordered=False)
+        if write.matched_count < len(operations):
+            # Some guards failed at write time; the batch marker shows which POs took the update
+            applied = await db.purchase_orders.distinct(
+                'id', {'id': {'$in': list(accepted)}, 'items.delivery_history.batch_id': batch_id}
+            )
+            for result in results:
+                if result['status'] == 'applied' and result['po_id'] not in applied:
+                    result.update(status='conflict', detail="Purchase order changed during receipt, please retry")
     
+    applied_count = sum(1 for result in results if result['status'] == 'applied')
     return {
-        'message': 'Item receipt confirmed',
-        'item_fully_received': new_total_received >= item['quantity'],
-        'po_fully_received': all_received,
-        'quantity_received': receipt_data.quantity_received,
-        'total_received': new_total_received,
-        'pending': item['quantity'] - new_total_received
+        'message': f'{applied_count} of {len(results)} receipt lines applied',
+        'batch_id': batch_id,
+        'applied': applied_count,
+        'failed': len(results) - applied_count,
+        'results': results
     }
 
 # Notification endpoints
+# Notifications target a department (None = everyone) or a single user. Read state is per user:
+# a receipt per notification read, plus a watermark set by "mark all read". Each user document
+# carries a denormalised unread counter kept in step with both.
+def notification_visibility_query(current_user: dict) -> dict:
+    # Admin and Accounts see every department's notifications, like they see every PO
+    user_dept = current_user.get('department', 'general')
+    if current_user.get('role') == 'admin' or user_dept == 'accounts':
+        shared = {'user_id': None}
+    else:
+        shared = {'user_id': None, 'department': {'$in': [user_dept, None]}}
+    return {'$or': [{'user_id': current_user['id']}, shared]}
+
+def notification_expiry(read_at: datetime) -> datetime:
+    # BSON date for the TTL index; notifications are dropped this long after the last recipient read them
+    return read_at + timedelta(days=NOTIFICATION_READ_TTL_DAYS)
+
+def can_see_notification(current_user: dict, notification: dict) -> bool:
+    if notification.get('user_id'):
+        return notification['user_id'] == current_user['id']
+    if current_user.get('role') == 'admin' or current_user.get('department') == 'accounts':
+        return True
+    return notification.get('department') in (None, current_user.get('department'))
+
+def notification_recipients_query(notification: dict) -> dict:
+    """Users who can see a notification, as a query on db.users"""
+    if notification.get('user_id'):
+        return {'id': notification['user_id']}
+    if not notification.get('department'):
+        return {}
+    return {'$or': [{'department': notification['department']}, {'role': 'admin'}, {'department': 'accounts'}]}
+
+def notification_read_by_query(notification: dict, readers: List[str]) -> dict:
+    """Recipients who have read a notification, through a receipt or their watermark"""
+    return {'$and': [
+        notification_recipients_query(notification),
+        {'$or': [
+            {'id': {'$in': readers}},
+            date_condition('notifications_read_before', {'$gte': stored_datetime(notification['created_at'])})
+        ]}
+    ]}
+
+def notification_unread_by_query(notification: dict, readers: List[str]) -> dict:
+    """Recipients who have not read a notification yet"""
+    return {'$and': [
+        notification_recipients_query(notification),
+        {'id': {'$nin': readers}},
+        {'$or': [
+            {'notifications_read_before': {'$exists': False}},
+            date_condition('notifications_read_before', {'$lt': stored_datetime(notification['created_at'])})
+        ]}
+    ]}
+
+async def notification_unread_recipients(notification: dict) -> int:
+    readers = await db.notification_receipts.distinct('user_id', {'notification_id': notification['id']})
+    return await db.users.count_documents(notification_unread_by_query(notification, readers))
+
+async def retract_notifications(notifications: List[dict]):
+    """Take notifications that are about to be deleted off the counters of users who hadn't read them"""
+    for notification in notifications:
+        if 'department' not in notification and notification.get('is_read'):
+            # Legacy notification read through its global flag
+            continue
+        readers = await db.notification_receipts.distinct('user_id', {'notification_id': notification['id']})
+        await db.users.update_many(
+            {'$and': [notification_unread_by_query(notification, readers), {'unread_notifications': {'$gt': 0}}]},
+            {'$inc': {'unread_notifications': -1}}
+        )
+
+async def settle_notification_read(notification: dict, read_at: datetime) -> bool:
+    """Flag a notification read, and let it expire, once every one of its recipients has read it"""
+    if await notification_unread_recipients(notification):
+        return False
+    result = await db.notifications.update_one(
+        {'id': notification['id'], 'is_read': False},
+        {'$set': {'is_read': True, 'read_at': read_at, 'expires_at': notification_expiry(read_at)}}
+    )
+    return result.modified_count > 0
+
+async def get_notification_state(user_id: str) -> dict:
+    state = await db.users.find_one(
+        {'id': user_id},
+        {'_id': 0, 'unread_notifications': 1, 'notifications_read_before': 1}
+    )
+    return state or {}
+
+def is_notification_read(notification: dict, state: dict, receipts: set) -> bool:
+    if notification['id'] in receipts:
+        return True
+    watermark = state.get('notifications_read_before')
+    if watermark and stored_datetime(notification['created_at']) <= stored_datetime(watermark):
+        return True
+    # Notifications from before per-user state keep the global flag they had
+    return 'department' not in notification and notification.get('is_read', False)
+
+async def deliver_notifications(notifications: List[dict]):
+    """Bump the unread counter of everyone who can see the newly inserted notifications"""
+    audiences = {}
+    for notification in notifications:
+        key = (notification.get('user_id'), notification.get('department'))
+        audiences[key] = audiences.get(key, 0) + 1
+    for (user_id, department), count in audiences.items():
+        await db.users.update_many(
+            notification_recipients_query({'user_id': user_id, 'department': department}),
+            {'$inc': {'unread_notifications': count}}
+        )
+    notifications_changed(notifications)
+
+async def migrate_notification_counters():
+    """Give users created before per-user read state an unread counter (idempotent)"""
+    async for user in db.users.find({'unread_notifications': {'$exists': False}}, {'_id': 0, 'id': 1, 'role': 1, 'department': 1}):
+        count = await db.notifications.count_documents(
+            {'$and': [notification_visibility_query(user), {'is_read': False}]}
+        )
+        await db.users.update_one(
+            {'id': user['id'], 'unread_notifications': {'$exists': False}},
+            {'$set': {'unread_notifications': count}}
+        )
+
 @api_router.get("/notifications")
 async def get_notifications(current_user: dict = Depends(get_current_user)):
-    notifications = await db.notifications.find({}, {'_id': 0}).sort('created_at', -1).limit(100).to_list(100)
+    notifications = await db.notifications.find(notification_visibility_query(current_user), {'_id': 0, 'expires_at': 0}) \
+        .sort('created_at', -1).limit(100).to_list(100)
+    state = await get_notification_state(current_user['id'])
+    receipts = set(await db.notification_receipts.distinct('notification_id', {
+        'user_id': current_user['id'],
+        'notification_id': {'$in': [n['id'] for n in notifications]}
+    }))
     for notification in notifications:
-        if isinstance(notification.get('created_at'), str):
-            notification['created_at'] = datetime.fromisoformat(notification['created_at'])
-    return notifications
+        notification['is_read'] = is_notification_read(notification, state, receipts)
+    # No response model to validate against, so this always takes the shared encoder
+    return FastJSONResponse(notifications)
 
 @api_router.patch("/notifications/{notification_id}/read")
 async def mark_notification_read(notification_id: str, current_user: dict = Depends(get_current_user)):
-    result = await db.notifications.update_one(
-        {'id': notification_id},
-        {'$set': {'is_read': True}}
+    notification = await db.notifications.find_one(
+        {'$and': [{'id': notification_id}, notification_visibility_query(current_user)]},
+        {'_id': 0, 'id': 1, 'department': 1, 'user_id': 1, 'is_read': 1, 'created_at': 1}
     )
-    if result.matched_count == 0:
+    if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
+    
+    state = await get_notification_state(current_user['id'])
+    if is_notification_read(notification, state, set()):
+        return {'message': 'Notification marked as read'}
+    
+    read_at = datetime.now(timezone.utc)
+    try:
+        # Receipts live as long as their notification; the retention job drops orphaned ones
+        await db.notification_receipts.insert_one({
+            'notification_id': notification_id,
+            'user_id': current_user['id'],
+            'read_at': read_at
+        })
+    except DuplicateKeyError:
+        # Already read; the counter was decremented by that first read
+        return {'message': 'Notification marked as read'}
+    
+    await db.users.update_one(
+        {'id': current_user['id'], 'unread_notifications': {'$gt': 0}},
+        {'$inc': {'unread_notifications': -1}}
+    )
+    if 'department' in notification and not notification.get('is_read'):
+        # The global flag records that every recipient has read it; only then may it expire, and
+        # only then does the pending-PO scan raise it again
+        await settle_notification_read(notification, read_at)
+    notifications_changed()
     return {'message': 'Notification marked as read'}
 
-@api_router.post("/notifications/check-pending-pos")
-async def check_pending_pos(current_user: dict = Depends(get_current_user)):
-    """Check for POs older than 10 days and create notifications for pending items"""
-    ten_days_ago = datetime.now(timezone.utc) - timedelta(days=10)
+@api_router.post("/notifications/read-all")
+async def mark_all_notifications_read(current_user: dict = Depends(get_current_user)):
+    # Everything created up to now counts as read, so per-notification receipts are no longer needed
+    await db.users.update_one(
+        {'id': current_user['id']},
+        {'$set': {'notifications_read_before': datetime.now(timezone.utc), 'unread_notifications': 0}}
+    )
+    await db.notification_receipts.delete_many({'user_id': current_user['id']})
+    notifications_changed()
+    return {'message': 'All notifications marked as read'}
+
+PENDING_PO_DAYS = int(os.environ.get('PENDING_PO_DAYS', '10'))
+PENDING_SCAN_STATE_ID = 'pending_po_scan'
+
+def pending_notification_doc(po: dict, now: datetime) -> dict:
+    pending_items = []
+    for idx, item in enumerate(po['items']):
+        quantity_received = item.get('quantity_received', 0)
+        pending_qty = item['quantity'] - quantity_received
+        if pending_qty > 0:
+            pending_items.append({
+                'index': idx,
+                'product_name': item['product_name'],
+                'ordered': item['quantity'],
+                'received': quantity_received,
+                'pending': pending_qty
+            })
     
-    # Find all POs created more than 10 days ago (limit to recent 500 for performance)
-    pos = await db.purchase_orders.find({}).sort('created_at', -1).limit(500).to_list(500)
+    days_old = (now - stored_datetime(po['created_at'])).days
+    pending_items_summary = ', '.join([f"{item['product_name']} ({item['pending']} pending)" for item in pending_items[:3]])
+    if len(pending_items) > 3:
+        pending_items_summary += f" and {len(pending_items) - 3} more"
+    
+    return {
+        'id': str(uuid.uuid4()),
+        'po_id': po['id'],
+        'po_number': po['po_number'],
+        'message': f"Material receipt pending for {po['po_number']} ({days_old} days old). Pending items: {pending_items_summary}",
+        'notification_type': 'material_pending',
+        'pending_items': pending_items,
+        'department': po.get('department', 'general'),
+        'user_id': None,
+        'is_read': False,
+        'occurrences': 1,
+        'first_created_at': now,
+        'created_at': now
+    }
+
+async def redeliver_notification(old: dict):
+    """Count a re-raised notification as unread again for exactly the recipients who had read it"""
+    readers = await db.notification_receipts.distinct('user_id', {'notification_id': old['id']})
+    await db.users.update_many(notification_read_by_query(old, readers), {'$inc': {'unread_notifications': 1}})
+    await db.notification_receipts.delete_many({'notification_id': old['id'], 'user_id': {'$in': readers}})
+
+async def scan_pending_pos(full: bool = False) -> int:
+    """Raise material_pending notifications for POs that became overdue since the last scan.
+    
+    The scan remembers the cut-off it used as a high-water mark, so each run only reads POs
+    created between the previous cut-off and the new one. full=True ignores the mark.
+    """
+    now = datetime.now(timezone.utc)
+    threshold = now - timedelta(days=PENDING_PO_DAYS)
+    
+    created_range = {'$lte': threshold}
+    state = await db.scanner_state.find_one({'_id': PENDING_SCAN_STATE_ID})
+    if state and not full:
+        created_range['$gt'] = stored_datetime(state['high_water_mark'])
+    
+    pos = await db.purchase_orders.aggregate([
+        {'$match': date_condition('created_at', created_range)},
+        {'$match': {'$expr': {'$gt': [{'$size': {'$filter': {
+            'input': '$items',
+            'as': 'item',
+            'cond': {'$lt': [{'$ifNull': ['$$item.quantity_received', 0]}, '$$item.quantity']}
+        }}}, 0]}}},
+        {'$project': {
+            '_id': 0, 'id': 1, 'po_number': 1, 'created_at': 1, 'department': 1,
+            'items.product_name': 1, 'items.quantity': 1, 'items.quantity_received': 1
+        }}
+    ]).to_list(None)
     
     notifications_created = 0
-    for po in pos:
-        created_at = datetime.fromisoformat(po['created_at']) if isinstance(po['created_at'], str) else po['created_at']
+    if pos:
+        # One find() over the material_pending alerts of the candidate POs (read and unread), so
+        # the scan can tell POs with an open alert from ones whose alert should be raised again
+        existing = await db.notifications.find(
+            {'po_id': {'$in': [po['id'] for po in pos]}, 'notification_type': 'material_pending'},
+            {'_id': 0, 'id': 1, 'po_id': 1, 'department': 1, 'user_id': 1, 'is_read': 1,
+             'occurrences': 1, 'first_created_at': 1, 'created_at': 1}
+        ).to_list(None)
+        unread = {n['po_id'] for n in existing if not n.get('is_read')}
+        # A PO alerted before and since read by everyone gets its old notification raised again
+        # instead of a new one
+        previous = {n['po_id']: n for n in existing if n.get('is_read')}
+        docs = [pending_notification_doc(po, now) for po in pos if po['id'] not in unread and po['id'] not in previous]
+        raised = [(previous[po['id']], pending_notification_doc(po, now)) for po in pos
+                  if po['id'] not in unread and po['id'] in previous]
         
-        if created_at <= ten_days_ago:
-            # Check which items have pending quantities
-            pending_items = []
-            for idx, item in enumerate(po['items']):
-                quantity_received = item.get('quantity_received', 0)
-                pending_qty = item['quantity'] - quantity_received
-                
-                if pending_qty > 0:
-                    pending_items.append({
-                        'index': idx,
-                        'product_name': item['product_name'],
-                        'ordered': item['quantity'],
-                        'received': quantity_received,
-                        'pending': pending_qty
-                    })
-            
-            # Create notification if there are pending items
-            if pending_items:
-                # Check if notification already exists for this PO
-                existing = await db.notifications.find_one({
-                    'po_id': po['id'],
-                    'notification_type': 'material_pending',
-                    'is_read': False
-                })
-                
-                if not existing:
-                    days_old = (datetime.now(timezone.utc) - created_at).days
-                    pending_items_summary = ', '.join([f"{item['product_name']} ({item['pending']} pending)" for item in pending_items[:3]])
-                    if len(pending_items) > 3:
-                        pending_items_summary += f" and {len(pending_items) - 3} more"
-                    
-                    notification_doc = {
-                        'id': str(uuid.uuid4()),
-                        'po_id': po['id'],
-                        'po_number': po['po_number'],
-                        'message': f"Material receipt pending for {po['po_number']} ({days_old} days old). Pending items: {pending_items_summary}",
-                        'notification_type': 'material_pending',
-                        'pending_items': pending_items,
+        # Upserts keyed on (po_id, notification_type) keep concurrent scans from doubling up
+        operations = [
+            UpdateOne(
+                {'po_id': doc['po_id'], 'notification_type': 'material_pending', 'is_read': False},
+                {'$setOnInsert': doc},
+                upsert=True
+            )
+            for doc in docs
+        ]
+        delivered, reraised = [], []
+        if operations:
+            try:
+                result = await db.notifications.bulk_write(operations, ordered=False)
+                upserted = list(result.upserted_ids)
+            except BulkWriteError as e:
+                # Another scan inserted some of the same notifications first
+                upserted = [entry['index'] for entry in e.details.get('upserted', [])]
+            delivered = [docs[index] for index in upserted]
+        
+        for old, doc in raised:
+            try:
+                result = await db.notifications.update_one(
+                    {'id': old['id'], 'is_read': True},
+                    {'$set': {
+                        'message': doc['message'],
+                        'pending_items': doc['pending_items'],
+                        'department': doc['department'],
+                        'user_id': None,
                         'is_read': False,
-                        'created_at': datetime.now(timezone.utc).isoformat()
-                    }
-                    await db.notifications.insert_one(notification_doc)
-                    notifications_created += 1
+                        'occurrences': old.get('occurrences', 1) + 1,
+                        'first_created_at': old.get('first_created_at', old['created_at']),
+                        'created_at': doc['created_at']
+                    }, '$unset': {'read_at': '', 'expires_at': ''}}
+                )
+            except DuplicateKeyError:
+                # Another scan raised an unread alert for this PO meanwhile
+                continue
+            if result.modified_count:
+                await redeliver_notification(old)
+                reraised.append({**doc, 'id': old['id'], 'occurrences': old.get('occurrences', 1) + 1})
+        
+        notifications_created = len(delivered) + len(reraised)
+        if delivered:
+            await deliver_notifications(delivered)
+        if reraised:
+            notifications_changed(reraised)
     
+    await db.scanner_state.update_one(
+        {'_id': PENDING_SCAN_STATE_ID},
+        {'$max': {'high_water_mark': threshold}, '$set': {'last_run_at': now}},
+        upsert=True
+    )
+    return notifications_created
+
+@api_router.post("/notifications/check-pending-pos", status_code=202)
+async def check_pending_pos(full: bool = False, current_user: dict = Depends(get_current_user)):
+    """Queue a scan for POs older than PENDING_PO_DAYS; the scheduler also runs it periodically"""
+    queued = scheduler.trigger('pending_po_scan', full=full)
     return {
-        'message': f'{notifications_created} new notifications created',
-        'notifications_created': notifications_created
+        'message': 'Pending PO check queued' if queued else 'Pending PO check already queued',
+        'queued': queued
     }
 
 @api_router.get("/notifications/unread-count")
 async def get_unread_count(current_user: dict = Depends(get_current_user)):
-    count = await db.notifications.count_documents({'is_read': False})
-    return {'unread_count': count}
+    state = await get_notification_state(current_user['id'])
+    return {'unread_count': max(state.get('unread_notifications', 0), 0)}
 
-# PDF Generation
-@api_router.get("/purchase-orders/{po_id}/pdf")
-async def generate_po_pdf(po_id: str, current_user: dict = Depends(get_current_user)):
-    po = await db.purchase_orders.find_one({'id': po_id}, {'_id': 0})
-    if not po:
-        raise HTTPException(status_code=404, detail="Purchase order not found")
+# Notification retention
+# Notifications expire through a TTL index on expires_at, set once every recipient has read them;
+# a daily job folds duplicate alerts for the same PO together, moves stale ones to cold storage,
+# drops receipts left behind and re-syncs the unread counters.
+NOTIFICATION_READ_TTL_DAYS = int(os.environ.get('NOTIFICATION_READ_TTL_DAYS', '30'))
+NOTIFICATION_ARCHIVE_DAYS = int(os.environ.get('NOTIFICATION_ARCHIVE_DAYS', '90'))
+# Archive to gzipped JSONL files in this directory; unset archives to the notifications_archive collection
+NOTIFICATION_ARCHIVE_DIR = os.environ.get('NOTIFICATION_ARCHIVE_DIR', '')
+NOTIFICATION_ARCHIVE_BATCH = 1000
+NOTIFICATION_RETENTION_INTERVAL_SECONDS = int(os.environ.get('NOTIFICATION_RETENTION_INTERVAL_SECONDS', '86400'))
+
+async def expire_read_notifications(now: datetime) -> int:
+    """Give notifications read by all their recipients an expiry.
+    
+    Reads through "mark all read" don't settle notifications as they happen, so they are caught
+    here, along with read notifications that predate the TTL field.
+    """
+    settled = 0
+    settle = {'$set': {'is_read': True, 'read_at': now, 'expires_at': notification_expiry(now)}}
+    # Recipients are shared by every notification with the same user_id/department, so the work
+    # is a few queries per audience rather than per unread notification
+    audiences = await db.notifications.aggregate([
+        {'$match': {'is_read': False, 'department': {'$exists': True}}},
+        {'$group': {'_id': {'user_id': '$user_id', 'department': '$department'}}}
+    ]).to_list(None)
+    for audience in (group['_id'] for group in audiences):
+        scope = {'is_read': False, 'user_id': audience.get('user_id'), 'department': audience.get('department')}
+        recipients = await db.users.find(
+            notification_recipients_query(audience), {'_id': 0, 'id': 1, 'notifications_read_before': 1}
+        ).to_list(None)
+        watermarks = {
+            user['id']: stored_datetime(user['notifications_read_before']) if user.get('notifications_read_before') else None
+            for user in recipients
+        }
+        # Everything up to the oldest watermark has been read by all of them through "mark all read"
+        if watermarks and None not in watermarks.values():
+            result = await db.notifications.update_many(
+                {'$and': [scope, date_condition('created_at', {'$lte': min(watermarks.values())})]}, settle
+            )
+            settled += result.modified_count
+        # Newer ones are read by all once each recipient whose watermark is behind holds a receipt
+        read_by_all = []
+        async for notification in db.notifications.aggregate([
+            {'$match': scope},
+            {'$lookup': {'from': 'notification_receipts', 'localField': 'id', 'foreignField': 'notification_id', 'as': 'receipts'}},
+            {'$project': {'_id': 0, 'id': 1, 'created_at': 1, 'readers': '$receipts.user_id'}}
+        ]):
+            created_at = stored_datetime(notification['created_at'])
+            readers = set(notification['readers'])
+            if all(user_id in readers or (watermark and watermark >= created_at) for user_id, watermark in watermarks.items()):
+                read_by_all.append(notification['id'])
+        if read_by_all:
+            result = await db.notifications.update_many({'id': {'$in': read_by_all}, 'is_read': False}, settle)
+            settled += result.modified_count
+    result = await db.notifications.update_many(
+        {'is_read': True, 'expires_at': {'$exists': False}},
+        {'$set': {'expires_at': notification_expiry(now)}}
+    )
+    # Receipts used to expire on their own, which would have made notifications unread again
+    await db.notification_receipts.update_many({'expires_at': {'$exists': True}}, {'$unset': {'expires_at': ''}})
+    return settled + result.modified_count
+
+async def remove_orphaned_receipts() -> int:
+    """Delete read receipts whose notification has expired or been archived"""
+    removed = 0
+    notification_ids = await db.notification_receipts.distinct('notification_id')
+    for start in range(0, len(notification_ids), NOTIFICATION_ARCHIVE_BATCH):
+        batch = notification_ids[start:start + NOTIFICATION_ARCHIVE_BATCH]
+        live = set(await db.notifications.distinct('id', {'id': {'$in': batch}}))
+        orphaned = [notification_id for notification_id in batch if notification_id not in live]
+        if orphaned:
+            result = await db.notification_receipts.delete_many({'notification_id': {'$in': orphaned}})
+            removed += result.deleted_count
+    return removed
+
+async def compact_notifications() -> int:
+    """Merge repeated alerts of one type for the same PO into the newest, summing occurrences"""
+    duplicates = await db.notifications.aggregate([
+        {'$group': {'_id': {'po_id': '$po_id', 'type': '$notification_type'}, 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}}
+    ], allowDiskUse=True).to_list(None)
+    
+    removed = 0
+    for group in duplicates:
+        docs = await db.notifications.find(
+            {'po_id': group['_id']['po_id'], 'notification_type': group['_id']['type']},
+            {'_id': 0, 'id': 1, 'department': 1, 'user_id': 1, 'is_read': 1,
+             'occurrences': 1, 'first_created_at': 1, 'created_at': 1}
+        ).sort('created_at', -1).to_list(None)
+        keep, merged = docs[0], docs[1:]
+        merged_ids = [doc['id'] for doc in merged]
+        await retract_notifications(merged)
+        await db.notifications.update_one({'id': keep['id']}, {'$set': {
+            'occurrences': sum(doc.get('occurrences', 1) for doc in docs),
+            'first_created_at': min(stored_datetime(doc.get('first_created_at', doc['created_at'])) for doc in docs)
+        }})
+        result = await db.notifications.delete_many({'id': {'$in': merged_ids}})
+        await db.notification_receipts.delete_many({'notification_id': {'$in': merged_ids}})
+        removed += result.deleted_count
+    return removed
+
+def write_notification_archive(path: Path, docs: List[dict]):
+    with gzip.open(path, 'at', encoding='utf-8') as f:
+        for doc in docs:
+            f.write(json.dumps(jsonable_encoder(doc)) + '\n')
+
+async def archive_notifications(now: datetime) -> int:
+    """Move notifications created more than NOTIFICATION_ARCHIVE_DAYS ago out of the hot collection"""
+    cutoff = now - timedelta(days=NOTIFICATION_ARCHIVE_DAYS)
+    path = None
+    if NOTIFICATION_ARCHIVE_DIR:
+        path = Path(NOTIFICATION_ARCHIVE_DIR) / f"notifications-{now.strftime('%Y%m%dT%H%M%S')}.jsonl.gz"
+        path.parent.mkdir(parents=True, exist_ok=True)
+    
+    archived = 0
+    while True:
+        docs = await db.notifications.find(date_condition('created_at', {'$lt': cutoff})) \
+            .sort('created_at', 1).limit(NOTIFICATION_ARCHIVE_BATCH).to_list(NOTIFICATION_ARCHIVE_BATCH)
+        if not docs:
+            break
+        for doc in docs:
+            doc['archived_at'] = now
+        if path:
+            await asyncio.to_thread(write_notification_archive, path, [
+                {key: value for key, value in doc.items() if key != '_id'} for doc in docs
+            ])
+        else:
+            try:
+                await db.notifications_archive.insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                # Copied by an earlier run that stopped before deleting them; anything else is a real failure
+                if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+                    raise
+        ids = [doc['id'] for doc in docs]
+        await retract_notifications(docs)
+        await db.notifications.delete_many({'_id': {'$in': [doc['_id'] for doc in docs]}})
+        await db.notification_receipts.delete_many({'notification_id': {'$in': ids}})
+        archived += len(docs)
+    return archived
+
+async def reconcile_unread_counters() -> int:
+    """Recount each user's unread notifications.
+    
+    Every write path keeps the counters exact, so this is a safety net: anything it corrects
+    points at a path that doesn't, or at writes made outside the app.
+    """
+    corrected = 0
+    async for user in db.users.find({}, {'_id': 0, 'id': 1, 'role': 1, 'department': 1,
+                                         'unread_notifications': 1, 'notifications_read_before': 1}):
+        receipts = await db.notification_receipts.distinct('notification_id', {'user_id': user['id']})
+        conditions = [
+            notification_visibility_query(user),
+            {'id': {'$nin': receipts}},
+            # Legacy notifications keep their global read flag
+            {'$or': [{'department': {'$exists': True}}, {'is_read': False}]}
+        ]
+        if user.get('notifications_read_before'):
+            conditions.append(date_condition('created_at', {'$gt': stored_datetime(user['notifications_read_before'])}))
+        count = await db.notifications.count_documents({'$and': conditions})
+        if count != user.get('unread_notifications'):
+            # Only overwrite the value we counted against, so a concurrent delivery isn't lost
+            result = await db.users.update_one(
+                {'id': user['id'], 'unread_notifications': user.get('unread_notifications')},
+                {'$set': {'unread_notifications': count}}
+            )
+            corrected += result.modified_count
+    if corrected:
+        logger.warning(f"Corrected {corrected} unread notification counters")
+        notifications_changed()
+    return corrected
+
+async def run_notification_retention() -> dict:
+    now = datetime.now(timezone.utc)
+    return {
+        'expiry_set': await expire_read_notifications(now),
+        'compacted': await compact_notifications(),
+        'archived': await archive_notifications(now),
+        'receipts_removed': await remove_orphaned_receipts(),
+        'counters_corrected': await reconcile_unread_counters()
+    }
+
+# Real-time notification push (Server-Sent Events)
+SSE_HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', '15'))
+SSE_CLIENT_QUEUE_SIZE = 100
+# EventSource can't send headers, so the browser exchanges its login token for one of these
+# and puts it in the stream URL, where proxies and access logs may record it
+SSE_TOKEN_SCOPE = 'notification_stream'
+SSE_TOKEN_SECONDS = int(os.environ.get('SSE_TOKEN_SECONDS', '60'))
+# Longest wait between attempts to reopen a failed change stream
+CHANGE_STREAM_RETRY_MAX_SECONDS = float(os.environ.get('CHANGE_STREAM_RETRY_MAX_SECONDS', '60'))
+
+# The event loop only keeps weak references to tasks, so fire-and-forget tasks are held here
+# until they finish
+background_tasks = set()
+
+def run_in_background(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+class NotificationBroker:
+    """Fans notification events out to connected stream clients.
+    
+    Events come from a MongoDB change stream when the deployment supports one (replica set or
+    sharded cluster). Otherwise, and while a failed change stream is being reopened, the
+    handlers that write notifications publish directly, which only reaches clients connected to
+    this process.
+    """
+    
+    def __init__(self):
+        # queue -> principal of the connected user
+        self.subscribers = {}
+        self.change_stream_active = False
+        self._watch_task = None
+        self._count_scheduled = False
+    
+    def subscribe(self, current_user: dict) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SSE_CLIENT_QUEUE_SIZE)
+        self.subscribers[queue] = current_user
+        return queue
+    
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.pop(queue, None)
+    
+    def _send(self, queue: asyncio.Queue, event: str, data: dict):
+        try:
+            queue.put_nowait((event, data))
+        except asyncio.QueueFull:
+            # Slow client; it catches up with the next unread count
+            pass
+    
+    def publish_notification(self, notification: dict):
+        event = notification_event(notification)
+        for queue, user in list(self.subscribers.items()):
+            if can_see_notification(user, notification):
+                self._send(queue, 'notification', event)
+    
+    def schedule_unread_count(self):
+        """Refresh unread counts once for a burst of changes, and only if anyone is listening"""
+        if self._count_scheduled or not self.subscribers:
+            return
+        self._count_scheduled = True
+        run_in_background(self._publish_unread_counts())
+    
+    async def _publish_unread_counts(self):
+        await asyncio.sleep(0.2)
+        self._count_scheduled = False
+        subscribers = list(self.subscribers.items())
+        user_ids = list({user['id'] for _, user in subscribers})
+        try:
+            # One lookup of the maintained counters for every connected user
+            counters = await db.users.find(
+                {'id': {'$in': user_ids}}, {'_id': 0, 'id': 1, 'unread_notifications': 1}
+            ).to_list(len(user_ids))
+        except Exception as e:
+            logger.error(f"Could not read unread counters: {e}")
+            return
+        counts = {c['id']: max(c.get('unread_notifications', 0), 0) for c in counters}
+        for queue, user in subscribers:
+            self._send(queue, 'unread_count', {'unread_count': counts.get(user['id'], 0)})
+    
+    def start(self):
+        self._watch_task = asyncio.create_task(self._watch())
+    
+    async def stop(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+            await asyncio.gather(self._watch_task, return_exceptions=True)
+    
+    async def _watch(self):
+        pipeline = [{'$match': {'$or': [
+            {'ns.coll': 'notifications', 'operationType': 'insert'},
+            {'ns.coll': 'users', 'updateDescription.updatedFields.unread_notifications': {'$exists': True}},
+        ]}}]
+        delay = 1
+        while True:
+            try:
+                async with db.watch(pipeline) as stream:
+                    self.change_stream_active = True
+                    delay = 1
+                    logger.info("Notification stream fed by MongoDB change stream")
+                    async for change in stream:
+                        if change['ns']['coll'] == 'notifications':
+                            self.publish_notification(change['fullDocument'])
+                        else:
+                            self.schedule_unread_count()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Only the first failure in a row is worth an info line; a standalone server never has streams
+                log = logger.info if delay == 1 else logger.debug
+                log(f"Change stream unavailable ({e}); using in-process publishing, retrying in {delay:g}s")
+            finally:
+                self.change_stream_active = False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, CHANGE_STREAM_RETRY_MAX_SECONDS)
+
+notification_broker = NotificationBroker()
+
+def notification_event(doc: dict) -> dict:
+    return {key: value for key, value in doc.items() if key != '_id'}
+
+def notifications_changed(inserted: List[dict] = ()):
+    """Publish writes made by this process when no change stream is doing it"""
+    if notification_broker.change_stream_active:
+        return
+    for doc in inserted:
+        notification_broker.publish_notification(doc)
+    notification_broker.schedule_unread_count()
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {dumps_json(data).decode('utf-8')}\n\n"
+
+@api_router.post("/notifications/stream-token")
+async def create_stream_token(current_user: dict = Depends(get_current_user)):
+    """Token for opening one notification stream; it is only checked when the stream connects"""
+    return {
+        'token': create_scoped_token(current_user['id'], SSE_TOKEN_SCOPE, SSE_TOKEN_SECONDS),
+        'expires_in': SSE_TOKEN_SECONDS
+    }
+
+@api_router.get("/notifications/stream")
+async def stream_notifications(
+    request: Request,
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
+):
+    """SSE stream of new notifications and unread counts. Authenticates with the usual bearer
+    header, or with ?token= carrying a token from POST /notifications/stream-token."""
+    if credentials:
+        current_user = await resolve_user(credentials.credentials)
+    elif token:
+        current_user = await resolve_user(token, scope=SSE_TOKEN_SCOPE)
+    else:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    async def events():
+        # Subscribed only once the body is iterated, so a response that is never sent can't leak the queue
+        queue = notification_broker.subscribe(current_user)
+        try:
+            state = await get_notification_state(current_user['id'])
+            yield format_sse('unread_count', {'unread_count': max(state.get('unread_notifications', 0), 0)})
+            while not await request.is_disconnected():
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event, data)
+        finally:
+            notification_broker.unsubscribe(queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# Search
+# Typeahead over a precomputed, lowercased search_terms array: each searchable field whole
+# (marked with a leading '='), plus its words. Queries are anchored prefix regexes on that
+# multikey index, so lookups are index range scans however large the catalog. Terms are
+# written with the document itself.
+SEARCH_FIELDS = {
+    'products': ('name', 'sku'),
+    'vendors': ('name',),
+    'purchase_orders': ('po_number', 'vendor_name'),
+}
+SEARCH_MAX_WORDS = 5
+SEARCH_CANDIDATES = 50
+
+def search_words(value) -> List[str]:
+    return [word for word in re.split(r'[\W_]+', str(value).lower()) if word]
+
+def search_terms_for(collection: str, doc: dict) -> List[str]:
+    terms = set()
+    for field in SEARCH_FIELDS[collection]:
+        value = doc.get(field)
+        if value:
+            terms.add('=' + str(value).lower().strip())
+            terms.update(search_words(value))
+    return sorted(terms)
+
+def search_rank(query: str, values: List[str]) -> tuple:
+    """Sort key: exact match, then whole-value prefix, then word prefix; shorter values first"""
+    best = (3, '')
+    for value in values:
+        value = str(value or '').lower()
+        if value == query:
+            rank = 0
+        elif value.startswith(query):
+            rank = 1
+        else:
+            rank = 2
+        best = min(best, (rank, value))
+    return (best[0], len(best[1]), best[1])
+
+async def index_search_terms():
+    """Backfill search_terms on documents written before search existed (idempotent)"""
+    for collection, fields in SEARCH_FIELDS.items():
+        while True:
+            docs = await db[collection].find(
+                {'search_terms': {'$exists': False}}, {field: 1 for field in fields}
+            ).limit(500).to_list(500)
+            if not docs:
+                break
+            await db[collection].bulk_write([
+                UpdateOne({'_id': doc['_id']}, {'$set': {'search_terms': search_terms_for(collection, doc)}})
+                for doc in docs
+            ], ordered=False)
+
+@api_router.get("/search")
+async def search(
+    q: str = Query(..., min_length=1, max_length=100),
+    types: str = 'products,vendors,purchase_orders',
+    limit: int = Query(10, ge=1, le=SEARCH_CANDIDATES),
+    current_user: dict = Depends(get_current_user)
+):
+    """Ranked typeahead over product name/SKU, vendor name and PO number within the user's scope"""
+    requested = [t.strip() for t in types.split(',') if t.strip()]
+    unknown = [t for t in requested if t not in SEARCH_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown search types: {', '.join(unknown)}")
+    
+    query = q.strip().lower()
+    words = search_words(query)[:SEARCH_MAX_WORDS]
+    if not words:
+        return {collection: [] for collection in requested}
+    # Every query word must prefix one of the document's terms
+    match = [{'search_terms': re.compile('^' + re.escape(word))} for word in words]
+    whole = re.compile('^=' + re.escape(query))
+    
+    scopes = {
+        'products': (catalog_scope(current_user), {'_id': 0, 'id': 1, 'name': 1, 'sku': 1, 'unit_price': 1, 'tax_rate': 1, 'unit_of_measure': 1}),
+        'vendors': (catalog_scope(current_user), {'_id': 0, 'id': 1, 'name': 1, 'contact_person': 1, 'address': 1}),
+        'purchase_orders': (po_visibility_query(current_user), {'_id': 0, 'id': 1, 'po_number': 1, 'vendor_name': 1, 'status': 1, 'total': 1}),
+    }
     
+    async def search_collection(collection: str) -> List[dict]:
+        scope, projection = scopes[collection]
+        # Exact values first, then values starting with the whole query, then word matches, so a
+        # common prefix can't crowd the closer matches out of the candidates
+        docs, seen = [], set()
+        for condition in ({'search_terms': '=' + query}, {'search_terms': whole}, {'$and': match}):
+            if len(docs) >= SEARCH_CANDIDATES:
+                break
+            found = await read_db[collection].find({'$and': [scope, condition]}, projection) \
+                .limit(SEARCH_CANDIDATES).to_list(SEARCH_CANDIDATES)
+            docs += [doc for doc in found if doc['id'] not in seen]
+            seen.update(doc['id'] for doc in found)
+        fields = SEARCH_FIELDS[collection]
+        docs.sort(key=lambda doc: search_rank(query, [doc.get(field) for field in fields]))
+        return docs[:limit]
+    
+    results = await asyncio.gather(*(search_collection(collection) for collection in requested))
+    return dict(zip(requested, results))
+
+# Dashboard
+@api_router.get("/dashboard/summary")
+async def get_dashboard_summary(current_user: dict = Depends(get_current_user)):
+    """Aggregated PO statistics for the dashboard, computed in a single pipeline"""
+    query = po_visibility_query(current_user)
+    pipeline = [
+        {'$match': query},
+        {'$facet': {
+            'by_status': [
+                {'$group': {'_id': '$status', 'count': {'$sum': 1}, 'total_value': {'$sum': '$total'}}}
+            ],
+            'by_department': [
+                {'$group': {
+                    '_id': {'$ifNull': ['$department', 'general']},
+                    'count': {'$sum': 1},
+                    'total_value': {'$sum': '$total'}
+                }},
+                {'$sort': {'_id': 1}}
+            ],
+            'pending': [
+                {'$unwind': '$items'},
+                {'$project': {
+                    'pending_qty': {'$subtract': ['$items.quantity', {'$ifNull': ['$items.quantity_received', 0]}]},
+                    'unit_price': '$items.unit_price'
+                }},
+                {'$match': {'pending_qty': {'$gt': 0}}},
+                {'$group': {
+                    '_id': '$_id',
+                    'pending_quantity': {'$sum': '$pending_qty'},
+                    'pending_value': {'$sum': {'$multiply': ['$pending_qty', '$unit_price']}},
+                    'pending_items': {'$sum': 1}
+                }},
+                {'$group': {
+                    '_id': None,
+                    'pending_pos': {'$sum': 1},
+                    'pending_items': {'$sum': '$pending_items'},
+                    'pending_quantity': {'$sum': '$pending_quantity'},
+                    'pending_value': {'$sum': '$pending_value'}
+                }}
+            ],
+            'recent': [
+                {'$sort': {'created_at': -1}},
+                {'$limit': 5},
+                {'$project': {
+                    '_id': 0, 'id': 1, 'po_number': 1, 'vendor_name': 1,
+                    'total': 1, 'status': 1, 'created_at': 1
+                }}
+            ]
+        }}
+    ]
+    result = await read_db.purchase_orders.aggregate(pipeline).to_list(1)
+    facets = result[0] if result else {}
+    
+    by_status = {row['_id']: {'count': row['count'], 'total_value': row['total_value']} for row in facets.get('by_status', [])}
+    by_department = {row['_id']: {'count': row['count'], 'total_value': row['total_value']} for row in facets.get('by_department', [])}
+    pending = facets.get('pending') or [{}]
+    
+    # Vendor and product totals follow the department scoping of their own list endpoints
+    catalog_query = catalog_scope(current_user)
+    total_vendors = await read_db.vendors.count_documents(catalog_query)
+    total_products = await read_db.products.count_documents(catalog_query)
+    
+    # Through the shared encoder, so 'recent' dates come out in the same Z form as the PO endpoints
+    return FastJSONResponse({
+        'total_pos': sum(s['count'] for s in by_status.values()),
+        'total_value': sum(s['total_value'] for s in by_status.values()),
+        'by_status': by_status,
+        'by_department': by_department,
+        'pending_receipt': {
+            'pending_pos': pending[0].get('pending_pos', 0),
+            'pending_items': pending[0].get('pending_items', 0),
+            'pending_quantity': pending[0].get('pending_quantity', 0),
+            'pending_value': pending[0].get('pending_value', 0)
+        },
+        'recent': facets.get('recent', []),
+        'total_vendors': total_vendors,
+        'total_products': total_products
+    })
+
+# PDF Generation
+# Styles are built once per process instead of on every render
+PDF_STYLES = getSampleStyleSheet()
+PDF_TITLE_STYLE = ParagraphStyle('Title', parent=PDF_STYLES['Heading1'], fontSize=24, textColor=colors.HexColor('#0047AB'), alignment=TA_CENTER)
+PDF_HEADING_STYLE = ParagraphStyle('Heading', parent=PDF_STYLES['Heading2'], fontSize=14, textColor=colors.HexColor('#0047AB'))
+PDF_NORMAL_STYLE = PDF_STYLES['Normal']
+PDF_SMALL_STYLE = ParagraphStyle('Small', parent=PDF_STYLES['Normal'], fontSize=8, textColor=colors.grey)
+PDF_INFO_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+])
+PDF_VENDOR_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+])
+PDF_ITEMS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0047AB')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+    ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+])
+PDF_TOTALS_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTNAME', (0, 2), (-1, 2), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 12),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('LINEABOVE', (0, 2), (-1, 2), 2, colors.HexColor('#0047AB')),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+])
+
+# Bump when the layout below changes so cached PDFs and ETags are invalidated
+PDF_LAYOUT_VERSION = '1'
+# Processes used for rendering; 0 renders on a thread of the default executor instead
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', '2'))
+PDF_CACHE_MAX_BYTES = int(os.environ.get('PDF_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+def render_po_pdf(po: dict) -> bytes:
+    """Build the PO PDF. Pure and picklable so it can run in a worker process."""
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=0.75*inch, leftMargin=0.75*inch, topMargin=0.75*inch, bottomMargin=0.75*inch)
     
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=24, textColor=colors.HexColor('#0047AB'), alignment=TA_CENTER)
-    heading_style = ParagraphStyle('Heading', parent=styles['Heading2'], fontSize=14, textColor=colors.HexColor('#0047AB'))
-    normal_style = styles['Normal']
-    
     story = []
     
     # Title
-    story.append(Paragraph("PURCHASE ORDER", title_style))
+    story.append(Paragraph("PURCHASE ORDER", PDF_TITLE_STYLE))
     story.append(Spacer(1, 0.3*inch))
     
     # PO Info
-    created_at = datetime.fromisoformat(po['created_at']) if isinstance(po['created_at'], str) else po['created_at']
     info_data = [
-        ['PO Number:', po['po_number'], 'Date:', created_at.strftime('%Y-%m-%d')],
+        ['PO Number:', po['po_number'], 'Date:', stored_datetime(po['created_at']).strftime('%Y-%m-%d')],
         ['Status:', po['status'].upper(), 'Created By:', po['created_by']]
     ]
     info_table = Table(info_data, colWidths=[1.5*inch, 2*inch, 1*inch, 2*inch])
-    info_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-    ]))
+    info_table.setStyle(PDF_INFO_TABLE_STYLE)
     story.append(info_table)
     story.append(Spacer(1, 0.3*inch))
     
     # Vendor Info
-    story.append(Paragraph("Vendor Information", heading_style))
+    story.append(Paragraph("Vendor Information", PDF_HEADING_STYLE))
     story.append(Spacer(1, 0.1*inch))
     vendor_data = [
         ['Vendor:', po['vendor_name']],
@@ -717,16 +2593,12 @@ async def generate_po_pdf(po_id: str, current_user: dict = Depends(get_current_u
         ['Payment Terms:', po['payment_terms']]
     ]
     vendor_table = Table(vendor_data, colWidths=[1.5*inch, 5*inch])
-    vendor_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-    ]))
+    vendor_table.setStyle(PDF_VENDOR_TABLE_STYLE)
     story.append(vendor_table)
     story.append(Spacer(1, 0.3*inch))
     
     # Items
-    story.append(Paragraph("Line Items", heading_style))
+    story.append(Paragraph("Line Items", PDF_HEADING_STYLE))
     story.append(Spacer(1, 0.1*inch))
     
     items_data = [['#', 'Product', 'Qty', 'Unit Price', 'Tax Rate', 'Tax Amt', 'Total']]
@@ -742,16 +2614,7 @@ async def generate_po_pdf(po_id: str, current_user: dict = Depends(get_current_u
         ])
     
     items_table = Table(items_data, colWidths=[0.4*inch, 2.2*inch, 0.6*inch, 1*inch, 0.8*inch, 0.9*inch, 1*inch])
-    items_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0047AB')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-        ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
+    items_table.setStyle(PDF_ITEMS_TABLE_STYLE)
     story.append(items_table)
     story.append(Spacer(1, 0.2*inch))
     
@@ -762,42 +2625,676 @@ async def generate_po_pdf(po_id: str, current_user: dict = Depends(get_current_u
         ['Total:', f"₹{po['total']:.2f}"]
     ]
     totals_table = Table(totals_data, colWidths=[5.5*inch, 1*inch])
-    totals_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (0, 2), (-1, 2), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 12),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('LINEABOVE', (0, 2), (-1, 2), 2, colors.HexColor('#0047AB')),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-    ]))
+    totals_table.setStyle(PDF_TOTALS_TABLE_STYLE)
     story.append(totals_table)
     
     # Notes
     if po.get('notes'):
         story.append(Spacer(1, 0.3*inch))
-        story.append(Paragraph("Notes", heading_style))
+        story.append(Paragraph("Notes", PDF_HEADING_STYLE))
         story.append(Spacer(1, 0.1*inch))
-        story.append(Paragraph(po['notes'], normal_style))
+        story.append(Paragraph(po['notes'], PDF_NORMAL_STYLE))
     
     # Authorized Signatory
     if po.get('authorized_signatory'):
         story.append(Spacer(1, 0.4*inch))
-        story.append(Paragraph("Authorized Signatory", heading_style))
+        story.append(Paragraph("Authorized Signatory", PDF_HEADING_STYLE))
         story.append(Spacer(1, 0.1*inch))
-        story.append(Paragraph(po['authorized_signatory'], normal_style))
+        story.append(Paragraph(po['authorized_signatory'], PDF_NORMAL_STYLE))
         story.append(Spacer(1, 0.5*inch))
-        story.append(Paragraph("_________________________", normal_style))
-        story.append(Paragraph("Signature", ParagraphStyle('Small', parent=styles['Normal'], fontSize=8, textColor=colors.grey)))
+        story.append(Paragraph("_________________________", PDF_NORMAL_STYLE))
+        story.append(Paragraph("Signature", PDF_SMALL_STYLE))
     
     doc.build(story)
-    buffer.seek(0)
+    return buffer.getvalue()
+
+def timed_render_po_pdf(po: dict) -> tuple:
+    """render_po_pdf plus its duration, measured inside the worker so queueing isn't counted"""
+    started = time.perf_counter()
+    pdf = render_po_pdf(po)
+    return pdf, time.perf_counter() - started
+
+def po_content_hash(po: dict) -> str:
+    """Content address of a PO document as rendered by PDF_LAYOUT_VERSION"""
+    canonical = json.dumps(po, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(f"{PDF_LAYOUT_VERSION}:{canonical}".encode('utf-8')).hexdigest()
+
+class PdfCache:
+    """LRU cache of rendered PDFs keyed by content hash and bounded by total size"""
     
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+    
+    def get(self, key: str) -> Optional[bytes]:
+        pdf = self._entries.get(key)
+        if pdf is not None:
+            self._entries.move_to_end(key)
+        return pdf
+    
+    def set(self, key: str, pdf: bytes):
+        if len(pdf) > self.max_bytes or key in self._entries:
+            return
+        self._entries[key] = pdf
+        self.size += len(pdf)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+pdf_cache = PdfCache(PDF_CACHE_MAX_BYTES)
+pdf_executor = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context('spawn')) if PDF_WORKERS > 0 else None
+# Renders in progress, so concurrent requests for the same PO share one render
+pdf_renders_in_flight = {}
+
+def record_pdf_render(render: asyncio.Future):
+    if not render.cancelled() and render.exception() is None:
+        pdf_render_seconds.observe(render.result()[1])
+
+async def get_po_pdf(po: dict, content_hash: Optional[str] = None, store: bool = True) -> bytes:
+    """Rendered PDF for a PO document, served from the cache when the content is unchanged"""
+    content_hash = content_hash or po_content_hash(po)
+    pdf = pdf_cache.get(content_hash)
+    if pdf is not None:
+        pdf_cache_requests.inc('hit')
+        return pdf
+    
+    render = pdf_renders_in_flight.get(content_hash)
+    if render is None:
+        pdf_cache_requests.inc('miss')
+        loop = asyncio.get_running_loop()
+        render = asyncio.ensure_future(loop.run_in_executor(pdf_executor, timed_render_po_pdf, po))
+        pdf_renders_in_flight[content_hash] = render
+        render.add_done_callback(lambda _: pdf_renders_in_flight.pop(content_hash, None))
+        render.add_done_callback(record_pdf_render)
+    else:
+        pdf_cache_requests.inc('shared')
+    pdf, _ = await asyncio.shield(render)
+    if store:
+        pdf_cache.set(content_hash, pdf)
+    return pdf
+
+BULK_PDF_CONCURRENCY = int(os.environ.get('BULK_PDF_CONCURRENCY', str(max(PDF_WORKERS, 1) * 2)))
+
+class ZipChunkStream:
+    """Unseekable write target for ZipFile that hands back whatever was written since the last drain"""
+    
+    def __init__(self):
+        self._chunks = []
+    
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+async def stream_po_pdf_zip(query: dict):
+    stream = ZipChunkStream()
+    archive = zipfile.ZipFile(stream, mode='w', compression=zipfile.ZIP_STORED)
+    names = set()
+    failed = []
+    pending = set()
+    task_pos = {}
+    
+    async def render(po: dict):
+        # Bulk renders skip storing into the cache so a month's export doesn't evict hot entries
+        return po, await get_po_pdf(po, store=False)
+    
+    def add_to_archive(task) -> bytes:
+        try:
+            po, pdf = task.result()
+        except Exception as e:
+            po = task_pos[task]
+            logger.error(f"Bulk PDF export failed for {po.get('po_number')}: {e}")
+            failed.append(po.get('po_number', po.get('id')))
+            return b''
+        name = f"{po['po_number']}.pdf"
+        suffix = 1
+        while name in names:
+            suffix += 1
+            name = f"{po['po_number']}-{suffix}.pdf"
+        names.add(name)
+        archive.writestr(name, pdf)
+        return stream.drain()
+    
+    try:
+        cursor = db.purchase_orders.find(query, {'_id': 0}).sort([('created_at', -1), ('id', -1)]).batch_size(BULK_PDF_CONCURRENCY)
+        async for po in cursor:
+            task = asyncio.ensure_future(render(po))
+            task_pos[task] = po
+            pending.add(task)
+            if len(pending) >= BULK_PDF_CONCURRENCY:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield add_to_archive(task)
+                    del task_pos[task]
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield add_to_archive(task)
+                del task_pos[task]
+        
+        if failed:
+            archive.writestr('ERRORS.txt', 'Could not render:\n' + '\n'.join(failed) + '\n')
+        archive.close()
+        yield stream.drain()
+    finally:
+        # Client went away mid-stream: don't leave renders running for nobody
+        for task in pending:
+            task.cancel()
+
+@api_router.get("/purchase-orders/{po_id}/pdf")
+async def generate_po_pdf(po_id: str, request: Request, current_user: dict = Depends(get_current_user)):
+    po = await db.purchase_orders.find_one({'id': po_id}, {'_id': 0})
+    if not po:
+        raise HTTPException(status_code=404, detail="Purchase order not found")
+    
+    content_hash = po_content_hash(po)
+    etag = f'"{content_hash}"'
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    
+    if_none_match = request.headers.get('if-none-match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+        return Response(status_code=304, headers=headers)
+    
+    pdf = await get_po_pdf(po, content_hash)
     return Response(
-        content=buffer.getvalue(),
+        content=pdf,
         media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename={po['po_number']}.pdf"}
+        headers={**headers, "Content-Disposition": f"attachment; filename={po['po_number']}.pdf"}
     )
 
+# Background jobs
+JOB_SCHEDULER_ENABLED = os.environ.get('JOB_SCHEDULER_ENABLED', 'true').lower() == 'true'
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', '600'))
+# A running job extends its lease this often, so runs longer than JOB_LEASE_SECONDS keep it
+JOB_LEASE_RENEW_SECONDS = float(os.environ.get('JOB_LEASE_RENEW_SECONDS', str(JOB_LEASE_SECONDS / 3)))
+JOB_HISTORY_DAYS = int(os.environ.get('JOB_HISTORY_DAYS', '30'))
+PENDING_PO_SCAN_INTERVAL_SECONDS = int(os.environ.get('PENDING_PO_SCAN_INTERVAL_SECONDS', '3600'))
+
+class ScheduledJob:
+    def __init__(self, name: str, func, interval: float):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        # Holds at most one pending manual run; repeated triggers coalesce into it
+        self.queue = asyncio.Queue(maxsize=1)
+        self.running = False
+
+class JobScheduler:
+    """In-process asyncio scheduler; a MongoDB lease makes sure only one replica runs a job at a time"""
+    
+    def __init__(self):
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.jobs = {}
+        self._tasks = []
+    
+    def register(self, name: str, func, interval: float):
+        self.jobs[name] = ScheduledJob(name, func, interval)
+    
+    def start(self):
+        self._tasks = [asyncio.create_task(self._loop(job)) for job in self.jobs.values()]
+    
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+    
+    def trigger(self, name: str, **kwargs) -> bool:
+        """Queue a manual run of a job; returns False if one is already waiting"""
+        job = self.jobs[name]
+        if not self._tasks:
+            # Scheduler disabled in this process: run in the background rather than inline
+            run_in_background(self.run(job, 'manual', kwargs))
+            return True
+        try:
+            job.queue.put_nowait(('manual', kwargs))
+            return True
+        except asyncio.QueueFull:
+            return False
+    
+    async def _loop(self, job: ScheduledJob):
+        trigger, kwargs = 'startup', {}
+        while True:
+            await self.run(job, trigger, kwargs)
+            try:
+                trigger, kwargs = await asyncio.wait_for(job.queue.get(), timeout=job.interval)
+            except asyncio.TimeoutError:
+                trigger, kwargs = 'schedule', {}
+    
+    async def _acquire_lease(self, name: str) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            await db.job_leases.find_one_and_update(
+                {'_id': name, '$or': [{'expires_at': {'$lt': now}}, {'owner': self.instance_id}]},
+                {'$set': {'owner': self.instance_id, 'expires_at': now + timedelta(seconds=JOB_LEASE_SECONDS)}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # The lease exists and is held by another replica
+            return False
+    
+    async def _renew_lease(self, name: str):
+        while True:
+            await asyncio.sleep(JOB_LEASE_RENEW_SECONDS)
+            try:
+                result = await db.job_leases.update_one(
+                    {'_id': name, 'owner': self.instance_id},
+                    {'$set': {'expires_at': datetime.now(timezone.utc) + timedelta(seconds=JOB_LEASE_SECONDS)}}
+                )
+            except Exception as e:
+                logger.error(f"Could not renew lease for job {name}: {e}")
+                continue
+            if result.matched_count == 0:
+                logger.warning(f"Job {name} lost its lease while running")
+                return
+    
+    async def _release_lease(self, name: str):
+        await db.job_leases.delete_one({'_id': name, 'owner': self.instance_id})
+    
+    async def run(self, job: ScheduledJob, trigger: str, kwargs: dict):
+        if job.running:
+            return
+        try:
+            if not await self._acquire_lease(job.name):
+                logger.info(f"Job {job.name} is running on another instance, skipping")
+                return
+        except Exception as e:
+            logger.error(f"Could not acquire lease for job {job.name}: {e}")
+            return
+        
+        job.running = True
+        renewal = asyncio.create_task(self._renew_lease(job.name))
+        started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        run_doc = {
+            'id': str(uuid.uuid4()),
+            'job': job.name,
+            'trigger': trigger,
+            'instance': self.instance_id,
+            'started_at': started_at
+        }
+        try:
+            run_doc['result'] = await job.func(**kwargs)
+            run_doc['status'] = 'success'
+        except Exception as e:
+            logger.exception(f"Job {job.name} failed")
+            run_doc.update(status='error', error=str(e))
+        finally:
+            renewal.cancel()
+            job.running = False
+            run_doc['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            run_doc['finished_at'] = datetime.now(timezone.utc)
+            try:
+                await db.job_runs.insert_one(run_doc)
+                await self._release_lease(job.name)
+            except Exception as e:
+                logger.error(f"Could not record run of job {job.name}: {e}")
+
+scheduler = JobScheduler()
+scheduler.register('pending_po_scan', scan_pending_pos, PENDING_PO_SCAN_INTERVAL_SECONDS)
+scheduler.register('notification_retention', run_notification_retention, NOTIFICATION_RETENTION_INTERVAL_SECONDS)
+
+@api_router.get("/jobs")
+async def get_jobs(current_user: dict = Depends(get_current_user)):
+    if current_user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    jobs = []
+    for job in scheduler.jobs.values():
+        last_run = await db.job_runs.find_one({'job': job.name}, {'_id': 0}, sort=[('started_at', -1)])
+        jobs.append({
+            'name': job.name,
+            'interval_seconds': job.interval,
+            'running': job.running,
+            'queued': job.queue.full(),
+            'last_run': last_run
+        })
+    return jobs
+
+@api_router.get("/jobs/{job_name}/runs")
+async def get_job_runs(job_name: str, limit: int = Query(50, ge=1, le=500), current_user: dict = Depends(get_current_user)):
+    if current_user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    if job_name not in scheduler.jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return await db.job_runs.find({'job': job_name}, {'_id': 0}).sort('started_at', -1).limit(limit).to_list(limit)
+
+@api_router.post("/jobs/{job_name}/trigger", status_code=202)
+async def trigger_job(job_name: str, current_user: dict = Depends(get_current_user)):
+    if current_user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    if job_name not in scheduler.jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    queued = scheduler.trigger(job_name)
+    return {'message': 'Job queued' if queued else 'Job already queued', 'queued': queued}
+
+# Database connection pool
+async def warm_mongo_pool():
+    """Open MONGO_MIN_POOL_SIZE connections up front so the first burst doesn't pay for handshakes"""
+    started = time.perf_counter()
+    # Concurrent pings each hold a connection, so the pool grows to the requested size
+    await asyncio.gather(*(client.admin.command('ping') for _ in range(max(MONGO_MIN_POOL_SIZE, 1))))
+    if MONGO_LIST_READ_PREFERENCE.lower() != 'primary':
+        await asyncio.gather(*(
+            read_db.command('ping', read_preference=read_db.read_preference)
+            for _ in range(max(MONGO_MIN_POOL_SIZE, 1))
+        ))
+    logger.info(f"MongoDB pool warmed with {MONGO_MIN_POOL_SIZE} connections in {time.perf_counter() - started:.3f}s")
+
+@api_router.get("/db/pool")
+async def get_db_pool_stats(current_user: dict = Depends(get_current_user)):
+    if current_user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    counts, wait_total, checkouts = mongo_pool_wait_seconds.snapshot()
+    return {
+        **mongo_pool_stats,
+        'checkouts': checkouts,
+        'wait_seconds_total': wait_total,
+        'wait_seconds_avg': wait_total / checkouts if checkouts else 0.0,
+        'wait_histogram': [
+            {'le': bound, 'count': count}
+            for bound, count in zip([*MONGO_POOL_WAIT_BUCKETS, None], counts)
+        ],
+        'max_pool_size': MONGO_MAX_POOL_SIZE,
+        'min_pool_size': MONGO_MIN_POOL_SIZE,
+        'wait_queue_timeout_ms': MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        'list_read_preference': read_db.read_preference.mongos_mode,
+    }
+
+# Metrics endpoint
+EVENT_LOOP_LAG_INTERVAL_SECONDS = float(os.environ.get('EVENT_LOOP_LAG_INTERVAL_SECONDS', '0.5'))
+
+class EventLoopLagMonitor:
+    """Sleeps in a loop and records how much later than asked it wakes up"""
+    
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task = None
+    
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+    
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            event_loop_lag_seconds.observe(max(time.perf_counter() - started - self.interval, 0.0))
+
+loop_lag_monitor = EventLoopLagMonitor(EVENT_LOOP_LAG_INTERVAL_SECONDS)
+
+def gauge_lines(name: str, help_text: str, value, kind: str = 'gauge') -> List[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+
+def render_metrics() -> str:
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    # Point-in-time values kept by the pools themselves
+    lines += gauge_lines('mongodb_pool_waiting', 'Requests waiting for a pooled connection', mongo_pool_stats['waiting'])
+    lines += gauge_lines('mongodb_pool_connections_open', 'Open pooled connections', mongo_pool_stats['connections_open'])
+    lines += ["# HELP mongodb_pool_checkout_failures_total Failed connection checkouts by reason",
+              "# TYPE mongodb_pool_checkout_failures_total counter"]
+    for reason, count in sorted(mongo_pool_stats['checkout_failures'].items()):
+        lines.append(f"mongodb_pool_checkout_failures_total{metric_labels(('reason',), (reason,))} {count}")
+    lines += gauge_lines('bcrypt_in_flight', 'bcrypt calls queued or running', password_pool_stats['in_flight'])
+    lines += gauge_lines('bcrypt_rejected_total', 'bcrypt calls shed because the queue was full', password_pool_stats['rejected'], 'counter')
+    lines += gauge_lines('pdf_cache_bytes', 'Bytes held by the PDF cache', pdf_cache.size)
+    lines += gauge_lines('sse_subscribers', 'Open notification streams', len(notification_broker.subscribers))
+    return '\n'.join(lines) + '\n'
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if METRICS_TOKEN and request.headers.get('authorization') != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    if not METRICS_ENABLED:
+        return await call_next(request)
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        # Label by route template, not the raw path, so ids don't blow up the series count
+        route = request.scope.get('route')
+        http_request_seconds.observe(
+            time.perf_counter() - started,
+            request.method,
+            route.path if route is not None else 'unmatched',
+            status_code
+        )
+
+# Request profiler
+# A sampling thread snapshots the event loop thread's stack every PROFILE_INTERVAL_MS and
+# charges it to the request whose task is running, so concurrent requests don't blur together
+# the way they would under cProfile. Time spent awaiting I/O shows up in the MongoDB commands
+# recorded alongside instead. Only slow or explicitly requested profiles are kept.
+PROFILE_SLOW_SECONDS = float(os.environ.get('PROFILE_SLOW_SECONDS', '1.0'))
+PROFILE_HEADER = os.environ.get('PROFILE_HEADER', 'X-Debug-Profile')
+# Fraction of requests sampled; profiles are only kept for those
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '1.0'))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '5'))
+PROFILE_BUFFER_SIZE = int(os.environ.get('PROFILE_BUFFER_SIZE', '20'))
+PROFILE_MAX_COMMANDS = 200
+PROFILE_MAX_STACKS = 500
+PROFILE_COMMAND_CHARS = 300
+ASYNCIO_DIR = os.path.dirname(asyncio.__file__)
+
+def fold_stack(frame) -> str:
+    """Collapse a stack into root-first 'func (file:line);...' form, starting below the event loop"""
+    names = []
+    while frame is not None and not frame.f_code.co_filename.startswith(ASYNCIO_DIR):
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+def command_summary(command_name: str, command) -> str:
+    """The filter or pipeline of a driver command, trimmed for display"""
+    if command_name in ('update', 'delete') and command.get(command_name + 's'):
+        shape = command[command_name + 's'][0].get('q')
+    else:
+        shape = next((command[key] for key in ('filter', 'query', 'pipeline') if key in command), None)
+    if shape is None:
+        return ''
+    return dumps_json(shape).decode('utf-8')[:PROFILE_COMMAND_CHARS]
+
+class RequestProfile:
+    def __init__(self, request: Request, forced: bool):
+        self.id = str(uuid.uuid4())
+        self.method = request.method
+        self.path = request.url.path
+        self.query = request.url.query
+        self.forced = forced
+        self.started_at = datetime.now(timezone.utc)
+        self.stacks = {}
+        self.commands = []
+        self.dropped_commands = 0
+        self._lock = threading.Lock()
+    
+    def add_sample(self, stack: str):
+        with self._lock:
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+    
+    def start_command(self, event, collection: str) -> Optional[dict]:
+        # Called from Motor's threads
+        with self._lock:
+            if len(self.commands) >= PROFILE_MAX_COMMANDS:
+                self.dropped_commands += 1
+                return None
+            entry = {
+                'command': event.command_name,
+                'collection': collection,
+                'filter': command_summary(event.command_name, event.command),
+                'duration_ms': None,
+                'failed': False,
+            }
+            self.commands.append(entry)
+            return entry
+    
+    def finish(self, route: str, status_code: int, duration: float) -> dict:
+        with self._lock:
+            stacks = sorted(self.stacks.items(), key=lambda item: item[1], reverse=True)
+            commands = list(self.commands)
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'query': self.query,
+            'route': route,
+            'status': status_code,
+            'trigger': 'header' if self.forced else 'slow',
+            'started_at': self.started_at,
+            'duration_seconds': round(duration, 6),
+            'sample_interval_ms': PROFILE_INTERVAL_MS,
+            'samples': sum(count for _, count in stacks),
+            'stacks': [{'stack': stack, 'count': count} for stack, count in stacks[:PROFILE_MAX_STACKS]],
+            'commands': commands,
+            'dropped_commands': self.dropped_commands,
+            'command_ms_total': round(sum(c['duration_ms'] or 0 for c in commands), 3),
+        }
+
+class StackSampler:
+    """Samples the event loop thread while at least one request is being profiled"""
+    
+    def __init__(self, interval_ms: float, buffer_size: int):
+        self.interval = interval_ms / 1000
+        self.profiles = deque(maxlen=buffer_size)
+        # Task -> profile, for every task a profiled request started
+        self.tasks = {}
+        self.active = 0
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.loop = None
+        self.loop_thread_id = None
+    
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        previous_factory = self.loop.get_task_factory()
+        
+        def task_factory(loop, coro, **kwargs):
+            task = previous_factory(loop, coro, **kwargs) if previous_factory else asyncio.Task(coro, loop=loop, **kwargs)
+            context = kwargs.get('context')
+            profile = context.get(current_request_profile) if context is not None else current_request_profile.get()
+            if profile is not None:
+                self.track(task, profile)
+            return task
+        
+        self.loop.set_task_factory(task_factory)
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+    
+    def track(self, task: asyncio.Task, profile: RequestProfile):
+        self.tasks[task] = profile
+        task.add_done_callback(lambda done: self.tasks.pop(done, None))
+    
+    def begin(self):
+        self.active += 1
+        self._wake.set()
+    
+    def end(self):
+        self.active -= 1
+        if self.active == 0:
+            self._wake.clear()
+    
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait()
+            time.sleep(self.interval)
+            frame = sys._current_frames().get(self.loop_thread_id)
+            profile = self.tasks.get(asyncio.current_task(self.loop))
+            if profile is not None and frame is not None:
+                profile.add_sample(fold_stack(frame))
+            del frame
+
+stack_sampler = StackSampler(PROFILE_INTERVAL_MS, PROFILE_BUFFER_SIZE)
+
+@app.middleware("http")
+async def profile_slow_requests(request: Request, call_next):
+    forced = PROFILE_HEADER.lower() in request.headers
+    if not PROFILER_ENABLED or not (forced or random.random() < PROFILE_SAMPLE_RATE):
+        return await call_next(request)
+    
+    profile = RequestProfile(request, forced)
+    token = current_request_profile.set(profile)
+    stack_sampler.track(asyncio.current_task(), profile)
+    stack_sampler.begin()
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        duration = time.perf_counter() - started
+        stack_sampler.end()
+        stack_sampler.tasks.pop(asyncio.current_task(), None)
+        current_request_profile.reset(token)
+        if forced or duration >= PROFILE_SLOW_SECONDS:
+            route = request.scope.get('route')
+            stack_sampler.profiles.append(profile.finish(route.path if route is not None else 'unmatched', status_code, duration))
+
+@api_router.get("/debug/profiles")
+async def get_request_profiles(current_user: dict = Depends(get_current_user)):
+    if current_user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    summary_fields = ('id', 'method', 'path', 'route', 'status', 'trigger', 'started_at', 'duration_seconds', 'samples', 'command_ms_total')
+    return {
+        'enabled': PROFILER_ENABLED,
+        'slow_seconds': PROFILE_SLOW_SECONDS,
+        'header': PROFILE_HEADER,
+        'profiles': [
+            {**{field: profile[field] for field in summary_fields}, 'commands': len(profile['commands'])}
+            for profile in reversed(stack_sampler.profiles)
+        ],
+    }
+
+def find_request_profile(profile_id: str) -> dict:
+    profile = next((p for p in stack_sampler.profiles if p['id'] == profile_id), None)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+@api_router.get("/debug/profiles/{profile_id}")
+async def get_request_profile(profile_id: str, current_user: dict = Depends(get_current_user)):
+    if current_user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return find_request_profile(profile_id)
+
+@api_router.get("/debug/profiles/{profile_id}/flame")
+async def get_request_profile_flame(profile_id: str, current_user: dict = Depends(get_current_user)):
+    """Folded stacks, one 'frame;frame;... count' line each, for flamegraph.pl or speedscope"""
+    if current_user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    profile = find_request_profile(profile_id)
+    folded = ''.join(f"{entry['stack'] or '[event loop]'} {entry['count']}\n" for entry in profile['stacks'])
+    return Response(folded, media_type="text/plain; charset=utf-8")
+
 app.include_router(api_router)
 
 app.add_middleware(
@@ -806,6 +3303,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 logging.basicConfig(
@@ -814,6 +3312,243 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
+# Date migration
+# Timestamps used to be written as ISO strings. They are stored as BSON datetimes now so range
+# filters and sorts compare dates; a background job converts older documents in place. Until it
+# has finished, readers go through stored_datetime() and date_condition(), which handle both.
+DATE_FIELDS = {
+    'users': ('created_at', 'notifications_read_before'),
+    'vendors': ('created_at',),
+    'products': ('created_at',),
+    'purchase_orders': ('created_at',),
+    'notifications': ('created_at', 'first_created_at', 'read_at'),
+    'notification_receipts': ('read_at',),
+    'notifications_archive': ('created_at', 'first_created_at', 'read_at', 'archived_at'),
+    'scanner_state': ('high_water_mark', 'last_run_at'),
+}
+DATE_MIGRATION_ID = 'bson_dates'
+DATE_MIGRATION_BATCH = int(os.environ.get('DATE_MIGRATION_BATCH', '500'))
+DATE_MIGRATION_INTERVAL_SECONDS = int(os.environ.get('DATE_MIGRATION_INTERVAL_SECONDS', '300'))
+
+# Set once this process has seen the migration finish; string dates can't appear after that
+date_migration = {'complete': False}
+
+def parse_stored_date(value: str) -> Optional[datetime]:
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def stored_datetime(value):
+    """A stored timestamp as a datetime, whichever format it was written in"""
+    return parse_stored_date(value) if isinstance(value, str) else value
+
+def date_condition(field: str, condition: dict) -> dict:
+    """Filter on a date field that also matches values still stored as ISO strings"""
+    if date_migration['complete']:
+        return {field: condition}
+    # The old strings were all written by isoformat() in UTC, so they compare in date order
+    legacy = {
+        operator: value.astimezone(timezone.utc).isoformat() if isinstance(value, datetime) else value
+        for operator, value in condition.items()
+    }
+    return {'$or': [{field: condition}, {field: legacy}]}
+
+async def refresh_date_migration_state() -> bool:
+    state = await db.migrations.find_one({'_id': DATE_MIGRATION_ID}, {'completed_at': 1})
+    date_migration['complete'] = bool(state and state.get('completed_at'))
+    return date_migration['complete']
+
+async def migrate_dates() -> dict:
+    """Convert string timestamps to datetimes in batches; runs as a background job.
+    
+    Progress is recorded per collection in db.migrations, so an interrupted run resumes after
+    the last converted _id. Each update is guarded on the string it read, and running it again
+    (or on several instances at once) is harmless.
+    """
+    if await refresh_date_migration_state():
+        return {'converted': 0}
+    state = await db.migrations.find_one({'_id': DATE_MIGRATION_ID}) or {}
+    total_converted = 0
+    
+    for collection, fields in DATE_FIELDS.items():
+        progress = state.get('collections', {}).get(collection, {})
+        if progress.get('done'):
+            continue
+        last_id = progress.get('last_id')
+        while True:
+            query = {'$or': [{field: {'$type': 'string'}} for field in fields]}
+            if last_id is not None:
+                query['_id'] = {'$gt': last_id}
+            docs = await db[collection].find(query, {field: 1 for field in fields}) \
+                .sort('_id', 1).limit(DATE_MIGRATION_BATCH).to_list(DATE_MIGRATION_BATCH)
+            if not docs:
+                break
+            
+            operations = []
+            for doc in docs:
+                guard, updates = {'_id': doc['_id']}, {}
+                for field in fields:
+                    if not isinstance(doc.get(field), str):
+                        continue
+                    parsed = parse_stored_date(doc[field])
+                    if parsed is None:
+                        logger.warning(f"Leaving unparseable {collection}.{field} on {doc['_id']}: {doc[field]!r}")
+                        continue
+                    guard[field] = doc[field]
+                    updates[field] = parsed
+                if updates:
+                    operations.append(UpdateOne(guard, {'$set': updates}))
+            converted = 0
+            if operations:
+                result = await db[collection].bulk_write(operations, ordered=False)
+                converted = result.modified_count
+                total_converted += converted
+            
+            last_id = docs[-1]['_id']
+            await db.migrations.update_one(
+                {'_id': DATE_MIGRATION_ID},
+                {'$set': {f'collections.{collection}.last_id': last_id},
+                 '$inc': {f'collections.{collection}.converted': converted}},
+                upsert=True
+            )
+        await db.migrations.update_one(
+            {'_id': DATE_MIGRATION_ID},
+            {'$set': {f'collections.{collection}.done': True}},
+            upsert=True
+        )
+        logger.info(f"Converted string timestamps in {collection}")
+    
+    await db.migrations.update_one(
+        {'_id': DATE_MIGRATION_ID},
+        {'$set': {'completed_at': datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    date_migration['complete'] = True
+    return {'converted': total_converted}
+
+scheduler.register('date_migration', migrate_dates, DATE_MIGRATION_INTERVAL_SECONDS)
+
+# Indexes backing the lookups made by the endpoints above: (collection, keys, options)
+INDEX_SPECS = [
+    ('users', [('id', ASCENDING)], {'unique': True}),
+    ('users', [('username', ASCENDING)], {'unique': True}),
+    ('users', [('department', ASCENDING)], {}),
+    ('vendors', [('id', ASCENDING)], {'unique': True}),
+    ('vendors', [('department', ASCENDING)], {}),
+    ('products', [('id', ASCENDING)], {'unique': True}),
+    ('products', [('department', ASCENDING)], {}),
+    ('products', [('department', ASCENDING), ('search_terms', ASCENDING)], {}),
+    ('products', [('search_terms', ASCENDING)], {}),
+    ('vendors', [('department', ASCENDING), ('search_terms', ASCENDING)], {}),
+    ('vendors', [('search_terms', ASCENDING)], {}),
+    ('purchase_orders', [('department', ASCENDING), ('search_terms', ASCENDING)], {}),
+    ('purchase_orders', [('search_terms', ASCENDING)], {}),
+    # Upsert keys for bulk import; not unique, since vendors and products created one at a time may share names/SKUs
+    ('vendors', [('department', ASCENDING), ('name', ASCENDING)], {}),
+    ('products', [('department', ASCENDING), ('sku', ASCENDING)], {}),
+    ('purchase_orders', [('id', ASCENDING)], {'unique': True}),
+    ('purchase_orders', [('created_at', DESCENDING), ('id', DESCENDING)], {}),
+    ('purchase_orders', [('department', ASCENDING), ('created_at', DESCENDING), ('id', DESCENDING)], {}),
+    ('purchase_orders', [('po_number', ASCENDING)], {'unique': True}),
+    ('notifications', [('id', ASCENDING)], {'unique': True}),
+    ('notifications', [('created_at', DESCENDING)], {}),
+    ('notifications', [('is_read', ASCENDING), ('created_at', DESCENDING)], {}),
+    ('notifications', [('user_id', ASCENDING), ('department', ASCENDING), ('created_at', DESCENDING)], {}),
+    ('notification_receipts', [('notification_id', ASCENDING), ('user_id', ASCENDING)], {'unique': True}),
+    ('notification_receipts', [('user_id', ASCENDING)], {}),
+    ('notifications', [('expires_at', ASCENDING)], {'expireAfterSeconds': 0}),
+    ('notifications_archive', [('id', ASCENDING)], {}),
+    ('notifications_archive', [('po_id', ASCENDING), ('created_at', DESCENDING)], {}),
+    ('notifications', [('po_id', ASCENDING), ('notification_type', ASCENDING), ('is_read', ASCENDING)], {}),
+    ('job_runs', [('job', ASCENDING), ('started_at', DESCENDING)], {}),
+    ('job_runs', [('started_at', ASCENDING)], {'expireAfterSeconds': JOB_HISTORY_DAYS * 86400}),
+    # At most one unread notification of each type per PO
+    ('notifications', [('po_id', ASCENDING), ('notification_type', ASCENDING)],
+     {'unique': True, 'partialFilterExpression': {'is_read': False}}),
+]
+
+# Query shapes issued per request, checked with explain() when QUERY_PLAN_CHECK is on:
+# (label, collection, filter, sort)
+QUERY_SHAPES = [
+    ('get_current_user', 'users', {'id': ''}, None),
+    ('login', 'users', {'username': ''}, None),
+    ('get_vendors', 'vendors', {'department': ''}, None),
+    ('get_products', 'products', {'department': ''}, None),
+    ('get_purchase_order', 'purchase_orders', {'id': ''}, None),
+    ('get_purchase_orders', 'purchase_orders', {}, {'created_at': -1, 'id': -1}),
+    ('get_purchase_orders (department)', 'purchase_orders', {'department': ''}, {'created_at': -1, 'id': -1}),
+    ('get_notifications', 'notifications', {}, {'created_at': -1}),
+    ('get_notifications (department)', 'notifications', {'user_id': None, 'department': {'$in': ['', None]}}, {'created_at': -1}),
+    ('get_unread_count', 'users', {'id': ''}, None),
+    ('search (department)', 'products', {'department': '', 'search_terms': re.compile('^a')}, None),
+    ('search', 'purchase_orders', {'search_terms': re.compile('^a')}, None),
+    ('check_pending_pos', 'notifications', {'po_id': '', 'notification_type': 'material_pending', 'is_read': False}, None),
+]
+
+async def ensure_indexes():
+    """Create the indexes in INDEX_SPECS; create_index is a no-op for ones that already exist"""
+    for collection, keys, options in INDEX_SPECS:
+        name = '_'.join(f"{field}_{direction}" for field, direction in keys)
+        try:
+            await db[collection].create_index(keys, name=name, **options)
+        except OperationFailure as e:
+            if options.get('unique'):
+                # Unique indexes guard correctness (e.g. PO numbers are never issued twice), so
+                # refuse to start until the duplicates they report are resolved
+                raise RuntimeError(f"Could not create unique index {collection}.{name}: {e}") from e
+            logger.warning(f"Could not create index {collection}.{name}: {e}")
+
+def find_plan_stages(plan: dict) -> List[str]:
+    stages = [plan.get('stage')]
+    if 'inputStage' in plan:
+        stages += find_plan_stages(plan['inputStage'])
+    for child in plan.get('inputStages', []):
+        stages += find_plan_stages(child)
+    return stages
+
+async def check_query_plans():
+    """Explain each query shape and log the ones that fall back to a collection scan"""
+    for label, collection, query, sort in QUERY_SHAPES:
+        find_cmd = {'find': collection, 'filter': query}
+        if sort:
+            find_cmd['sort'] = sort
+        try:
+            explain = await db.command({'explain': find_cmd, 'verbosity': 'queryPlanner'})
+        except Exception as e:
+            logger.warning(f"Could not explain query shape '{label}': {e}")
+            continue
+        stages = find_plan_stages(explain.get('queryPlanner', {}).get('winningPlan', {}))
+        if 'COLLSCAN' in stages:
+            logger.warning(f"COLLSCAN for query shape '{label}' on {collection}: filter={query} sort={sort}")
+        else:
+            logger.info(f"Query shape '{label}' uses plan {' <- '.join(filter(None, stages))}")
+
+async def startup_db_client():
+    if METRICS_ENABLED:
+        loop_lag_monitor.start()
+    if PROFILER_ENABLED:
+        stack_sampler.start()
+    await warm_mongo_pool()
+    await renumber_duplicate_po_numbers()
+    await ensure_indexes()
+    # Only checks whether string dates may remain; the conversion itself is the date_migration job
+    await refresh_date_migration_state()
+    await index_search_terms()
+    await migrate_notification_counters()
+    if QUERY_PLAN_CHECK:
+        await check_query_plans()
+    notification_broker.start()
+    if JOB_SCHEDULER_ENABLED:
+        scheduler.start()
+
 async def shutdown_db_client():
+    await scheduler.stop()
+    await notification_broker.stop()
+    await loop_lag_monitor.stop()
+    stack_sampler.stop()
     client.close()
+    password_executor.shutdown(wait=False)
+    if pdf_executor:
+        pdf_executor.shutdown(wait=False)
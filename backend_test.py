@@ -289,6 +289,18 @@ class PurchaseOrderAPITester:
         )
         return success
 
+    def test_dashboard_summary(self):
+        """Test aggregated dashboard summary"""
+        success, response = self.run_test(
+            "Dashboard Summary",
+            "GET",
+            "dashboard/summary",
+            200
+        )
+        if success and 'by_status' in response and 'pending_receipt' in response:
+            return True
+        return False
+
     def test_get_purchase_order_detail(self):
         """Test get single purchase order"""
         if not self.test_po_id:
@@ -434,6 +446,7 @@ class PurchaseOrderAPITester:
 
         self.test_get_purchase_orders()
         self.test_get_purchase_order_detail()
+        self.test_dashboard_summary()
         self.test_update_po_status()
         self.test_generate_po_pdf()
         self.test_update_purchase_order()
@@ -12,10 +12,47 @@ export const Layout = ({ user, onLogout }) => {
   const [mobileMenuOpen, setMobileMenuOpen] = useState(false);
   
   useEffect(() => {
-    fetchUnreadCount();
-    // Poll for unread count every 30 seconds
-    const interval = setInterval(fetchUnreadCount, 30000);
-    return () => clearInterval(interval);
+    if (typeof EventSource === "undefined") {
+      // No SSE support: fall back to polling every 30 seconds
+      fetchUnreadCount();
+      const interval = setInterval(fetchUnreadCount, 30000);
+      return () => clearInterval(interval);
+    }
+
+    // The server pushes unread counts as they change. The stream URL carries a short-lived
+    // stream token rather than the login token, so every (re)connect fetches a fresh one.
+    let source = null;
+    let retryTimer = null;
+    let closed = false;
+
+    const connect = async () => {
+      try {
+        const token = localStorage.getItem('token');
+        const response = await axios.post(`${API}/notifications/stream-token`, null, {
+          headers: { Authorization: `Bearer ${token}` }
+        });
+        if (closed) return;
+        source = new EventSource(`${API}/notifications/stream?token=${encodeURIComponent(response.data.token)}`);
+        source.addEventListener("unread_count", (event) => {
+          setUnreadCount(JSON.parse(event.data).unread_count);
+        });
+        source.onerror = () => {
+          // Its token has expired by the time EventSource would retry, so reconnect ourselves
+          source.close();
+          retryTimer = setTimeout(connect, 5000);
+        };
+      } catch (err) {
+        console.error("Failed to open notification stream:", err);
+        retryTimer = setTimeout(connect, 30000);
+      }
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (source) source.close();
+    };
   }, []);
 
   const fetchUnreadCount = async () => {
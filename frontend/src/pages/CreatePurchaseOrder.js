@@ -1,20 +1,49 @@
 import { useState, useEffect } from "react";
 import { useNavigate, useParams } from "react-router-dom";
 import axios from "axios";
-import { Plus, Trash2, Save } from "lucide-react";
+import { Trash2, Save, Search } from "lucide-react";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Debounced typeahead over /api/search, so the form never loads the whole vendor or product list
+const useTypeahead = (query, type) => {
+  const [matches, setMatches] = useState([]);
+
+  useEffect(() => {
+    if (!query.trim()) {
+      setMatches([]);
+      return;
+    }
+    const timer = setTimeout(async () => {
+      try {
+        const token = localStorage.getItem('token');
+        const response = await axios.get(`${API}/search`, {
+          headers: { Authorization: `Bearer ${token}` },
+          params: { q: query, types: type, limit: 8 }
+        });
+        setMatches(response.data[type]);
+      } catch (err) {
+        console.error(`Failed to search ${type}:`, err);
+      }
+    }, 200);
+    return () => clearTimeout(timer);
+  }, [query, type]);
+
+  return [matches, setMatches];
+};
+
 export default function CreatePurchaseOrder() {
   const { id } = useParams();
   const navigate = useNavigate();
   const isEdit = !!id;
 
-  const [vendors, setVendors] = useState([]);
-  const [products, setProducts] = useState([]);
-  const [loading, setLoading] = useState(true);
+  const [loading, setLoading] = useState(isEdit);
   const [saving, setSaving] = useState(false);
+  const [vendorQuery, setVendorQuery] = useState("");
+  const [vendorMatches, setVendorMatches] = useTypeahead(vendorQuery, "vendors");
+  const [productQuery, setProductQuery] = useState("");
+  const [productMatches, setProductMatches] = useTypeahead(productQuery, "products");
 
   const [formData, setFormData] = useState({
     vendor_id: "",
@@ -31,7 +60,7 @@ export default function CreatePurchaseOrder() {
   });
 
   useEffect(() => {
-    fetchData();
+    if (isEdit) fetchData();
   }, []);
 
   const fetchData = async () => {
@@ -39,31 +68,21 @@ export default function CreatePurchaseOrder() {
       const token = localStorage.getItem('token');
       const headers = { Authorization: `Bearer ${token}` };
 
-      const [vendorsRes, productsRes] = await Promise.all([
-        axios.get(`${API}/vendors`, { headers }),
-        axios.get(`${API}/products`, { headers })
-      ]);
-
-      setVendors(vendorsRes.data);
-      setProducts(productsRes.data);
-
-      if (isEdit) {
-        const poRes = await axios.get(`${API}/purchase-orders/${id}`, { headers });
-        const po = poRes.data;
-        setFormData({
-          vendor_id: po.vendor_id,
-          vendor_name: po.vendor_name,
-          delivery_date: po.delivery_date,
-          payment_terms: po.payment_terms,
-          shipping_address: po.shipping_address,
-          notes: po.notes,
-          authorized_signatory: po.authorized_signatory || "",
-          items: po.items,
-          subtotal: po.subtotal,
-          tax: po.tax,
-          total: po.total
-        });
-      }
+      const poRes = await axios.get(`${API}/purchase-orders/${id}`, { headers });
+      const po = poRes.data;
+      setFormData({
+        vendor_id: po.vendor_id,
+        vendor_name: po.vendor_name,
+        delivery_date: po.delivery_date,
+        payment_terms: po.payment_terms,
+        shipping_address: po.shipping_address,
+        notes: po.notes,
+        authorized_signatory: po.authorized_signatory || "",
+        items: po.items,
+        subtotal: po.subtotal,
+        tax: po.tax,
+        total: po.total
+      });
 
       setLoading(false);
     } catch (err) {
@@ -72,26 +91,35 @@ export default function CreatePurchaseOrder() {
     }
   };
 
-  const handleVendorChange = (vendorId) => {
-    const vendor = vendors.find(v => v.id === vendorId);
-    if (vendor) {
-      setFormData({
-        ...formData,
-        vendor_id: vendorId,
-        vendor_name: vendor.name,
-        shipping_address: vendor.address
-      });
-    }
-  };
-
-  const addItem = () => {
+  const selectVendor = (vendor) => {
     setFormData({
       ...formData,
-      items: [
-        ...formData.items,
-        { product_id: "", product_name: "", quantity: 1, unit_price: 0, tax_rate: 18, tax_amount: 0, total: 0 }
-      ]
+      vendor_id: vendor.id,
+      vendor_name: vendor.name,
+      shipping_address: vendor.address
     });
+    setVendorQuery("");
+    setVendorMatches([]);
+  };
+
+  const addProduct = (product) => {
+    const taxAmount = product.unit_price * (product.tax_rate / 100);
+    const newItems = [
+      ...formData.items,
+      {
+        product_id: product.id,
+        product_name: product.name,
+        quantity: 1,
+        unit_price: product.unit_price,
+        tax_rate: product.tax_rate,
+        tax_amount: taxAmount,
+        total: product.unit_price + taxAmount
+      }
+    ];
+    setFormData({ ...formData, items: newItems });
+    calculateTotals(newItems);
+    setProductQuery("");
+    setProductMatches([]);
   };
 
   const removeItem = (index) => {
@@ -103,22 +131,7 @@ export default function CreatePurchaseOrder() {
   const updateItem = (index, field, value) => {
     const newItems = [...formData.items];
     
-    if (field === "product_id") {
-      const product = products.find(p => p.id === value);
-      if (product) {
-        const itemSubtotal = product.unit_price * newItems[index].quantity;
-        const taxAmount = itemSubtotal * (product.tax_rate / 100);
-        newItems[index] = {
-          ...newItems[index],
-          product_id: value,
-          product_name: product.name,
-          unit_price: product.unit_price,
-          tax_rate: product.tax_rate,
-          tax_amount: taxAmount,
-          total: itemSubtotal + taxAmount
-        };
-      }
-    } else if (field === "quantity") {
+    if (field === "quantity") {
       newItems[index].quantity = parseFloat(value) || 0;
       const itemSubtotal = newItems[index].quantity * newItems[index].unit_price;
       newItems[index].tax_amount = itemSubtotal * (newItems[index].tax_rate / 100);
@@ -204,20 +217,37 @@ export default function CreatePurchaseOrder() {
               <div className="grid grid-cols-1 md:grid-cols-2 gap-4">
                 <div>
                   <label className="block text-sm font-medium mb-2">Vendor *</label>
-                  <select
-                    value={formData.vendor_id}
-                    onChange={(e) => handleVendorChange(e.target.value)}
-                    data-testid="vendor-select"
-                    required
-                    className="w-full px-4 py-2.5 bg-background border border-input rounded-sm focus:outline-none focus:ring-1 focus:ring-primary"
-                  >
-                    <option value="">Select a vendor</option>
-                    {vendors.map((vendor) => (
-                      <option key={vendor.id} value={vendor.id}>
-                        {vendor.name}
-                      </option>
-                    ))}
-                  </select>
+                  <div className="relative">
+                    <input
+                      type="text"
+                      value={vendorQuery}
+                      onChange={(e) => setVendorQuery(e.target.value)}
+                      data-testid="vendor-search-input"
+                      placeholder={formData.vendor_name || "Search vendors by name..."}
+                      className="w-full px-4 py-2.5 bg-background border border-input rounded-sm focus:outline-none focus:ring-1 focus:ring-primary"
+                    />
+                    {vendorMatches.length > 0 && (
+                      <div className="absolute z-10 mt-1 w-full bg-card border border-border rounded-sm shadow-sm" data-testid="vendor-search-results">
+                        {vendorMatches.map((vendor) => (
+                          <button
+                            type="button"
+                            key={vendor.id}
+                            onClick={() => selectVendor(vendor)}
+                            data-testid={`vendor-search-result-${vendor.id}`}
+                            className="w-full flex justify-between px-3 py-2 text-sm text-left hover:bg-muted"
+                          >
+                            <span>{vendor.name}</span>
+                            <span className="text-muted-foreground">{vendor.contact_person}</span>
+                          </button>
+                        ))}
+                      </div>
+                    )}
+                  </div>
+                  {formData.vendor_name && (
+                    <p className="text-xs text-muted-foreground mt-1" data-testid="selected-vendor">
+                      Selected: {formData.vendor_name}
+                    </p>
+                  )}
                 </div>
                 <div>
                   <label className="block text-sm font-medium mb-2">Delivery Date *</label>
@@ -265,22 +295,39 @@ export default function CreatePurchaseOrder() {
             </div>
 
             <div className="bg-card border border-border rounded-sm p-6">
-              <div className="flex justify-between items-center mb-4">
-                <h2 className="font-heading font-semibold text-xl">Line Items</h2>
-                <button
-                  type="button"
-                  onClick={addItem}
-                  data-testid="add-item-button"
-                  className="flex items-center gap-2 px-4 py-2 bg-primary text-primary-foreground text-sm font-medium rounded-sm hover:bg-primary/90"
-                >
-                  <Plus size={16} />
-                  Add Item
-                </button>
+              <h2 className="font-heading font-semibold text-xl mb-4">Line Items</h2>
+
+              <div className="relative mb-4">
+                <Search className="absolute left-3 top-1/2 transform -translate-y-1/2 text-muted-foreground" size={16} />
+                <input
+                  type="text"
+                  value={productQuery}
+                  onChange={(e) => setProductQuery(e.target.value)}
+                  data-testid="product-search-input"
+                  placeholder="Search products by name or SKU to add a line..."
+                  className="w-full pl-9 pr-4 py-2 text-sm bg-background border border-input rounded-sm focus:outline-none focus:ring-1 focus:ring-primary"
+                />
+                {productMatches.length > 0 && (
+                  <div className="absolute z-10 mt-1 w-full bg-card border border-border rounded-sm shadow-sm" data-testid="product-search-results">
+                    {productMatches.map((product) => (
+                      <button
+                        type="button"
+                        key={product.id}
+                        onClick={() => addProduct(product)}
+                        data-testid={`product-search-result-${product.id}`}
+                        className="w-full flex justify-between px-3 py-2 text-sm text-left hover:bg-muted"
+                      >
+                        <span>{product.name} <span className="font-mono text-xs text-muted-foreground">{product.sku}</span></span>
+                        <span className="text-muted-foreground">₹{product.unit_price} ({product.tax_rate}% tax)</span>
+                      </button>
+                    ))}
+                  </div>
+                )}
               </div>
 
               {formData.items.length === 0 ? (
                 <div className="text-center py-8 text-muted-foreground" data-testid="no-items-message">
-                  No items added yet. Click "Add Item" to start.
+                  No items added yet. Search for a product above to add it.
                 </div>
               ) : (
                 <div className="space-y-4" data-testid="items-list">
@@ -289,20 +336,12 @@ export default function CreatePurchaseOrder() {
                       <div className="grid grid-cols-12 gap-4 items-end">
                         <div className="col-span-12 md:col-span-4">
                           <label className="block text-xs font-medium mb-1">Product</label>
-                          <select
-                            value={item.product_id}
-                            onChange={(e) => updateItem(index, "product_id", e.target.value)}
-                            data-testid={`product-select-${index}`}
-                            required
-                            className="w-full px-3 py-2 text-sm bg-background border border-input rounded-sm focus:outline-none focus:ring-1 focus:ring-primary"
+                          <div
+                            data-testid={`product-name-${index}`}
+                            className="w-full px-3 py-2 text-sm bg-muted border border-input rounded-sm truncate"
                           >
-                            <option value="">Select product</option>
-                            {products.map((product) => (
-                              <option key={product.id} value={product.id}>
-                                {product.name} - ₹{product.unit_price} ({product.tax_rate}% tax)
-                              </option>
-                            ))}
-                          </select>
+                            {item.product_name}
+                          </div>
                         </div>
                         <div className="col-span-4 md:col-span-2">
                           <label className="block text-xs font-medium mb-1">Quantity</label>
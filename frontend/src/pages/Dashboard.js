@@ -26,22 +26,17 @@ export default function Dashboard() {
       const token = localStorage.getItem('token');
       const headers = { Authorization: `Bearer ${token}` };
 
-      const [posRes, vendorsRes, productsRes] = await Promise.all([
-        axios.get(`${API}/purchase-orders`, { headers }),
-        axios.get(`${API}/vendors`, { headers }),
-        axios.get(`${API}/products`, { headers })
-      ]);
+      const { data: summary } = await axios.get(`${API}/dashboard/summary`, { headers });
 
-      const pos = posRes.data;
       setStats({
-        totalPOs: pos.length,
-        draftPOs: pos.filter(po => po.status === 'draft').length,
-        sentPOs: pos.filter(po => po.status === 'sent').length,
-        totalVendors: vendorsRes.data.length,
-        totalProducts: productsRes.data.length
+        totalPOs: summary.total_pos,
+        draftPOs: summary.by_status.draft?.count || 0,
+        sentPOs: summary.by_status.sent?.count || 0,
+        totalVendors: summary.total_vendors,
+        totalProducts: summary.total_products
       });
 
-      setRecentPOs(pos.slice(0, 5));
+      setRecentPOs(summary.recent);
       setLoading(false);
     } catch (err) {
       console.error("Failed to fetch dashboard data:", err);
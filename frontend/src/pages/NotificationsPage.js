@@ -1,7 +1,7 @@
 import { useState, useEffect } from "react";
 import { useNavigate } from "react-router-dom";
 import axios from "axios";
-import { Bell, Check, RefreshCw } from "lucide-react";
+import { Bell, Check, CheckCheck, RefreshCw } from "lucide-react";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -38,12 +38,11 @@ export default function NotificationsPage() {
         headers: { Authorization: `Bearer ${token}` }
       });
       
-      if (response.data.notifications_created > 0) {
-        alert(`${response.data.notifications_created} new notifications created!`);
-        fetchNotifications();
-      } else {
-        alert('No new pending POs found.');
-      }
+      alert(response.data.queued
+        ? 'Pending PO check queued. New notifications will appear shortly.'
+        : 'A pending PO check is already queued.');
+      // The scan runs in the background; pick up its results once it has had time to finish
+      setTimeout(fetchNotifications, 3000);
     } catch (err) {
       console.error("Failed to check pending POs:", err);
       alert("Failed to check pending POs");
@@ -64,6 +63,18 @@ export default function NotificationsPage() {
     }
   };
 
+  const markAllAsRead = async () => {
+    try {
+      const token = localStorage.getItem('token');
+      await axios.post(`${API}/notifications/read-all`, {}, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      fetchNotifications();
+    } catch (err) {
+      console.error("Failed to mark notifications as read:", err);
+    }
+  };
+
   const confirmMaterialReceipt = async (poId, notificationId) => {
     // Navigate to PO detail page where they can confirm individual items
     await markAsRead(notificationId);
@@ -87,6 +98,17 @@ export default function NotificationsPage() {
           </h1>
           <p className="text-muted-foreground">Material receipt pending alerts for purchase orders</p>
         </div>
+        <div className="flex items-center gap-3">
+        {notifications.some((n) => !n.is_read) && (
+          <button
+            onClick={markAllAsRead}
+            data-testid="mark-all-read-button"
+            className="flex items-center gap-2 px-6 py-3 border border-border font-medium rounded-sm hover:bg-muted"
+          >
+            <CheckCheck size={18} />
+            Mark All Read
+          </button>
+        )}
         <button 
           onClick={checkPendingPOs}
           disabled={checking}
@@ -96,6 +118,7 @@ export default function NotificationsPage() {
           <RefreshCw size={18} className={checking ? "animate-spin" : ""} />
           {checking ? "Checking..." : "Check Pending POs"}
         </button>
+        </div>
       </div>
 
       {notifications.length === 0 ? (
@@ -159,6 +182,9 @@ export default function NotificationsPage() {
                   
                   <p className="text-xs text-muted-foreground">
                     {new Date(notification.created_at).toLocaleString()}
+                    {notification.occurrences > 1 && (
+                      <span data-testid={`occurrences-${notification.id}`}> · Raised {notification.occurrences} times</span>
+                    )}
                   </p>
                 </div>
                 
@@ -203,7 +229,7 @@ export default function NotificationsPage() {
           <p>• Each item tracks: Ordered quantity, Received quantity, Pending quantity</p>
           <p>• Click "View & Confirm" to go to PO and confirm receipt for individual items</p>
           <p className="mt-4 text-xs italic">
-            Tip: Set up a daily cron job to call the check-pending-pos endpoint automatically
+            The check runs automatically in the background every hour; use the button to queue one now
           </p>
         </div>
       </div>
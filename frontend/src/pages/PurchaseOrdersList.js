@@ -1,34 +1,46 @@
 import { useState, useEffect } from "react";
 import { Link, useNavigate } from "react-router-dom";
 import axios from "axios";
-import { Plus, Search, Filter } from "lucide-react";
+import { Plus, Search, Filter, Download } from "lucide-react";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+const PAGE_SIZE = 50;
+
 export default function PurchaseOrdersList() {
   const [pos, setPOs] = useState([]);
-  const [filteredPOs, setFilteredPOs] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [searchTerm, setSearchTerm] = useState("");
   const [statusFilter, setStatusFilter] = useState("all");
   const navigate = useNavigate();
 
   useEffect(() => {
-    fetchPOs();
-  }, []);
+    // Debounce typing so each keystroke doesn't hit the API
+    const timer = setTimeout(() => fetchPOs(), searchTerm ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [searchTerm, statusFilter]);
 
-  useEffect(() => {
-    filterPOs();
-  }, [searchTerm, statusFilter, pos]);
+  const fetchPage = async (cursor) => {
+    const token = localStorage.getItem('token');
+    const params = { summary: true, limit: PAGE_SIZE };
+    if (statusFilter !== "all") params.status = statusFilter;
+    if (searchTerm) params.q = searchTerm;
+    if (cursor) params.cursor = cursor;
+
+    const response = await axios.get(`${API}/purchase-orders`, {
+      headers: { Authorization: `Bearer ${token}` },
+      params
+    });
+    setNextCursor(response.headers['x-next-cursor'] || null);
+    return response.data;
+  };
 
   const fetchPOs = async () => {
     try {
-      const token = localStorage.getItem('token');
-      const response = await axios.get(`${API}/purchase-orders`, {
-        headers: { Authorization: `Bearer ${token}` }
-      });
-      setPOs(response.data);
+      setPOs(await fetchPage(null));
       setLoading(false);
     } catch (err) {
       console.error("Failed to fetch POs:", err);
@@ -36,21 +48,42 @@ export default function PurchaseOrdersList() {
     }
   };
 
-  const filterPOs = () => {
-    let filtered = pos;
-
-    if (statusFilter !== "all") {
-      filtered = filtered.filter(po => po.status === statusFilter);
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(nextCursor);
+      setPOs(prev => [...prev, ...page]);
+    } catch (err) {
+      console.error("Failed to fetch more POs:", err);
     }
+    setLoadingMore(false);
+  };
 
-    if (searchTerm) {
-      filtered = filtered.filter(po =>
-        po.po_number.toLowerCase().includes(searchTerm.toLowerCase()) ||
-        po.vendor_name.toLowerCase().includes(searchTerm.toLowerCase())
-      );
-    }
+  const exportCSV = async (lines) => {
+    try {
+      const token = localStorage.getItem('token');
+      const params = { format: "csv", lines };
+      if (statusFilter !== "all") params.status = statusFilter;
+      if (searchTerm) params.q = searchTerm;
+
+      const response = await axios.get(`${API}/purchase-orders/export`, {
+        headers: { Authorization: `Bearer ${token}` },
+        params,
+        responseType: 'blob'
+      });
 
-    setFilteredPOs(filtered);
+      const url = window.URL.createObjectURL(new Blob([response.data]));
+      const link = document.createElement('a');
+      link.href = url;
+      link.setAttribute('download', lines ? 'purchase-order-lines.csv' : 'purchase-orders.csv');
+      document.body.appendChild(link);
+      link.click();
+      link.remove();
+    } catch (err) {
+      console.error("Failed to export POs:", err);
+      alert("Failed to export purchase orders");
+    }
   };
 
   const deletePO = async (id, poNumber) => {
@@ -93,15 +126,33 @@ export default function PurchaseOrdersList() {
           </h1>
           <p className="text-muted-foreground">Manage all your purchase orders</p>
         </div>
-        <Link to="/purchase-orders/new">
-          <button 
-            data-testid="create-new-po-button"
-            className="flex items-center gap-2 px-6 py-3 bg-primary text-primary-foreground font-medium rounded-sm hover:bg-primary/90"
+        <div className="flex items-center gap-3">
+          <button
+            onClick={() => exportCSV(false)}
+            data-testid="export-pos-button"
+            className="flex items-center gap-2 px-4 py-3 border border-border font-medium rounded-sm hover:bg-muted"
+          >
+            <Download size={18} />
+            Export CSV
+          </button>
+          <button
+            onClick={() => exportCSV(true)}
+            data-testid="export-po-lines-button"
+            className="flex items-center gap-2 px-4 py-3 border border-border font-medium rounded-sm hover:bg-muted"
           >
-            <Plus size={18} />
-            New Purchase Order
+            <Download size={18} />
+            Export Lines
           </button>
-        </Link>
+          <Link to="/purchase-orders/new">
+            <button 
+              data-testid="create-new-po-button"
+              className="flex items-center gap-2 px-6 py-3 bg-primary text-primary-foreground font-medium rounded-sm hover:bg-primary/90"
+            >
+              <Plus size={18} />
+              New Purchase Order
+            </button>
+          </Link>
+        </div>
       </div>
 
       <div className="bg-card border border-border rounded-sm mb-6 p-4">
@@ -136,7 +187,7 @@ export default function PurchaseOrdersList() {
       </div>
 
       <div className="bg-card border border-border rounded-sm overflow-hidden">
-        {filteredPOs.length === 0 ? (
+        {pos.length === 0 ? (
           <div className="p-12 text-center" data-testid="no-pos-found">
             <p className="text-muted-foreground">No purchase orders found</p>
           </div>
@@ -169,7 +220,7 @@ export default function PurchaseOrdersList() {
                 </tr>
               </thead>
               <tbody>
-                {filteredPOs.map((po) => (
+                {pos.map((po) => (
                   <tr 
                     key={po.id} 
                     className="border-b border-border hover:bg-muted/50 transition-colors"
@@ -218,6 +269,18 @@ export default function PurchaseOrdersList() {
             </table>
           </div>
         )}
+        {nextCursor && (
+          <div className="px-6 py-4 border-t border-border text-center">
+            <button
+              onClick={loadMore}
+              disabled={loadingMore}
+              data-testid="load-more-pos"
+              className="text-sm text-primary hover:underline disabled:opacity-50"
+            >
+              {loadingMore ? "Loading..." : "Load more"}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -1,6 +1,6 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import axios from "axios";
-import { Plus, Edit, Trash2, X } from "lucide-react";
+import { Plus, Edit, Trash2, X, Upload } from "lucide-react";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -10,6 +10,8 @@ export default function VendorsPage() {
   const [loading, setLoading] = useState(true);
   const [showModal, setShowModal] = useState(false);
   const [editingVendor, setEditingVendor] = useState(null);
+  const [importing, setImporting] = useState(false);
+  const fileInputRef = useRef(null);
   const [formData, setFormData] = useState({
     name: "",
     contact_person: "",
@@ -36,6 +38,33 @@ export default function VendorsPage() {
     }
   };
 
+  const importFile = async (e) => {
+    const file = e.target.files[0];
+    e.target.value = "";
+    if (!file) return;
+    setImporting(true);
+    try {
+      const token = localStorage.getItem('token');
+      const data = new FormData();
+      data.append("file", file);
+      const response = await axios.post(`${API}/vendors/import`, data, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      const { inserted, updated, unchanged, failed, errors } = response.data;
+      let message = `Import finished: ${inserted} added, ${updated} updated, ${unchanged} unchanged, ${failed} failed.`;
+      if (errors.length > 0) {
+        message += "\n\n" + errors.slice(0, 10).map((err) => `Row ${err.row}: ${err.errors.join("; ")}`).join("\n");
+      }
+      alert(message);
+      fetchVendors();
+    } catch (err) {
+      console.error("Failed to import vendors:", err);
+      alert(err.response?.data?.detail || "Failed to import vendors");
+    } finally {
+      setImporting(false);
+    }
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     try {
@@ -123,6 +152,25 @@ export default function VendorsPage() {
           </h1>
           <p className="text-muted-foreground">Manage your supplier information</p>
         </div>
+        <div className="flex items-center gap-3">
+        <input
+          ref={fileInputRef}
+          type="file"
+          accept=".csv,.xlsx"
+          onChange={importFile}
+          className="hidden"
+          data-testid="import-vendors-input"
+        />
+        <button
+          onClick={() => fileInputRef.current.click()}
+          disabled={importing}
+          title="CSV or XLSX with a header row; existing vendors are matched on name"
+          data-testid="import-vendors-button"
+          className="flex items-center gap-2 px-6 py-3 border border-border font-medium rounded-sm hover:bg-muted disabled:opacity-50"
+        >
+          <Upload size={18} />
+          {importing ? "Importing..." : "Import"}
+        </button>
         <button 
           onClick={() => openModal()}
           data-testid="add-vendor-button"
@@ -131,6 +179,7 @@ export default function VendorsPage() {
           <Plus size={18} />
           Add Vendor
         </button>
+        </div>
       </div>
 
       {vendors.length === 0 ? (
@@ -0,0 +1,68 @@
+"""Fixtures for the backend tests.
+
+The app runs in-process against a real MongoDB, in a throwaway database that is dropped at the
+end of the session. Point TEST_MONGO_URL at a server (default mongodb://localhost:27017); the
+tests are skipped when none is reachable.
+"""
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Set before server is imported; never inherit a real MONGO_URL/DB_NAME from the environment
+os.environ['MONGO_URL'] = os.environ.get('TEST_MONGO_URL', 'mongodb://localhost:27017')
+os.environ['DB_NAME'] = f"po_test_{uuid.uuid4().hex[:8]}"
+os.environ.setdefault('JWT_SECRET', 'test-secret')
+os.environ['PDF_WORKERS'] = '0'
+os.environ['JOB_SCHEDULER_ENABLED'] = 'false'
+os.environ['BCRYPT_ROUNDS'] = '4'
+os.environ['MONGO_MIN_POOL_SIZE'] = '1'
+os.environ['MONGO_SERVER_SELECTION_TIMEOUT_MS'] = '2000'
+# Profiles are only kept for requests that ask for one
+os.environ['PROFILER_ENABLED'] = 'true'
+os.environ['PROFILE_SLOW_SECONDS'] = '3600'
+os.environ['PROFILE_INTERVAL_MS'] = '1'
+
+
+@pytest.fixture(scope='session')
+def server():
+    import server as server_module
+    return server_module
+
+
+@pytest.fixture(scope='session')
+def app_client(server):
+    try:
+        test_client = TestClient(server.app)
+        test_client.__enter__()
+    except Exception as e:
+        pytest.skip(f"MongoDB not reachable at {os.environ['MONGO_URL']}: {e}")
+    try:
+        yield test_client
+    finally:
+        test_client.portal.call(server.client.drop_database, os.environ['DB_NAME'])
+        test_client.__exit__(None, None, None)
+
+
+@pytest.fixture
+def client(app_client, server):
+    yield app_client
+    # Empty the collections but keep their indexes, and drop per-process state
+    for name in app_client.portal.call(server.db.list_collection_names):
+        app_client.portal.call(server.db[name].delete_many, {})
+    server.principal_cache.clear()
+    server.seeded_po_prefixes.clear()
+    server.pdf_cache = server.PdfCache(server.PDF_CACHE_MAX_BYTES)
+    server.stack_sampler.profiles.clear()
+
+
+@pytest.fixture
+def run(client):
+    """Run a coroutine function on the app's event loop"""
+    return client.portal.call
@@ -0,0 +1,66 @@
+"""Request helpers shared by the backend tests"""
+import uuid
+
+
+def register(client, department='ppc', role='user', username=None):
+    """Register a user and return (auth headers, user)"""
+    username = username or f"user_{uuid.uuid4().hex[:8]}"
+    response = client.post('/api/auth/register', json={
+        'username': username,
+        'password': 'TestPass123!',
+        'full_name': username,
+        'role': role,
+        'department': department
+    })
+    assert response.status_code == 200, response.text
+    body = response.json()
+    return {'Authorization': f"Bearer {body['token']}"}, body['user']
+
+
+def create_vendor(client, headers, name='Test Vendor'):
+    response = client.post('/api/vendors', headers=headers, json={
+        'name': name,
+        'contact_person': 'Contact',
+        'email': 'vendor@example.com',
+        'phone': '1234567890',
+        'address': '1 Mill Road'
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def create_product(client, headers, name='Test Product', sku='SKU-1', unit_price=100.0, tax_rate=18.0):
+    response = client.post('/api/products', headers=headers, json={
+        'name': name,
+        'sku': sku,
+        'description': 'Test product',
+        'unit_price': unit_price,
+        'unit_of_measure': 'pcs',
+        'tax_rate': tax_rate
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def po_payload(vendor, product, quantity=10, lines=1, **overrides):
+    payload = {
+        'vendor_id': vendor['id'],
+        'vendor_name': vendor['name'],
+        'items': [
+            {'product_id': product['id'], 'product_name': product['name'], 'quantity': quantity}
+            for _ in range(lines)
+        ],
+        'delivery_date': '2026-12-31',
+        'payment_terms': 'Net 30',
+        'shipping_address': '1 Factory Lane'
+    }
+    payload.update(overrides)
+    return payload
+
+
+def create_po(client, headers, quantity=10, lines=1, vendor=None, product=None):
+    vendor = vendor or create_vendor(client, headers)
+    product = product or create_product(client, headers)
+    response = client.post('/api/purchase-orders', headers=headers, json=po_payload(vendor, product, quantity, lines))
+    assert response.status_code == 200, response.text
+    return response.json()
@@ -0,0 +1,51 @@
+import time
+
+from tests.helpers import register
+
+
+def test_principals_are_cached_per_token(client, run, server):
+    headers, user = register(client, department='ppc')
+    assert client.get('/api/auth/me', headers=headers).json()['department'] == 'ppc'
+    run(server.db.users.update_one, {'id': user['id']}, {'$set': {'department': 'dyeing'}})
+
+    # Served from the cache until the entry expires
+    assert client.get('/api/auth/me', headers=headers).json()['department'] == 'ppc'
+    server.principal_cache.clear()
+    assert client.get('/api/auth/me', headers=headers).json()['department'] == 'dyeing'
+
+
+def test_principal_cache_expires_entries_and_evicts_the_least_recently_used(server):
+    cache = server.PrincipalCache(ttl=0.05, max_entries=2)
+    cache.set('a', 't1', {'id': 'a'})
+    cache.set('b', 't2', {'id': 'b'})
+    assert cache.get('a', 't1') == {'id': 'a'}
+    cache.set('c', 't3', {'id': 'c'})
+    assert cache.get('b', 't2') is None
+    time.sleep(0.06)
+    assert cache.get('a', 't1') is None and cache.get('c', 't3') is None
+
+
+def test_requests_need_a_valid_token(client):
+    assert client.get('/api/purchase-orders', headers={'Authorization': 'Bearer not-a-token'}).status_code == 401
+
+
+def test_login_checks_passwords_on_the_bcrypt_pool(client, server):
+    _, user = register(client, username='pool_user')
+    completed = server.password_pool_stats['completed']
+
+    ok = client.post('/api/auth/login', json={'username': 'pool_user', 'password': 'TestPass123!'})
+    assert ok.status_code == 200 and ok.json()['user']['id'] == user['id']
+    assert client.post('/api/auth/login', json={'username': 'pool_user', 'password': 'wrong'}).status_code == 401
+    assert server.password_pool_stats['completed'] == completed + 2
+    assert server.password_pool_stats['in_flight'] == 0
+
+
+def test_login_is_shed_when_the_bcrypt_queue_is_full(client, server, monkeypatch):
+    register(client, username='busy_user')
+    monkeypatch.setattr(server, 'BCRYPT_MAX_QUEUE', 0)
+    rejected = server.password_pool_stats['rejected']
+
+    response = client.post('/api/auth/login', json={'username': 'busy_user', 'password': 'TestPass123!'})
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '1'
+    assert server.password_pool_stats['rejected'] == rejected + 1
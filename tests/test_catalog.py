@@ -0,0 +1,84 @@
+import io
+
+import pytest
+
+from tests.helpers import register
+
+
+def upload(client, headers, path, csv_text):
+    return client.post(path, headers=headers, files={'file': ('catalog.csv', io.BytesIO(csv_text.encode('utf-8')), 'text/csv')})
+
+
+def test_product_import_reports_duplicate_and_invalid_rows(client):
+    headers, _ = register(client)
+    response = upload(client, headers, '/api/products/import', (
+        "Name,SKU,Description,Unit Price,Unit of Measure,Tax Rate\n"
+        "Cotton yarn,CY-1,,120,kg,5\n"
+        "Cotton yarn 2,CY-1,,130,kg,5\n"
+        "Dye,DY-1,,not a price,kg,18\n"
+        "Thread,TH-1,,15,cone,12\n"
+    ))
+    assert response.status_code == 200, response.text
+    summary = response.json()
+    assert (summary['inserted'], summary['updated'], summary['failed']) == (2, 0, 2)
+    assert summary['errors'][0] == {'row': 3, 'errors': ['sku: duplicate of row 2']}
+    assert summary['errors'][1]['row'] == 4
+    products = {p['sku']: p for p in client.get('/api/products', headers=headers).json()}
+    # The first row for a SKU is the one kept
+    assert products['CY-1']['unit_price'] == 120
+
+
+def test_import_updates_existing_rows_in_the_department(client):
+    headers, _ = register(client)
+    sheet = "Name,Contact Person,Email,Phone,Address\nAcme Mills,Asha,a@example.com,1,Road 1\n"
+    assert upload(client, headers, '/api/vendors/import', sheet).json()['inserted'] == 1
+
+    summary = upload(client, headers, '/api/vendors/import', sheet.replace('Road 1', 'Road 2')).json()
+    assert (summary['inserted'], summary['updated'], summary['failed']) == (0, 1, 0)
+    vendors = client.get('/api/vendors', headers=headers).json()
+    assert [v['address'] for v in vendors] == ['Road 2']
+
+
+def test_import_reports_write_conflicts_against_their_rows(client, run, server):
+    headers, _ = register(client, department='ppc')
+    other, _ = register(client, department='dyeing')
+    # A deployment-wide unique SKU, which another department already holds
+    run(lambda: server.db.products.create_index('sku', name='sku_unique', unique=True))
+    try:
+        assert upload(client, other, '/api/products/import', "Name,SKU,Description,Unit Price,Unit of Measure\nYarn,CY-1,,100,kg\n").json()['inserted'] == 1
+        response = upload(client, headers, '/api/products/import', (
+            "Name,SKU,Description,Unit Price,Unit of Measure\n"
+            "Thread,TH-1,,15,cone\n"
+            "Cotton yarn,CY-1,,120,kg\n"
+        ))
+        assert response.status_code == 200, response.text
+        summary = response.json()
+        assert (summary['inserted'], summary['failed']) == (1, 1)
+        assert [error['row'] for error in summary['errors']] == [3]
+        assert 'CY-1' in summary['errors'][0]['errors'][0]
+    finally:
+        run(server.db.products.drop_index, 'sku_unique')
+
+
+def test_import_closes_the_sheet_when_it_stops_early(client, run, server, monkeypatch):
+    _, user = register(client)
+    closed = []
+
+    def rows(upload):
+        try:
+            for n in range(3):
+                yield {'name': f"Vendor {n}"}
+        finally:
+            closed.append(True)
+
+    def clean(row, model):
+        if row['name'] == 'Vendor 1':
+            raise RuntimeError('connection lost')
+        return row
+
+    monkeypatch.setattr(server, 'import_rows', rows)
+    monkeypatch.setattr(server, 'clean_import_row', clean)
+    monkeypatch.setattr(server, 'IMPORT_BATCH_SIZE', 1)
+    with pytest.raises(RuntimeError):
+        run(server.run_bulk_import, None, server.VendorCreate, 'vendors', 'name', user)
+    assert closed == [True]
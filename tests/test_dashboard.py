@@ -0,0 +1,29 @@
+from tests.helpers import register, create_vendor, create_product, create_po
+
+
+def test_dashboard_summary_totals_pending_receipt_and_department_scope(client):
+    headers, _ = register(client, department='ppc')
+    dyeing, _ = register(client, department='dyeing')
+    admin, _ = register(client, role='admin')
+    vendor = create_vendor(client, headers)
+    product = create_product(client, headers, unit_price=100, tax_rate=0)
+    first = create_po(client, headers, quantity=10, vendor=vendor, product=product)
+    create_po(client, headers, quantity=4, vendor=vendor, product=product)
+    create_po(client, dyeing, quantity=1)
+    response = client.post(f"/api/purchase-orders/{first['id']}/confirm-item-receipt", headers=headers, json={
+        'item_index': 0, 'quantity_received': 3, 'received_by': 'Stores'
+    })
+    assert response.status_code == 200
+
+    summary = client.get('/api/dashboard/summary', headers=headers).json()
+    assert summary['total_pos'] == 2
+    assert summary['total_value'] == 1400
+    assert summary['by_status'] == {first['status']: {'count': 2, 'total_value': 1400}}
+    assert list(summary['by_department']) == ['ppc']
+    # 7 still due on the first PO and 4 on the second
+    assert summary['pending_receipt'] == {'pending_pos': 2, 'pending_items': 2, 'pending_quantity': 11, 'pending_value': 1100}
+    assert len(summary['recent']) == 2
+
+    everything = client.get('/api/dashboard/summary', headers=admin).json()
+    assert everything['total_pos'] == 3
+    assert {dept: row['count'] for dept, row in everything['by_department'].items()} == {'dyeing': 1, 'ppc': 2}
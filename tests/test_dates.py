@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta, timezone
+
+from tests.helpers import register, create_po
+
+
+def make_legacy(run, server, po, created_at):
+    """Store a PO's created_at the way the app used to write it"""
+    run(server.db.purchase_orders.update_one, {'id': po['id']}, {'$set': {'created_at': created_at.isoformat()}})
+
+
+def list_all(client, headers, **params):
+    ids, cursor = [], None
+    while True:
+        response = client.get('/api/purchase-orders', headers=headers, params={**params, 'limit': 1, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        ids += [po['id'] for po in response.json()]
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            return ids
+
+
+def test_lists_read_string_and_bson_dates_before_the_migration(client, run, server, monkeypatch):
+    monkeypatch.setitem(server.date_migration, 'complete', False)
+    headers, _ = register(client)
+    pos = [create_po(client, headers) for _ in range(4)]
+    now = datetime.now(timezone.utc)
+    make_legacy(run, server, pos[0], now - timedelta(days=3))
+    make_legacy(run, server, pos[1], now - timedelta(days=2))
+
+    # Every PO exactly once across pages, whichever format its date is in
+    assert sorted(list_all(client, headers)) == sorted(po['id'] for po in pos)
+    since = (now - timedelta(days=2, hours=1)).isoformat()
+    assert sorted(list_all(client, headers, date_from=since)) == sorted(po['id'] for po in pos[1:])
+
+    response = client.get("/api/purchase-orders/export", headers=headers, params={'format': 'jsonl'})
+    assert response.status_code == 200, response.text
+    assert len(response.text.strip().splitlines()) == 4
+
+
+def test_date_migration_job_converts_strings_and_marks_itself_complete(client, run, server, monkeypatch):
+    monkeypatch.setitem(server.date_migration, 'complete', False)
+    headers, _ = register(client)
+    po = create_po(client, headers)
+    created_at = datetime.now(timezone.utc) - timedelta(days=1)
+    make_legacy(run, server, po, created_at)
+
+    assert run(server.migrate_dates) == {'converted': 1}
+    stored = run(server.db.purchase_orders.find_one, {'id': po['id']})
+    assert stored['created_at'] == created_at.replace(microsecond=created_at.microsecond // 1000 * 1000)
+    assert server.date_migration['complete'] is True
+    assert run(server.migrate_dates) == {'converted': 0}
+    assert list_all(client, headers) == [po['id']]
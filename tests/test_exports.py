@@ -0,0 +1,69 @@
+import csv
+import io
+import json
+import zipfile
+
+from tests.helpers import register, create_po
+
+
+def test_csv_export_has_a_row_per_po_with_quantities(client):
+    headers, _ = register(client)
+    po = create_po(client, headers, quantity=4, lines=2)
+
+    response = client.get('/api/purchase-orders/export', headers=headers)
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/csv')
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row['po_number'] for row in rows] == [po['po_number']]
+    assert (rows[0]['line_count'], rows[0]['quantity_ordered'], rows[0]['quantity_pending']) == ('2', '8.0', '8.0')
+
+
+def test_line_export_is_scoped_to_the_users_department(client):
+    headers, _ = register(client, department='ppc')
+    other, _ = register(client, department='dyeing')
+    po = create_po(client, headers, lines=3)
+    create_po(client, other)
+
+    response = client.get('/api/purchase-orders/export', headers=headers, params={'format': 'jsonl', 'lines': 'true'})
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row['line'] for row in rows] == [1, 2, 3]
+    assert {row['po_number'] for row in rows} == {po['po_number']}
+
+
+def test_pdf_export_zips_one_pdf_per_po(client):
+    headers, _ = register(client)
+    pos = [create_po(client, headers) for _ in range(2)]
+
+    response = client.get('/api/purchase-orders/export/pdf', headers=headers)
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    names = archive.namelist()
+    assert len(names) == 2
+    assert all(any(po['po_number'] in name for name in names) for po in pos)
+    assert all(archive.read(name).startswith(b'%PDF') for name in names)
+
+
+def test_po_pdf_is_rendered_once_and_revalidated_by_etag(client, run, server, monkeypatch):
+    headers, _ = register(client)
+    po = create_po(client, headers)
+    renders = []
+    render = server.timed_render_po_pdf
+    monkeypatch.setattr(server, 'timed_render_po_pdf', lambda doc: renders.append(doc['id']) or render(doc))
+
+    first = client.get(f"/api/purchase-orders/{po['id']}/pdf", headers=headers)
+    assert first.status_code == 200
+    assert first.content.startswith(b'%PDF')
+    etag = first.headers['etag']
+    second = client.get(f"/api/purchase-orders/{po['id']}/pdf", headers=headers)
+    assert (second.content, second.headers['etag']) == (first.content, etag)
+    assert renders == [po['id']]
+
+    # An unchanged PO revalidates without a body; an edited one gets a new ETag and a fresh render
+    revalidated = client.get(f"/api/purchase-orders/{po['id']}/pdf", headers={**headers, 'If-None-Match': etag})
+    assert revalidated.status_code == 304 and revalidated.content == b''
+    run(server.db.purchase_orders.update_one, {'id': po['id']}, {'$set': {'payment_terms': 'Net 60'}})
+    changed = client.get(f"/api/purchase-orders/{po['id']}/pdf", headers={**headers, 'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['etag'] != etag
+    assert renders == [po['id'], po['id']]
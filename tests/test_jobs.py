@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from tests.helpers import register
+
+
+def test_lease_keeps_a_second_instance_out_of_a_running_job(client, run, server):
+    ours, theirs = server.JobScheduler(), server.JobScheduler()
+    started = []
+
+    async def scenario():
+        async def job():
+            started.append(ours.instance_id)
+            await asyncio.sleep(0.2)
+            return {}
+        await asyncio.gather(
+            ours.run(server.ScheduledJob('lease_test', job, 3600), 'manual', {}),
+            theirs.run(server.ScheduledJob('lease_test', job, 3600), 'manual', {})
+        )
+
+    run(scenario)
+    assert len(started) == 1
+    runs = run(server.db.job_runs.find({'job': 'lease_test'}).to_list, None)
+    assert [r['status'] for r in runs] == ['success']
+    # Released once the run finished
+    assert run(server.db.job_leases.find_one, {'_id': 'lease_test'}) is None
+
+
+def test_lease_is_renewed_while_a_job_outlives_it(client, run, server, monkeypatch):
+    monkeypatch.setattr(server, 'JOB_LEASE_SECONDS', 0.3)
+    monkeypatch.setattr(server, 'JOB_LEASE_RENEW_SECONDS', 0.05)
+    ours, theirs = server.JobScheduler(), server.JobScheduler()
+    taken_over = []
+
+    async def job():
+        # Well past the original expiry
+        await asyncio.sleep(0.6)
+        taken_over.append(await theirs._acquire_lease('long_job'))
+        return {}
+
+    run(ours.run, server.ScheduledJob('long_job', job, 3600), 'manual', {})
+    assert taken_over == [False]
+
+
+def test_jobs_endpoints_are_admin_only(client):
+    headers, _ = register(client)
+    assert client.get('/api/jobs', headers=headers).status_code == 403
+    assert client.post('/api/jobs/pending_po_scan/trigger', headers=headers).status_code == 403
+
+
+def test_lifespan_releases_job_leases_on_the_way_out(client, run, server, monkeypatch):
+    scheduler = server.JobScheduler()
+    started = asyncio.Event()
+
+    async def job():
+        started.set()
+        await asyncio.sleep(3600)
+
+    async def startup():
+        scheduler.start()
+
+    scheduler.register('lifespan_test', job, 3600)
+    monkeypatch.setattr(server, 'startup_db_client', startup)
+    monkeypatch.setattr(server, 'shutdown_db_client', scheduler.stop)
+
+    async def scenario():
+        async with server.lifespan(server.app):
+            await asyncio.wait_for(started.wait(), timeout=5)
+            held = await server.db.job_leases.find_one({'_id': 'lifespan_test'})
+        return held
+
+    assert run(scenario)['owner'] == scheduler.instance_id
+    assert run(server.db.job_leases.find_one, {'_id': 'lifespan_test'}) is None
+    assert not server.app.router.on_startup and not server.app.router.on_shutdown
+
+
+def test_lifespan_shuts_down_after_a_failed_startup(client, run, server, monkeypatch):
+    calls = []
+
+    async def startup():
+        calls.append('startup')
+        raise RuntimeError('Could not create unique index')
+
+    async def shutdown():
+        calls.append('shutdown')
+
+    monkeypatch.setattr(server, 'startup_db_client', startup)
+    monkeypatch.setattr(server, 'shutdown_db_client', shutdown)
+
+    async def scenario():
+        async with server.lifespan(server.app):
+            calls.append('serving')
+
+    with pytest.raises(RuntimeError):
+        run(scenario)
+    assert calls == ['startup', 'shutdown']
@@ -0,0 +1,251 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from tests.helpers import register, create_po
+
+
+def overdue_po(client, run, server, headers):
+    """A PO old enough for the pending-PO scan to alert on"""
+    po = create_po(client, headers)
+    created_at = datetime.now(timezone.utc) - timedelta(days=server.PENDING_PO_DAYS + 1)
+    run(server.db.purchase_orders.update_one, {'id': po['id']}, {'$set': {'created_at': created_at}})
+    return po
+
+
+def unread_count(client, headers):
+    return client.get('/api/notifications/unread-count', headers=headers).json()['unread_count']
+
+
+def alert_for(client, headers, po):
+    notifications = client.get('/api/notifications', headers=headers).json()
+    return next(n for n in notifications if n['po_id'] == po['id'])
+
+
+def test_department_alert_stays_unread_for_recipients_who_have_not_read_it(client, run, server):
+    reader, _ = register(client)
+    others = [register(client)[0] for _ in range(2)]
+    po = overdue_po(client, run, server, reader)
+    assert run(server.scan_pending_pos, True) == 1
+    alert = alert_for(client, reader, po)
+    
+    assert client.patch(f"/api/notifications/{alert['id']}/read", headers=reader).status_code == 200
+    stored = run(server.db.notifications.find_one, {'id': alert['id']})
+    assert 'expires_at' not in stored
+    assert stored['is_read'] is False
+    
+    # A full rescan leaves an alert some recipients haven't read alone
+    assert run(server.scan_pending_pos, True) == 0
+    assert unread_count(client, reader) == 0
+    for headers in others:
+        assert unread_count(client, headers) == 1
+        assert alert_for(client, headers, po)['is_read'] is False
+    assert run(server.reconcile_unread_counters) == 0
+
+
+def test_reraised_alert_counts_once_per_recipient(client, run, server):
+    users = [register(client)[0] for _ in range(3)]
+    po = overdue_po(client, run, server, users[0])
+    run(server.scan_pending_pos, True)
+    alert = alert_for(client, users[0], po)
+    
+    for headers in users[:2]:
+        client.patch(f"/api/notifications/{alert['id']}/read", headers=headers)
+    client.post('/api/notifications/read-all', headers=users[2])
+    # Reads through "mark all read" are settled by the retention job
+    run(server.expire_read_notifications, datetime.now(timezone.utc))
+    stored = run(server.db.notifications.find_one, {'id': alert['id']})
+    assert stored['is_read'] is True and 'expires_at' in stored
+    
+    assert run(server.scan_pending_pos, True) == 1
+    for headers in users:
+        assert unread_count(client, headers) == 1
+        assert alert_for(client, headers, po)['occurrences'] == 2
+    assert run(server.db.notification_receipts.count_documents, {'notification_id': alert['id']}) == 0
+    assert run(server.reconcile_unread_counters) == 0
+
+
+def test_retention_settles_alerts_read_through_receipts_and_mark_all_read(client, run, server, monkeypatch):
+    first, _ = register(client)
+    second, _ = register(client)
+    pos = [overdue_po(client, run, server, first) for _ in range(3)]
+    run(server.scan_pending_pos, True)
+    alerts = [alert_for(client, first, po) for po in pos]
+
+    client.patch(f"/api/notifications/{alerts[0]['id']}/read", headers=second)
+    client.post('/api/notifications/read-all', headers=first)
+
+    async def per_notification_lookup(notification):
+        raise AssertionError('the retention job must not query recipients once per notification')
+
+    monkeypatch.setattr(server, 'notification_unread_recipients', per_notification_lookup)
+    # Only the first alert has been read by both, one through a receipt and one through read-all
+    assert run(server.expire_read_notifications, datetime.now(timezone.utc)) == 1
+    stored = {n['id']: n for n in run(server.db.notifications.find({}).to_list, None)}
+    assert [stored[alert['id']]['is_read'] for alert in alerts] == [True, False, False]
+    assert 'expires_at' in stored[alerts[0]['id']]
+
+    client.post('/api/notifications/read-all', headers=second)
+    assert run(server.expire_read_notifications, datetime.now(timezone.utc)) == 2
+    assert run(server.db.notifications.count_documents, {'is_read': False}) == 0
+    assert run(server.expire_read_notifications, datetime.now(timezone.utc)) == 0
+
+
+def test_mark_read_updates_only_the_readers_counter(client, run, server):
+    reader, _ = register(client)
+    other, _ = register(client)
+    outsider, _ = register(client, department='dyeing')
+    po = overdue_po(client, run, server, reader)
+    run(server.scan_pending_pos, True)
+    alert = alert_for(client, reader, po)
+    
+    assert unread_count(client, reader) == 1
+    assert unread_count(client, outsider) == 0
+    client.patch(f"/api/notifications/{alert['id']}/read", headers=reader)
+    # Reading twice doesn't decrement twice
+    client.patch(f"/api/notifications/{alert['id']}/read", headers=reader)
+    assert unread_count(client, reader) == 0
+    assert unread_count(client, other) == 1
+    assert client.patch(f"/api/notifications/{alert['id']}/read", headers=outsider).status_code == 404
+
+
+def test_counters_need_no_correction_after_read_and_reraise(client, run, server):
+    users = [register(client)[0] for _ in range(2)]
+    po = overdue_po(client, run, server, users[0])
+    run(server.scan_pending_pos, True)
+    alert = alert_for(client, users[0], po)
+    for headers in users:
+        client.patch(f"/api/notifications/{alert['id']}/read", headers=headers)
+    assert run(server.scan_pending_pos, True) == 1
+    
+    result = run(server.run_notification_retention)
+    assert result['counters_corrected'] == 0
+    assert [unread_count(client, headers) for headers in users] == [1, 1]
+
+
+def test_archiving_unread_alerts_takes_them_off_the_counters(client, run, server):
+    reader, _ = register(client)
+    other, _ = register(client)
+    po = overdue_po(client, run, server, reader)
+    run(server.scan_pending_pos, True)
+    alert = alert_for(client, reader, po)
+    client.patch(f"/api/notifications/{alert['id']}/read", headers=reader)
+    old = datetime.now(timezone.utc) - timedelta(days=server.NOTIFICATION_ARCHIVE_DAYS + 1)
+    run(server.db.notifications.update_one, {'id': alert['id']}, {'$set': {'created_at': old}})
+    # Users start with everything before their creation marked read, so age them too
+    run(server.db.users.update_many, {}, {'$set': {'notifications_read_before': old - timedelta(days=1)}})
+    
+    result = run(server.run_notification_retention)
+    assert result['archived'] == 1
+    assert result['counters_corrected'] == 0
+    assert unread_count(client, other) == 0
+    assert run(server.db.notification_receipts.count_documents, {}) == 0
+
+
+def test_stream_only_takes_stream_tokens_in_the_url(client, run, server):
+    headers, user = register(client)
+    login_token = headers['Authorization'].split(' ', 1)[1]
+    # A login token in the URL would end up in proxy and access logs
+    assert client.get('/api/notifications/stream', params={'token': login_token}).status_code == 401
+
+    response = client.post('/api/notifications/stream-token', headers=headers)
+    assert response.status_code == 200
+    stream_token = response.json()['token']
+    assert response.json()['expires_in'] == server.SSE_TOKEN_SECONDS
+    assert run(server.resolve_user, stream_token, server.SSE_TOKEN_SCOPE)['id'] == user['id']
+    # ...and a stream token is good for nothing else
+    assert client.get('/api/auth/me', headers={'Authorization': f"Bearer {stream_token}"}).status_code == 401
+
+
+def test_stream_subscribes_only_while_its_body_is_iterated(client, run, server):
+    headers, _ = register(client)
+    token = client.post('/api/notifications/stream-token', headers=headers).json()['token']
+    broker = server.notification_broker
+
+    async def scenario():
+        before = len(broker.subscribers)
+        response = await server.stream_notifications(request=None, token=token, credentials=None)
+        # A response that is never sent holds no subscription
+        unsent = len(broker.subscribers) - before
+        first = await response.body_iterator.__anext__()
+        streaming = len(broker.subscribers) - before
+        await response.body_iterator.aclose()
+        return unsent, first, streaming, len(broker.subscribers) - before
+
+    unsent, first, streaming, closed = run(scenario)
+    assert (unsent, streaming, closed) == (0, 1, 0)
+    assert first.startswith('event: unread_count')
+
+
+def test_unread_count_refresh_task_is_kept_until_it_finishes(client, run, server):
+    headers, user = register(client)
+
+    async def scenario():
+        queue = server.notification_broker.subscribe(user)
+        try:
+            server.notification_broker.schedule_unread_count()
+            tasks = set(server.background_tasks)
+            assert tasks
+            await asyncio.gather(*tasks)
+            assert not tasks & server.background_tasks
+            return queue.get_nowait()
+        finally:
+            server.notification_broker.unsubscribe(queue)
+
+    assert run(scenario) == ('unread_count', {'unread_count': 0})
+
+
+def test_broker_reopens_a_failed_change_stream(client, run, server, monkeypatch):
+    attempts = []
+    opened = asyncio.Event()
+
+    class Stream:
+        async def __aenter__(self):
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError('stream lost')
+            opened.set()
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            await asyncio.Event().wait()
+
+    monkeypatch.setattr(server.db, 'watch', lambda pipeline: Stream())
+    broker = server.NotificationBroker()
+
+    async def scenario():
+        # The app's own broker retries on its own schedule and would take the patched stream
+        await server.notification_broker.stop()
+        broker.start()
+        try:
+            await asyncio.wait_for(opened.wait(), timeout=5)
+            active = broker.change_stream_active
+            await broker.stop()
+            return active, len(attempts), broker.change_stream_active
+        finally:
+            await broker.stop()
+            monkeypatch.undo()
+            server.notification_broker.start()
+
+    assert run(scenario) == (True, 2, False)
+
+
+def test_incremental_scan_only_reads_pos_past_the_high_water_mark(client, run, server):
+    headers, _ = register(client)
+    first = overdue_po(client, run, server, headers)
+    assert run(server.scan_pending_pos) == 1
+    mark = run(server.db.scanner_state.find_one, {'_id': server.PENDING_SCAN_STATE_ID})['high_water_mark']
+
+    # Created before the mark: an incremental scan no longer reads it, a full one does
+    late = overdue_po(client, run, server, headers)
+    older = server.stored_datetime(mark) - timedelta(hours=1)
+    run(server.db.purchase_orders.update_one, {'id': late['id']}, {'$set': {'created_at': older}})
+    assert run(server.scan_pending_pos) == 0
+    assert run(server.scan_pending_pos, True) == 1
+    alerted = {n['po_id'] for n in client.get('/api/notifications', headers=headers).json()}
+    assert alerted == {first['id'], late['id']}
@@ -0,0 +1,109 @@
+import pytest
+
+from tests.helpers import register, create_po
+
+
+def metric_value(text, series):
+    return next(float(line.rsplit(' ', 1)[1]) for line in text.splitlines() if line.startswith(series + ' '))
+
+
+def test_pool_stats_come_from_the_checkout_wait_histogram(client, server):
+    admin, _ = register(client, department='admin', role='admin')
+    listener = server.PoolWaitListener()
+    before = server.mongo_pool_wait_seconds.snapshot()[2]
+    for _ in range(3):
+        listener.connection_check_out_started(None)
+        listener.connection_checked_out(None)
+
+    stats = client.get('/api/db/pool', headers=admin).json()
+    assert stats['checkouts'] >= before + 3
+    assert sum(bucket['count'] for bucket in stats['wait_histogram']) == stats['checkouts']
+    assert stats['wait_histogram'][-1]['le'] is None
+    assert stats['waiting'] == 0
+
+
+def test_pool_stats_are_admin_only(client):
+    headers, _ = register(client)
+    assert client.get('/api/db/pool', headers=headers).status_code == 403
+
+
+def test_metrics_count_requests_per_route(client):
+    headers, _ = register(client)
+    series = 'http_request_duration_seconds_count{method="GET",route="/api/purchase-orders/{po_id}",status="200"}'
+    before = client.get('/metrics').text
+    po = create_po(client, headers)
+    for _ in range(2):
+        client.get(f"/api/purchase-orders/{po['id']}", headers=headers)
+
+    after = client.get('/metrics')
+    assert after.headers['content-type'].startswith('text/plain')
+    previous = metric_value(before, series) if series in before else 0
+    # Labelled by route template, not by PO id
+    assert metric_value(after.text, series) == previous + 2
+    assert po['id'] not in after.text
+    assert '# TYPE mongodb_pool_checkout_wait_seconds histogram' in after.text
+
+
+def test_forced_profile_records_commands_and_stack_samples(client):
+    admin, _ = register(client, department='admin', role='admin')
+    for _ in range(20):
+        create_po(client, admin, lines=20)
+
+    # Sampling is statistical, so give a short request a few chances to be caught on the loop
+    for _ in range(5):
+        response = client.get('/api/purchase-orders', headers={**admin, 'X-Debug-Profile': '1'})
+        assert response.status_code == 200
+        profiles = client.get('/api/debug/profiles', headers=admin).json()['profiles']
+        if profiles[0]['samples']:
+            break
+    summary = profiles[0]
+    assert (summary['path'], summary['trigger'], summary['route']) == ('/api/purchase-orders', 'header', '/api/purchase-orders')
+    assert summary['samples'] >= 1
+
+    profile = client.get(f"/api/debug/profiles/{summary['id']}", headers=admin).json()
+    assert any(c['command'] == 'find' and c['collection'] == 'purchase_orders' for c in profile['commands'])
+    flame = client.get(f"/api/debug/profiles/{summary['id']}/flame", headers=admin).text
+    assert sum(int(line.rsplit(' ', 1)[1]) for line in flame.splitlines()) == summary['samples']
+
+
+def test_startup_creates_every_index(client, run, server):
+    for collection, keys, options in server.INDEX_SPECS:
+        name = '_'.join(f"{field}_{direction}" for field, direction in keys)
+        indexes = run(server.db[collection].index_information)
+        assert name in indexes, f"{collection}.{name}"
+        assert indexes[name].get('unique', False) == options.get('unique', False)
+
+
+def test_query_plan_check_flags_collection_scans(client, run, server, monkeypatch, caplog):
+    async def explain(command):
+        indexed = command['explain']['find'] != 'notifications'
+        leaf = {'stage': 'IXSCAN'} if indexed else {'stage': 'COLLSCAN'}
+        return {'queryPlanner': {'winningPlan': {'stage': 'FETCH', 'inputStage': leaf}}}
+
+    monkeypatch.setattr(server.db, 'command', explain)
+    monkeypatch.setattr(server, 'QUERY_SHAPES', [
+        ('by id', 'purchase_orders', {'id': ''}, None),
+        ('unindexed', 'notifications', {'title': ''}, None),
+    ])
+    with caplog.at_level('INFO', logger=server.logger.name):
+        run(server.check_query_plans)
+
+    collscans = [r.getMessage() for r in caplog.records if 'COLLSCAN' in r.getMessage()]
+    assert collscans == ["COLLSCAN for query shape 'unindexed' on notifications: filter={'title': ''} sort=None"]
+    assert any("'by id' uses plan FETCH <- IXSCAN" in r.getMessage() for r in caplog.records)
+
+
+def test_list_read_preference_follows_the_environment(client, server, monkeypatch):
+    assert server.list_read_preference().mongos_mode == 'primary'
+    monkeypatch.setattr(server, 'MONGO_LIST_READ_PREFERENCE', 'secondaryPreferred')
+    monkeypatch.setattr(server, 'MONGO_LIST_MAX_STALENESS_SECONDS', 120)
+    preference = server.list_read_preference()
+    assert (preference.mongos_mode, preference.max_staleness) == ('secondaryPreferred', 120)
+    monkeypatch.setattr(server, 'MONGO_LIST_READ_PREFERENCE', 'secondary-ish')
+    with pytest.raises(ValueError, match='secondary-ish'):
+        server.list_read_preference()
+
+    admin, _ = register(client, department='admin', role='admin')
+    stats = client.get('/api/db/pool', headers=admin).json()
+    assert stats['list_read_preference'] == 'primary'
+    assert (stats['max_pool_size'], stats['min_pool_size']) == (server.MONGO_MAX_POOL_SIZE, 1)
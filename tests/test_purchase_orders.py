@@ -0,0 +1,172 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from tests.helpers import register, create_vendor, create_product, po_payload, create_po
+
+
+def test_concurrent_po_numbers_are_unique(client, run, server):
+    async def issue_many():
+        return await asyncio.gather(*(server.generate_po_number('ppc') for _ in range(25)))
+
+    numbers = run(issue_many)
+    assert len(set(numbers)) == 25
+    suffixes = sorted(int(number.rsplit('-', 1)[1]) for number in numbers)
+    assert suffixes == list(range(1, 26))
+
+
+def test_po_numbers_continue_after_existing_numbers(client, run, server):
+    headers, _ = register(client)
+    po = create_po(client, headers)
+    prefix = server.po_number_prefix('ppc')
+    # Written by an older process: string order would rank 9999 above 10000
+    for suffix in ('0007', '9999', '10000'):
+        run(server.db.purchase_orders.insert_one, {'id': f"legacy-{suffix}", 'po_number': f"{prefix}{suffix}"})
+    run(server.db.counters.delete_many, {})
+    server.seeded_po_prefixes.clear()
+
+    assert po['po_number'] == f"{prefix}0001"
+    assert run(server.generate_po_number, 'ppc') == f"{prefix}10001"
+
+
+def test_startup_refuses_to_run_without_unique_po_numbers(client, run, server):
+    run(server.db.purchase_orders.drop_index, 'po_number_1')
+    try:
+        run(server.db.purchase_orders.insert_many, [{'id': 'a', 'po_number': 'PO-X-1'}, {'id': 'b', 'po_number': 'PO-X-1'}])
+        with pytest.raises(RuntimeError, match='purchase_orders.po_number_1'):
+            run(server.ensure_indexes)
+    finally:
+        run(server.db.purchase_orders.delete_many, {})
+        run(server.ensure_indexes)
+
+
+def test_startup_renumbers_duplicate_po_numbers_before_building_the_index(client, run, server):
+    run(server.db.purchase_orders.drop_index, 'po_number_1')
+    try:
+        oldest = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        run(server.db.purchase_orders.insert_many, [
+            {'id': 'a', 'po_number': 'PO-PPC-202601-0002', 'created_at': oldest},
+            {'id': 'b', 'po_number': 'PO-PPC-202601-0002', 'created_at': oldest + timedelta(days=1)},
+            {'id': 'c', 'po_number': 'PO-PPC-202601-0002', 'created_at': oldest + timedelta(days=2)},
+            {'id': 'd', 'po_number': 'PO-PPC-202601-0005', 'created_at': oldest},
+        ])
+
+        assert run(server.renumber_duplicate_po_numbers) == 2
+        run(server.ensure_indexes)
+        numbers = {po['id']: po['po_number'] for po in run(server.db.purchase_orders.find({}).to_list, None)}
+        # The oldest keeps its number; the others continue past the highest one in use
+        assert numbers == {
+            'a': 'PO-PPC-202601-0002', 'b': 'PO-PPC-202601-0006',
+            'c': 'PO-PPC-202601-0007', 'd': 'PO-PPC-202601-0005'
+        }
+        stored = run(server.db.purchase_orders.find_one, {'id': 'b'})
+        assert '=po-ppc-202601-0006' in stored['search_terms']
+        assert run(server.renumber_duplicate_po_numbers) == 0
+    finally:
+        run(server.db.purchase_orders.delete_many, {})
+        run(server.ensure_indexes)
+
+
+def test_po_amounts_are_priced_by_the_server(client):
+    headers, _ = register(client)
+    vendor = create_vendor(client, headers)
+    product = create_product(client, headers, unit_price=0.1, tax_rate=18)
+    payload = po_payload(vendor, product, quantity=3)
+    # Client amounts that disagree with the catalog are replaced, not stored
+    payload['items'][0].update(total=1.0, tax_amount=0.5)
+    payload.update(subtotal=1.0, tax=0.5, total=999.0)
+
+    response = client.post('/api/purchase-orders', headers=headers, json=payload)
+    assert response.status_code == 200, response.text
+    po = response.json()
+    # 3 x 0.1 in Decimal: 0.30 net, 0.054 tax rounds to 0.05
+    assert po['items'][0]['unit_price'] == 0.1
+    assert po['items'][0]['tax_amount'] == 0.05
+    assert po['items'][0]['total'] == 0.35
+    assert (po['subtotal'], po['tax'], po['total']) == (0.3, 0.05, 0.35)
+
+
+def test_po_amount_mismatch_can_be_rejected(client, server, monkeypatch):
+    monkeypatch.setattr(server, 'PO_TOTALS_MISMATCH', 'reject')
+    headers, _ = register(client)
+    vendor = create_vendor(client, headers)
+    product = create_product(client, headers, unit_price=100, tax_rate=18)
+
+    response = client.post('/api/purchase-orders', headers=headers, json=po_payload(vendor, product, quantity=2, total=1.0))
+    assert response.status_code == 422
+    assert response.json()['detail']['mismatches'] == [{'field': 'total', 'sent': 1.0, 'computed': 236.0}]
+    assert client.post('/api/purchase-orders', headers=headers, json=po_payload(vendor, product, quantity=2, total=236.0)).status_code == 200
+
+
+def test_po_with_unknown_product_is_rejected(client):
+    headers, _ = register(client)
+    vendor = create_vendor(client, headers)
+    product = {'id': 'missing', 'name': 'Ghost'}
+    response = client.post('/api/purchase-orders', headers=headers, json=po_payload(vendor, product))
+    assert response.status_code == 400
+    assert response.json()['detail'] == 'Unknown products: missing'
+
+
+def test_cursor_pages_cover_every_po_once_even_with_tied_timestamps(client, run, server):
+    headers, _ = register(client)
+    vendor = create_vendor(client, headers)
+    product = create_product(client, headers)
+    ids = [create_po(client, headers, vendor=vendor, product=product)['id'] for _ in range(5)]
+    tied = datetime(2026, 1, 5, tzinfo=timezone.utc)
+    run(server.db.purchase_orders.update_many, {'id': {'$in': ids[:3]}}, {'$set': {'created_at': tied}})
+    for days, po_id in enumerate(ids[3:], start=1):
+        run(server.db.purchase_orders.update_one, {'id': po_id}, {'$set': {'created_at': tied + timedelta(days=days)}})
+
+    pages, cursor = [], None
+    while True:
+        params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+        response = client.get('/api/purchase-orders', headers=headers, params=params)
+        assert response.status_code == 200
+        pages.append([po['id'] for po in response.json()])
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    # Newest first, ties broken by id
+    assert sum(pages, []) == [ids[4], ids[3]] + sorted(ids[:3], reverse=True)
+    assert client.get('/api/purchase-orders', headers=headers, params={'cursor': 'not-a-cursor'}).status_code == 400
+
+
+def test_po_list_returns_only_the_requested_fields(client):
+    headers, _ = register(client)
+    po = create_po(client, headers, lines=2)
+
+    response = client.get('/api/purchase-orders', headers=headers, params={'fields': 'po_number,total'})
+    assert response.status_code == 200
+    assert [sorted(row) for row in response.json()] == [['created_at', 'id', 'po_number', 'total']]
+    assert response.json()[0]['po_number'] == po['po_number']
+    summary = client.get('/api/purchase-orders', headers=headers, params={'summary': 'true'}).json()
+    assert 'items' not in summary[0] and summary[0]['total'] == po['total']
+    unknown = client.get('/api/purchase-orders', headers=headers, params={'fields': 'po_number,secret'})
+    assert unknown.status_code == 400
+    assert unknown.json()['detail'] == 'Unknown fields: secret'
+
+
+def test_po_lines_with_negative_prices_or_out_of_range_tax_are_rejected(client):
+    headers, _ = register(client)
+    vendor = create_vendor(client, headers)
+    product = create_product(client, headers)
+
+    def post(**line):
+        payload = po_payload(vendor, product, quantity=2)
+        payload['items'][0].update(line)
+        return client.post('/api/purchase-orders', headers=headers, json=payload)
+
+    response = post(unit_price=-5)
+    assert response.status_code == 400
+    assert response.json()['detail'] == 'Item 0 must have a unit price of 0 or more'
+    for tax_rate in (-1, 100.5):
+        response = post(tax_rate=tax_rate)
+        assert response.status_code == 400
+        assert response.json()['detail'] == 'Item 0 must have a tax rate between 0 and 100'
+    # The bounds themselves are valid
+    assert post(unit_price=0, tax_rate=0).json()['total'] == 0
+    assert post(unit_price=10, tax_rate=100).json()['total'] == 40
+    assert len(client.get('/api/purchase-orders', headers=headers).json()) == 2
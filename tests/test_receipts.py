@@ -0,0 +1,69 @@
+from tests.helpers import register, create_po
+
+
+def receive(client, headers, po, quantity, item_index=0):
+    return client.post(f"/api/purchase-orders/{po['id']}/confirm-item-receipt", headers=headers, json={
+        'item_index': item_index,
+        'quantity_received': quantity,
+        'received_by': 'Stores'
+    })
+
+
+def received(client, headers, po, item_index=0):
+    items = client.get(f"/api/purchase-orders/{po['id']}", headers=headers).json()['items']
+    return items[item_index].get('quantity_received', 0)
+
+
+def test_item_receipt_is_recorded(client):
+    headers, _ = register(client)
+    po = create_po(client, headers, quantity=10)
+
+    response = receive(client, headers, po, 4)
+    assert response.status_code == 200, response.text
+    assert response.json()['total_received'] == 4
+    assert response.json()['pending'] == 6
+    assert received(client, headers, po) == 4
+
+
+def test_item_receipt_rejects_over_receipt(client):
+    headers, _ = register(client)
+    po = create_po(client, headers, quantity=10)
+    assert receive(client, headers, po, 5).status_code == 200
+
+    response = receive(client, headers, po, 6)
+    assert response.status_code == 400
+    assert 'Cannot receive more than ordered quantity' in response.json()['detail']
+    assert received(client, headers, po) == 5
+
+
+def test_item_receipt_rejects_zero_and_negative_quantities(client):
+    headers, _ = register(client)
+    po = create_po(client, headers, quantity=10)
+    assert receive(client, headers, po, 5).status_code == 200
+
+    for quantity in (0, -3):
+        response = receive(client, headers, po, quantity)
+        assert response.status_code == 400
+        assert response.json()['detail'] == "Quantity received must be positive"
+    assert received(client, headers, po) == 5
+
+
+def test_batch_receipt_reports_each_line(client):
+    headers, _ = register(client)
+    po = create_po(client, headers, quantity=10, lines=2)
+    line = {'po_id': po['id'], 'received_by': 'Stores'}
+
+    response = client.post('/api/purchase-orders/confirm-receipts', headers=headers, json={'receipts': [
+        {**line, 'item_index': 0, 'quantity_received': 6},
+        {**line, 'item_index': 0, 'quantity_received': 5},
+        {**line, 'item_index': 1, 'quantity_received': -1},
+        {**line, 'item_index': 1, 'quantity_received': 10},
+        {**line, 'item_index': 2, 'quantity_received': 1},
+        {**line, 'po_id': 'missing', 'item_index': 0, 'quantity_received': 1}
+    ]})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert [r['status'] for r in body['results']] == ['applied', 'rejected', 'rejected', 'applied', 'rejected', 'rejected']
+    assert body['applied'] == 2 and body['failed'] == 4
+    assert received(client, headers, po, 0) == 6
+    assert received(client, headers, po, 1) == 10
@@ -0,0 +1,23 @@
+from tests.helpers import register, create_po
+
+
+def test_dashboard_recent_dates_match_the_po_endpoints(client):
+    headers, _ = register(client)
+    po = create_po(client, headers)
+
+    summary = client.get('/api/dashboard/summary', headers=headers).json()
+    assert summary['total_pos'] == 1
+    listed = client.get(f"/api/purchase-orders/{po['id']}", headers=headers).json()
+    assert summary['recent'][0]['created_at'] == listed['created_at']
+    assert listed['created_at'].endswith('Z')
+
+
+def test_fast_json_path_matches_validated_responses(client, server, monkeypatch):
+    headers, _ = register(client)
+    create_po(client, headers, lines=2)
+
+    monkeypatch.setattr(server, 'FAST_JSON_RESPONSES', False)
+    validated = client.get('/api/purchase-orders', headers=headers).json()
+    monkeypatch.setattr(server, 'FAST_JSON_RESPONSES', True)
+    fast = client.get('/api/purchase-orders', headers=headers).json()
+    assert fast == validated
@@ -0,0 +1,55 @@
+from tests.helpers import register, create_vendor, create_product, po_payload, create_po
+
+
+def test_po_update_checks_access_before_pricing(client):
+    owner, _ = register(client, department='ppc')
+    outsider, _ = register(client, department='dyeing')
+    po = create_po(client, owner)
+    # Items that can't be priced would be a 400 for someone allowed to edit the PO
+    payload = po_payload({'id': po['vendor_id'], 'name': po['vendor_name']}, {'id': 'missing', 'name': 'Ghost'})
+
+    assert client.put(f"/api/purchase-orders/{po['id']}", headers=outsider, json=payload).status_code == 403
+    assert client.put('/api/purchase-orders/nope', headers=outsider, json=payload).status_code == 404
+    assert client.put(f"/api/purchase-orders/{po['id']}", headers=owner, json=payload).status_code == 400
+
+
+def test_po_update_rewrites_search_terms_with_the_vendor(client, run, server):
+    headers, _ = register(client)
+    product = create_product(client, headers)
+    po = create_po(client, headers, vendor=create_vendor(client, headers, name='Acme Mills'), product=product)
+    vendor = create_vendor(client, headers, name='Zenith Dyes')
+
+    response = client.put(f"/api/purchase-orders/{po['id']}", headers=headers, json=po_payload(vendor, product, quantity=3))
+    assert response.status_code == 200, response.text
+    assert response.json()['vendor_name'] == 'Zenith Dyes'
+    assert response.json()['po_number'] == po['po_number']
+    stored = run(server.db.purchase_orders.find_one, {'id': po['id']})
+    assert stored['search_terms'] == server.search_terms_for('purchase_orders', stored)
+    assert 'zenith' in stored['search_terms'] and 'acme' not in stored['search_terms']
+
+
+def test_catalog_writes_are_limited_to_the_department(client):
+    owner, _ = register(client, department='ppc')
+    outsider, _ = register(client, department='dyeing')
+    admin, _ = register(client, department='admin', role='admin')
+    vendor = create_vendor(client, owner)
+    product = create_product(client, owner)
+    body = {**vendor, 'name': 'Renamed'}
+
+    assert client.put(f"/api/vendors/{vendor['id']}", headers=outsider, json=body).status_code == 403
+    assert client.delete(f"/api/products/{product['id']}", headers=outsider).status_code == 403
+    assert client.delete('/api/products/nope', headers=outsider).status_code == 404
+    response = client.put(f"/api/vendors/{vendor['id']}", headers=owner, json=body)
+    assert response.status_code == 200 and response.json()['name'] == 'Renamed'
+    assert client.delete(f"/api/products/{product['id']}", headers=admin).status_code == 200
+
+
+def test_accounts_can_edit_but_not_delete_other_departments_pos(client):
+    owner, _ = register(client, department='ppc')
+    accounts, _ = register(client, department='accounts')
+    po = create_po(client, owner)
+
+    response = client.patch(f"/api/purchase-orders/{po['id']}/status", headers=accounts, json={'status': 'approved'})
+    assert response.status_code == 200
+    assert client.delete(f"/api/purchase-orders/{po['id']}", headers=accounts).status_code == 403
+    assert client.get(f"/api/purchase-orders/{po['id']}", headers=owner).json()['status'] == 'approved'
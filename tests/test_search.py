@@ -0,0 +1,44 @@
+from tests.helpers import register, create_vendor, create_product, create_po
+
+
+def search(client, headers, q, types='products,vendors,purchase_orders'):
+    response = client.get('/api/search', headers=headers, params={'q': q, 'types': types})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_search_ranks_exact_then_prefix_then_word_matches(client):
+    headers, _ = register(client)
+    for index, name in enumerate(['Organic Cotton Yarn', 'Cotton Thread', 'Cotton', 'Polyester']):
+        create_product(client, headers, name=name, sku=f"SKU-{index}")
+
+    names = [p['name'] for p in search(client, headers, 'cotton', 'products')['products']]
+    assert names == ['Cotton', 'Cotton Thread', 'Organic Cotton Yarn']
+    assert [p['sku'] for p in search(client, headers, 'sku-3', 'products')['products']] == ['SKU-3']
+
+
+def test_search_stays_within_the_users_department(client):
+    ppc, _ = register(client, department='ppc')
+    dyeing, _ = register(client, department='dyeing')
+    create_vendor(client, ppc, name='Shared Name Mills')
+    create_vendor(client, dyeing, name='Shared Name Dyes')
+    po = create_po(client, ppc)
+
+    results = search(client, dyeing, 'shared')
+    assert [v['name'] for v in results['vendors']] == ['Shared Name Dyes']
+    assert search(client, dyeing, po['po_number'])['purchase_orders'] == []
+    assert [p['id'] for p in search(client, ppc, po['po_number'])['purchase_orders']] == [po['id']]
+
+
+def test_summary_list_leaves_out_items_and_search_terms(client):
+    headers, _ = register(client)
+    po = create_po(client, headers, lines=2)
+
+    listed = client.get('/api/purchase-orders', headers=headers, params={'summary': 'true'}).json()
+    assert [p['id'] for p in listed] == [po['id']]
+    assert 'items' not in listed[0] and 'search_terms' not in listed[0]
+    assert listed[0]['total'] == po['total']
+    # The q filter matches words of the PO number and vendor name
+    vendor_word = po['vendor_name'].split()[0]
+    assert len(client.get('/api/purchase-orders', headers=headers, params={'q': vendor_word}).json()) == 1
+    assert client.get('/api/purchase-orders', headers=headers, params={'q': 'nomatch'}).json() == []